@@ -13,20 +13,244 @@ function ensureSheet_() {
   return sheet;
 }
 
+// Health uploads are key frames (every target) or deltas (changed targets plus
+// `removed` names) with a per-store `seq`. Merged state lives in script
+// properties; a seq gap asks the agent for a key frame via /trigger/<store>.
+// Returns the store's full target list when the frame changed it, else null,
+// so a Sheet row is only written for real changes and always holds every target.
+function applyHealth_(payload) {
+  const store = payload.store || "unknown";
+  if (payload.seq === undefined) {
+    return payload.targets || [];
+  }
+  const props = PropertiesService.getScriptProperties();
+  const state = JSON.parse(props.getProperty("state:" + store) || '{"seq":0,"targets":{}}');
+  if (payload.seq <= state.seq) {
+    return null;
+  }
+  const before = JSON.stringify(state.targets);
+  if (payload.kind === "key") {
+    state.targets = {};
+  } else if (payload.seq !== state.seq + 1) {
+    setRefresh_(store, true);
+  }
+  (payload.removed || []).forEach(function (name) {
+    delete state.targets[name];
+  });
+  (payload.targets || []).forEach(function (target) {
+    state.targets[target.name] = target;
+  });
+  state.seq = payload.seq;
+  props.setProperty("state:" + store, JSON.stringify(state));
+  const after = JSON.stringify(state.targets);
+  return after === before ? null : Object.keys(state.targets).map(function (name) {
+    return state.targets[name];
+  });
+}
+
+// Columnar "gh1" health history (see encode_health_history in gping_next/telemetry.py).
+// Field order and kinds must match gping_next.schemas.TargetStatus.
+const HISTORY_FIELDS = [
+  ["name", "str"], ["up", "bool"], ["code", "str"], ["dns_ms", "float"], ["tcp_ms", "float"],
+  ["tls_ms", "float"], ["http_ms", "float"], ["note", "str"], ["icmp_ms", "float"],
+  ["conn_reused", "bool"], ["handshake_rtt_ms", "float"], ["kernel_rtt_ms", "float"],
+  ["kernel_rttvar_ms", "float"], ["kernel_retrans", "int"], ["path_break", "str"], ["samples", "int"],
+  ["loss_pct", "float"], ["rtt_min_ms", "float"], ["rtt_p50_ms", "float"], ["rtt_p95_ms", "float"],
+  ["jitter_ms", "float"],
+];
+const HISTORY_SCALE = 100;
+const FRAME_OPTIONAL = ["seq", "kind", "removed", "loss_pct", "jitter_ms"];
+
+function unzigzag_(v) {
+  return v % 2 === 0 ? v / 2 : -(v + 1) / 2;
+}
+
+function historyReader_(bytes) {
+  let pos = 0;
+  const reader = {
+    varint: function () {
+      // Plain arithmetic: values exceed the 32-bit range of JS bitwise operators.
+      let result = 0;
+      let scale = 1;
+      while (true) {
+        const b = bytes[pos++] & 0xff;
+        result += (b & 0x7f) * scale;
+        if (b < 0x80) {
+          return result;
+        }
+        scale *= 128;
+      }
+    },
+    column: function (n) {
+      const out = [];
+      for (let i = 0; i < n; i++) {
+        out.push(reader.varint());
+      }
+      return out;
+    },
+    text: function (n) {
+      const slice = bytes.slice(pos, pos + n);
+      pos += n;
+      return Utilities.newBlob(slice).getDataAsString("utf-8");
+    },
+  };
+  return reader;
+}
+
+function undoDeltas_(values) {
+  let prev = 0;
+  return values.map(function (v) {
+    prev += v;
+    return prev;
+  });
+}
+
+function unquantize_(keys, raw, scale) {
+  const previous = {};
+  return raw.map(function (v, i) {
+    if (v === 0) {
+      return null;
+    }
+    const q = (previous[keys[i]] || 0) + unzigzag_(v - 1);
+    previous[keys[i]] = q;
+    return q / scale;
+  });
+}
+
+function isoFromMicros_(us) {
+  const ms = Math.floor(us / 1000);
+  const iso = new Date(ms).toISOString().slice(0, 19);
+  const frac = us % 1000000;
+  return frac ? iso + "." + ("000000" + frac).slice(-6) : iso;
+}
+
+function decodeHealthHistory_(base64) {
+  const bytes = Utilities.base64Decode(base64);
+  if (String.fromCharCode(bytes[0], bytes[1], bytes[2]) !== "GH1") {
+    throw new Error("not a gh1 history blob");
+  }
+  const bytesAfterMagic = bytes.slice(3);
+  const r = historyReader_(bytesAfterMagic);
+  const strings = [null];
+  const nStrings = r.varint();
+  for (let i = 0; i < nStrings; i++) {
+    strings.push(r.text(r.varint()));
+  }
+  const count = r.varint();
+  const ts = undoDeltas_(undoDeltas_(r.column(count).map(unzigzag_)));
+  const stores = r.column(count);
+  const masks = r.column(count);
+  const seqs = undoDeltas_(r.column(masks.filter(function (m) { return m & 1; }).length).map(unzigzag_));
+  const kinds = r.column(masks.filter(function (m) { return m & 2; }).length);
+  const removed = [];
+  masks.forEach(function (m) {
+    if (m & 4) {
+      removed.push(r.column(r.varint()).map(function (i) { return strings[i]; }));
+    }
+  });
+  const frameKeys = [];
+  masks.forEach(function (m) {
+    if (m & 8) frameKeys.push("loss_pct");
+    if (m & 16) frameKeys.push("jitter_ms");
+  });
+  const frameFloats = unquantize_(frameKeys, r.column(frameKeys.length), HISTORY_SCALE);
+  const counts = r.column(count);
+  const total = counts.reduce(function (a, b) { return a + b; }, 0);
+  const names = r.column(total);
+  const columns = { name: names.map(function (i) { return strings[i]; }) };
+  HISTORY_FIELDS.slice(1).forEach(function (field) {
+    const raw = r.column(total);
+    if (field[1] === "str") {
+      columns[field[0]] = raw.map(function (i) { return strings[i]; });
+    } else if (field[1] === "bool") {
+      columns[field[0]] = raw.map(function (v) { return v === 0 ? null : v === 2; });
+    } else {
+      columns[field[0]] = unquantize_(names, raw, field[1] === "float" ? HISTORY_SCALE : 1);
+    }
+  });
+  const frames = [];
+  let row = 0;
+  let seqIdx = 0, kindIdx = 0, removedIdx = 0, floatIdx = 0;
+  for (let i = 0; i < count; i++) {
+    const frame = { ts: isoFromMicros_(ts[i]), store: strings[stores[i]], targets: [] };
+    for (let t = row; t < row + counts[i]; t++) {
+      const target = {};
+      HISTORY_FIELDS.forEach(function (field) {
+        target[field[0]] = columns[field[0]][t];
+      });
+      frame.targets.push(target);
+    }
+    row += counts[i];
+    if (masks[i] & 1) frame.seq = seqs[seqIdx++];
+    if (masks[i] & 2) frame.kind = strings[kinds[kindIdx++]];
+    if (masks[i] & 4) frame.removed = removed[removedIdx++];
+    if (masks[i] & 8) frame[FRAME_OPTIONAL[3]] = frameFloats[floatIdx++];
+    if (masks[i] & 16) frame[FRAME_OPTIONAL[4]] = frameFloats[floatIdx++];
+    frames.push(frame);
+  }
+  return frames;
+}
+
+function gunzipBody_(e) {
+  const base64 = e && e.postData ? e.postData.contents : "";
+  const binary = Utilities.base64Decode(base64);
+  const compressed = Utilities.newBlob(binary, "application/octet-stream", "payload.gz");
+  return Utilities.gunzip(compressed).getDataAsString("utf-8");
+}
+
+// Batch replay: gzip NDJSON, one {"id", "type", "payload"} record per line.
+// Only ids that were parsed and written are acknowledged; the agent requeues the rest.
+function doPostBatch_(e) {
+  const acked = [];
+  const rows = [];
+  let lines = [];
+  try {
+    lines = gunzipBody_(e).split("\n");
+  } catch (err) {
+    console.error(err);
+  }
+  lines.forEach(function (line) {
+    if (!line) {
+      return;
+    }
+    try {
+      const record = JSON.parse(line);
+      const payload = record.payload || {};
+      const frames = record.type === "health_history" ? decodeHealthHistory_(payload.data) : [payload];
+      frames.forEach(function (frame) {
+        const health = record.type === "health" || record.type === "health_history";
+        const targets = health ? applyHealth_(frame) : frame.targets || [];
+        if (targets) {
+          rows.push([new Date(), frame.store || "unknown", JSON.stringify(targets)]);
+        }
+      });
+      acked.push(record.id);
+    } catch (err) {
+      console.error(err);
+    }
+  });
+  if (rows.length) {
+    const sheet = ensureSheet_();
+    sheet.getRange(sheet.getLastRow() + 1, 1, rows.length, rows[0].length).setValues(rows);
+  }
+  return ContentService.createTextOutput(JSON.stringify({ acked: acked })).setMimeType(ContentService.MimeType.JSON);
+}
+
 function doPost(e) {
   const headers = (e && e.headers) || {};
   const key = headers["X-RDS-Key"];
   if (key !== EXPECTED_KEY) {
     return ContentService.createTextOutput("unauthorized");
   }
+  if (((e && e.pathInfo) || "").indexOf("ingest/batch") !== -1) {
+    return doPostBatch_(e);
+  }
   try {
-    const base64 = e && e.postData ? e.postData.contents : "";
-    const binary = Utilities.base64Decode(base64);
-    const compressed = Utilities.newBlob(binary, "application/octet-stream", "payload.gz");
-    const uncompressed = Utilities.gunzip(compressed).getDataAsString("utf-8");
-    const payload = JSON.parse(uncompressed);
-    const sheet = ensureSheet_();
-    sheet.appendRow([new Date(), payload.store || "unknown", JSON.stringify(payload.targets || [])]);
+    const payload = JSON.parse(gunzipBody_(e));
+    const targets = applyHealth_(payload);
+    if (targets) {
+      ensureSheet_().appendRow([new Date(), payload.store || "unknown", JSON.stringify(targets)]);
+    }
     return ContentService.createTextOutput("ok");
   } catch (err) {
     console.error(err);
@@ -34,13 +258,99 @@ function doPost(e) {
   }
 }
 
+// Watchlist entries live in script properties with a version counter that
+// changes on every edit; pollers send it back as ?since= and get a tiny
+// {"unchanged":true} body while nothing changed.
+function setWatchlistEntry(store, entry) {
+  const props = PropertiesService.getScriptProperties();
+  const stores = JSON.parse(props.getProperty("watchlist") || "{}");
+  if (entry) {
+    stores[store] = entry;
+  } else {
+    delete stores[store];
+  }
+  props.setProperties({ watchlist: JSON.stringify(stores), "watchlist:version": String(Date.now()) });
+}
+
+function jsonOutput_(data) {
+  return ContentService.createTextOutput(JSON.stringify(data)).setMimeType(ContentService.MimeType.JSON);
+}
+
+function watchlistResponse_(path, params) {
+  const props = PropertiesService.getScriptProperties();
+  const all = JSON.parse(props.getProperty("watchlist") || "{}");
+  const parts = path.split("/");
+  const store = parts[parts.length - 1] !== "watchlist" ? parts[parts.length - 1] : null;
+  const stores = {};
+  if (store) {
+    if (all[store]) {
+      stores[store] = all[store];
+    }
+  } else {
+    Object.assign(stores, all);
+  }
+  // A per-store version only changes when that store's entry does.
+  const version = store
+    ? Utilities.base64Encode(Utilities.computeDigest(Utilities.DigestAlgorithm.MD5, JSON.stringify(stores)))
+    : props.getProperty("watchlist:version") || "0";
+  if (params.since === version) {
+    return jsonOutput_({ unchanged: true, version: version });
+  }
+  return jsonOutput_({ stores: stores, version: version });
+}
+
+// Refresh flags are stored in script properties (durable) and mirrored in the
+// script cache, which held polls read; properties are only read on a cache miss.
+const REFRESH_CACHE_TTL = 6 * 60 * 60;
+const TRIGGER_POLL_MS = 5000;
+const TRIGGER_MAX_WAIT = 25;
+
+function setRefresh_(store, refresh) {
+  const props = PropertiesService.getScriptProperties();
+  if (refresh) {
+    props.setProperty("keyframe:" + store, "1");
+  } else {
+    props.deleteProperty("keyframe:" + store);
+  }
+  CacheService.getScriptCache().put("keyframe:" + store, refresh ? "1" : "0", REFRESH_CACHE_TTL);
+}
+
+function refreshFlagged_(store) {
+  const cache = CacheService.getScriptCache();
+  let flag = cache.get("keyframe:" + store);
+  if (flag === null) {
+    flag = PropertiesService.getScriptProperties().getProperty("keyframe:" + store) === "1" ? "1" : "0";
+    cache.put("keyframe:" + store, flag, REFRESH_CACHE_TTL);
+  }
+  return flag === "1";
+}
+
+// With ?wait=<s> the request is held (up to 25 s, well inside the execution
+// limit) until a refresh is flagged, checking the cache every 5 s. Each held
+// poll occupies one of the script's simultaneous executions (about 30) for
+// its full duration, so only enable long_poll for a handful of agents per
+// deployment, or put a store-hub relay in front of them.
+function triggerResponse_(store, params) {
+  const deadline = Date.now() + Math.min(Number(params.wait) || 0, TRIGGER_MAX_WAIT) * 1000;
+  let refresh = refreshFlagged_(store);
+  while (!refresh && Date.now() + TRIGGER_POLL_MS <= deadline) {
+    Utilities.sleep(TRIGGER_POLL_MS);
+    refresh = refreshFlagged_(store);
+  }
+  if (refresh) {
+    setRefresh_(store, false);
+  }
+  return jsonOutput_({ refresh: refresh });
+}
+
 function doGet(e) {
   const path = (e && e.pathInfo) || "";
+  const params = (e && e.parameter) || {};
   if (path.indexOf("watchlist") !== -1) {
-    return ContentService.createTextOutput(JSON.stringify({ stores: {} }));
+    return watchlistResponse_(path, params);
   }
   if (path.indexOf("trigger") !== -1) {
-    return ContentService.createTextOutput(JSON.stringify({ refresh: false }));
+    return triggerResponse_(path.split("/").pop(), params);
   }
   return ContentService.createTextOutput("{}");
 }
@@ -22,6 +22,7 @@ async def main() -> None:
     agent = GPingNextAgent(load_config())
     if args.once:
         await agent._gather_and_send(datetime.utcnow(), force_upload=True)  # type: ignore[attr-defined]
+        await agent.telemetry.close()
         return
     stop_event = asyncio.Event()
 
@@ -37,6 +38,7 @@ async def main() -> None:
     runner.cancel()
     with contextlib.suppress(asyncio.CancelledError):
         await runner
+    await agent.telemetry.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,83 @@
+"""Adaptive concurrency limiter for probe cycles."""
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from typing import Deque, Optional
+
+
+class AdaptiveLimiter:
+    """AIMD-style limit on in-flight probes.
+
+    Timeouts cost wall time but almost no bandwidth, so each timeout opens the
+    limit by one slot (additive increase) up to ``ceiling``. A success whose
+    latency is inflated well past the EWMA baseline suggests the link itself is
+    congested and halves the limit (multiplicative decrease); healthy successes
+    step it back down towards ``floor`` so a quiet network stays gentle.
+    """
+
+    def __init__(
+        self,
+        floor: int = 3,
+        ceiling: int = 16,
+        latency_factor: float = 2.0,
+        alpha: float = 0.2,
+    ) -> None:
+        self.floor = max(1, floor)
+        self.ceiling = max(self.floor, ceiling)
+        self.latency_factor = latency_factor
+        self.alpha = alpha
+        self.limit = self.floor
+        self.in_flight = 0
+        self.baseline_ms: Optional[float] = None
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    async def acquire(self) -> None:
+        while self.in_flight >= self.limit:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        self.in_flight += 1
+
+    def release(self) -> None:
+        self.in_flight = max(0, self.in_flight - 1)
+        self._wake()
+
+    async def __aenter__(self) -> "AdaptiveLimiter":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *_exc: object) -> None:
+        self.release()
+
+    def record(self, latency_ms: Optional[float], timed_out: bool) -> None:
+        if timed_out:
+            self.limit = min(self.ceiling, self.limit + 1)
+            self._wake()
+            return
+        if latency_ms is None:
+            return
+        if self.baseline_ms is None:
+            self.baseline_ms = latency_ms
+        inflated = latency_ms > self.baseline_ms * self.latency_factor
+        self.baseline_ms += self.alpha * (latency_ms - self.baseline_ms)
+        if inflated:
+            self.limit = max(self.floor, self.limit // 2)
+        elif self.limit > self.floor:
+            self.limit -= 1
+
+    def _wake(self) -> None:
+        free = self.limit - self.in_flight
+        for waiter in list(self._waiters):
+            if free <= 0:
+                break
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+
+__all__ = ["AdaptiveLimiter"]
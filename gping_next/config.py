@@ -5,7 +5,7 @@ import json
 import socket
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from rdsiq_core.config import (
     AppScriptConfig,
@@ -18,18 +18,39 @@ from rdsiq_core.config import (
     ensure_runtime_dirs,
 )
 
+from .sampling import MAX_SAMPLES
 from .schemas import TargetSpec
 
 CONFIG_FILE = Path("gping_next_config.json")
 FIXME_FILE = Path("config.fixme.json")
 
 
+@dataclass(slots=True)
+class DeltaBands:
+    """When a latency change is worth a log row and an upload.
+
+    Changes under ``abs_ms`` never count. Above it a change counts when it is
+    at least ``rel`` of the baseline or moves the value into another of the
+    ``buckets_ms`` ranges. With ``ewma_alpha`` set the baseline is an
+    exponentially weighted average of every cycle instead of the last value
+    written.
+    """
+
+    abs_ms: float = 5.0
+    rel: float = 0.25
+    buckets_ms: Tuple[float, ...] = (50.0, 100.0, 250.0, 500.0, 1000.0)
+    ewma_alpha: Optional[float] = None
+
+
 @dataclass(slots=True)
 class AgentConfig:
     store_id: str
     targets: List[TargetSpec]
     cadence: Cadence = field(default_factory=Cadence)
     telemetry: TelemetryConfig = field(default_factory=TelemetryConfig)
+    max_concurrency: int = 16
+    cycle_deadline: float = 30.0
+    delta: DeltaBands = field(default_factory=DeltaBands)
 
 
 DEFAULT_TARGETS: List[TargetSpec] = [
@@ -46,21 +67,72 @@ def _safe_store_id() -> str:
         return "UNKNOWN-STORE"
 
 
+def _name_list(value: Any) -> List[str]:
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return [str(v) for v in value]
+
+
 def _parse_target(data: Dict[str, Any]) -> Optional[TargetSpec]:
     try:
         return TargetSpec(
             name=data["name"],
             host=data["host"],
+            kind=str(data.get("kind", "tcp")).lower(),
             port=int(data.get("port", 443)),
             use_tls=bool(data.get("use_tls", True)),
             http_path=data.get("http_path"),
             sni=data.get("sni"),
             timeout=float(data.get("timeout", 3.0)),
+            tls_verify=bool(data.get("tls_verify", True)),
+            samples=max(1, min(int(data.get("samples", 1)), MAX_SAMPLES)),
+            sample_budget=float(data.get("sample_budget", 2.0)),
+            depends_on=_name_list(data.get("depends_on")),
+            interval=float(data["interval"]) if data.get("interval") else None,
+            jitter=float(data.get("jitter", 0.0)),
+            keepalive=bool(data.get("keepalive", False)),
+            cold_every=float(data.get("cold_every", 3600.0)),
+            path_probe=bool(data.get("path_probe", False)),
         )
     except Exception:
         return None
 
 
+def _unique_targets(parsed: Iterable[Optional[TargetSpec]]) -> List[TargetSpec]:
+    """Drop unparseable entries and later targets reusing an earlier name."""
+    seen: Dict[str, TargetSpec] = {}
+    for target in parsed:
+        if target is not None and target.name not in seen:
+            seen[target.name] = target
+    return list(seen.values())
+
+
+def _number(value: Any, default: float) -> float:
+    try:
+        return float(value) if value is not None else default
+    except (TypeError, ValueError):
+        return default
+
+
+def _parse_bands(data: Dict[str, Any]) -> DeltaBands:
+    defaults = DeltaBands()
+    buckets = data.get("buckets_ms", defaults.buckets_ms)
+    try:
+        buckets = tuple(sorted(float(b) for b in buckets))
+    except (TypeError, ValueError):
+        buckets = defaults.buckets_ms
+    alpha = data.get("ewma_alpha")
+    alpha = _number(alpha, 0.0) if alpha is not None else None
+    return DeltaBands(
+        abs_ms=max(0.0, _number(data.get("abs_ms"), defaults.abs_ms)),
+        rel=max(0.0, _number(data.get("rel"), defaults.rel)),
+        buckets_ms=buckets,
+        ewma_alpha=alpha if alpha is not None and 0 < alpha <= 1 else None,
+    )
+
+
 def load_config() -> AgentConfig:
     store_id = _safe_store_id()
     targets = DEFAULT_TARGETS
@@ -75,16 +147,23 @@ def load_config() -> AgentConfig:
     if config_dict:
         if "store_id" in config_dict:
             store_id = str(config_dict.get("store_id") or store_id).strip() or store_id
-        parsed_targets = [_parse_target(t) for t in config_dict.get("targets", [])]
-        parsed_targets = [t for t in parsed_targets if t is not None]
+        parsed_targets = _unique_targets(_parse_target(t) for t in config_dict.get("targets", []))
         if parsed_targets:
             targets = parsed_targets
+    probes = config_dict.get("probes") or {}
     ensure_runtime_dirs()
-    return AgentConfig(store_id=store_id, targets=targets)
+    return AgentConfig(
+        store_id=store_id,
+        targets=targets,
+        max_concurrency=int(_number(probes.get("max_concurrency"), 16)),
+        cycle_deadline=_number(probes.get("cycle_deadline"), 30.0),
+        delta=_parse_bands(config_dict.get("delta") or {}),
+    )
 
 
 __all__ = [
     "AgentConfig",
+    "DeltaBands",
     "Cadence",
     "TelemetryConfig",
     "AppScriptConfig",
@@ -2,8 +2,10 @@
 from __future__ import annotations
 
 import asyncio
+import logging
 from datetime import datetime, timedelta
-from typing import Optional
+from time import monotonic
+from typing import Dict, List, Optional
 
 from rdsiq_core.runtime import RDSIQCoreAgent
 from rdsiq_core.schemas import TriggerState
@@ -14,47 +16,96 @@ from .inventory import gather_inventory
 from .logger import DeltaLogger
 from .policy import CadencePolicy
 from .probes import ProbeRunner
-from .schemas import HealthPayload, TargetStatus
+from .sampling import aggregate
+from .scheduler import TargetScheduler
+from .schemas import HealthPayload, TargetSpec, TargetStatus
 from .task_api import TaskMetadata
-from .telemetry import AppsScriptSink, TelemetryManager
+from .telemetry import AppsScriptSink, HealthRecord, TelemetryManager
 from .web_local import LocalUIBridge
 
+MIN_INTERVAL = 1.0
+LONG_POLL_MAX_BACKOFF = 300.0
+
+_log = logging.getLogger(__name__)
+
 
 class GPingNextAgent(RDSIQCoreAgent):
     def __init__(self, config: Optional[AgentConfig] = None) -> None:
         self.config = config or load_config()
-        self.prober = ProbeRunner()
-        self.logger = DeltaLogger(self.config.store_id, self.config.cadence.heartbeat)
+        self.prober = ProbeRunner(
+            max_concurrency=self.config.max_concurrency, cycle_deadline=self.config.cycle_deadline
+        )
+        self.logger = DeltaLogger(self.config.store_id, self.config.cadence.heartbeat, self.config.delta)
         self.policy = CadencePolicy(self.config.cadence, self.config.store_id)
+        self.scheduler = TargetScheduler(self.config.targets)
+        self._snapshot: Dict[str, TargetStatus] = {}
         self._inventory_sent: Optional[datetime] = None
+        self._cycle_lock = asyncio.Lock()
+        self._long_poll_task: Optional[asyncio.Future] = None
         super().__init__(self.config.cadence, self.config.telemetry, TelemetryManager)
         self.ui = LocalUIBridge()
         self._register_default_tasks()
 
     async def on_startup(self) -> None:
         await self._send_inventory_once()
+        apps_sink = self._apps_sink()
+        if apps_sink and apps_sink.long_poll > 0:
+            self._long_poll_task = self.schedule_task(self._trigger_long_poll)
+            self._long_poll_task.add_done_callback(self._long_poll_done)
 
     async def run_cycle(self, now: datetime, triggers: TriggerState) -> None:
         if await self._maybe_refresh(now):
             now = datetime.utcnow()
         if self.policy.should_poll_watchlist(now):
             await self._update_watchlist(now)
-        await self._gather_and_send(now)
+        due = self.scheduler.due(monotonic())
+        if due:
+            await self._gather_and_send(now, targets=due)
         self.policy.clear_expired(datetime.utcnow())
 
     async def on_send_now(self) -> None:
         await self._gather_and_send(datetime.utcnow(), force_upload=True)
 
     async def next_interval(self, now: datetime, _triggers: TriggerState) -> float:
-        return self.policy.cadence_for(datetime.utcnow())
+        cadence = self.policy.cadence_for(datetime.utcnow())
+        delay = self.scheduler.next_delay(monotonic())
+        if delay is None:
+            return cadence
+        return max(MIN_INTERVAL, min(cadence, delay))
+
+    async def _gather_and_send(
+        self,
+        now: datetime,
+        force_upload: bool = False,
+        targets: Optional[List[TargetSpec]] = None,
+    ) -> None:
+        # The long-poll task can refresh while a regular cycle is probing.
+        async with self._cycle_lock:
+            await self._probe_and_send(now, force_upload, targets)
 
-    async def _gather_and_send(self, now: datetime, force_upload: bool = False) -> None:
-        statuses = await self.prober.probe_all(self.config.targets)
-        payload = HealthPayload(ts=now, store=self.config.store_id, targets=statuses)
-        should_upload = force_upload or self.logger.should_emit(statuses, now)
-        self.logger.record(payload)
+    async def _probe_and_send(
+        self,
+        now: datetime,
+        force_upload: bool,
+        targets: Optional[List[TargetSpec]],
+    ) -> None:
+        due = self.config.targets if targets is None else targets
+        probed = await self.prober.probe_all(due, known=self._snapshot)
+        self.scheduler.reschedule(due, monotonic(), self.policy.cadence_for(now))
+        for status in probed:
+            self._snapshot[status.name] = status
+        # Rolling snapshot: targets not due this round keep their last result.
+        statuses = [self._snapshot[t.name] for t in self.config.targets if t.name in self._snapshot]
+        loss_pct, jitter_ms = aggregate((s.samples, s.loss_pct, s.jitter_ms) for s in statuses)
+        payload = HealthPayload(
+            ts=now, store=self.config.store_id, targets=statuses, loss_pct=loss_pct, jitter_ms=jitter_ms
+        )
+        should_upload = force_upload or self.logger.should_emit(statuses, now) is not None
+        # Most cycles are neither logged nor uploaded: serialize only when one of them needs it.
+        health = HealthRecord(payload) if should_upload else payload
+        self.logger.record(health)
         if should_upload:
-            await self.telemetry.send_health(payload)
+            await self.telemetry.send_health(health)
             self.last_upload = datetime.utcnow()
         self._update_failure_status(statuses)
         self._update_ui(statuses)
@@ -66,23 +117,74 @@ class GPingNextAgent(RDSIQCoreAgent):
         await self.telemetry.send_inventory(payload)
         self._inventory_sent = datetime.utcnow()
 
+    def _apps_sink(self) -> Optional[AppsScriptSink]:
+        return next((s for s in self.telemetry.sinks if isinstance(s, AppsScriptSink)), None)
+
     async def _maybe_refresh(self, now: datetime) -> bool:
-        apps_sink = next((s for s in self.telemetry.sinks if isinstance(s, AppsScriptSink)), None)
-        if not apps_sink:
+        apps_sink = self._apps_sink()
+        if not apps_sink or self._long_polling():
             return False
         triggered = False
         if self.policy.should_poll_refresh(now):
-            triggered = await apps_sink.check_trigger(self.config.store_id)
+            triggered = bool(await apps_sink.check_trigger(self.config.store_id))
             if triggered:
+                self.telemetry.request_keyframe()
                 await self._gather_and_send(datetime.utcnow(), force_upload=True)
         return triggered
 
+    def _long_polling(self) -> bool:
+        # If the long-poll task ever ends, run_cycle goes back to regular polls.
+        return self._long_poll_task is not None and not self._long_poll_task.done()
+
+    async def _trigger_long_poll(self) -> None:
+        """Hold a trigger poll open instead of polling every ``refresh_poll``.
+
+        A clean answer starts the next poll at once (after the rest of the
+        wait, if the server did not hold the request). A failed poll or
+        refresh is logged and retried after a doubling backoff
+        (``refresh_poll`` up to ``LONG_POLL_MAX_BACKOFF``) so one bad probe
+        cycle cannot stop refresh triggers for good.
+        """
+        apps_sink = self._apps_sink()
+        if apps_sink is None:
+            return
+        base = self.config.cadence.refresh_poll.total_seconds()
+        backoff = base
+        while True:
+            started = monotonic()
+            try:
+                triggered = await apps_sink.check_trigger(self.config.store_id)
+                if triggered:
+                    self.telemetry.request_keyframe()
+                    await self._gather_and_send(datetime.utcnow(), force_upload=True)
+                    backoff = base
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                _log.exception("trigger long-poll failed; retrying in %.0f s", backoff)
+            else:
+                if triggered is not None:
+                    backoff = base
+                    # A server without long-poll support answers at once: poll once per wait.
+                    await asyncio.sleep(max(0.0, apps_sink.long_poll - (monotonic() - started)))
+                    continue
+                _log.warning("trigger long-poll got no answer; retrying in %.0f s", backoff)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, LONG_POLL_MAX_BACKOFF)
+
+    @staticmethod
+    def _long_poll_done(task: "asyncio.Future[None]") -> None:
+        if not task.cancelled() and task.exception() is not None:
+            _log.error("trigger long-poll stopped; falling back to regular polls", exc_info=task.exception())
+
     async def _update_watchlist(self, now: datetime) -> None:
-        apps_sink = next((s for s in self.telemetry.sinks if isinstance(s, AppsScriptSink)), None)
+        apps_sink = self._apps_sink()
         if not apps_sink:
             return
-        data = await apps_sink.fetch_watchlist()
+        data = await apps_sink.fetch_watchlist(self.config.store_id)
         self.policy.update_watchlist(data, now)
+        self.scheduler.clamp(self.policy.cadence_for(now), monotonic())
 
     def _update_failure_status(self, statuses: list[TargetStatus]) -> None:
         for status in statuses:
@@ -101,7 +203,20 @@ class GPingNextAgent(RDSIQCoreAgent):
             status.name: ("up" if status.up else status.code)
             for status in statuses
         }
-        self.ui.publish(color, self.last_failure, self.last_upload, summary)
+        self.ui.publish(
+            color, self.last_failure, self.last_upload, summary, self.telemetry.breaker_states(), self._diagnostics()
+        )
+
+    def _diagnostics(self) -> Dict[str, object]:
+        neighbors = self.prober.services.neighbors
+        return {
+            "neighbor_table": {
+                "reads": neighbors.reads,
+                "last_read_ms": neighbors.last_read_ms,
+                "source": neighbors.last_source,
+            },
+            "pools": self.telemetry.pool_stats(),
+        }
 
     def _register_default_tasks(self) -> None:
         self.register_task(
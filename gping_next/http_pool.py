@@ -0,0 +1,97 @@
+"""Idle HTTP/1.1 keep-alive connections held between probe cycles."""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+from collections import deque
+from dataclasses import dataclass
+from time import monotonic
+from typing import Deque, Dict, Optional, Tuple
+
+from rdsiq_core.http_client import stream_is_stale
+
+Stream = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+
+@dataclass(slots=True)
+class _Idle:
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+    since: float
+
+
+class KeepAlivePool:
+    """Small per-target pool of warm connections for keep-alive HEAD probes.
+
+    A warm probe measures request latency only. A cold connect (DNS/TCP/TLS
+    timings) is still forced every ``cold_every`` seconds per target so phase
+    timings never go stale. Connections idle past ``idle_timeout``, closed by
+    the peer, or that failed mid-request are evicted.
+    """
+
+    def __init__(self, max_idle: int = 1, idle_timeout: float = 300.0) -> None:
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._idle: Dict[str, Deque[_Idle]] = {}
+        self._last_cold: Dict[str, float] = {}
+
+    def cold_due(self, key: str, cold_every: float) -> bool:
+        last = self._last_cold.get(key)
+        return last is None or monotonic() - last >= cold_every
+
+    def mark_cold(self, key: str) -> None:
+        self._last_cold[key] = monotonic()
+
+    def checkout(self, key: str) -> Optional[Stream]:
+        idle = self._idle.get(key)
+        now = monotonic()
+        while idle:
+            entry = idle.pop()
+            if now - entry.since < self.idle_timeout and not _is_stale(entry):
+                self.hits += 1
+                return entry.reader, entry.writer
+            self._close(entry.writer)
+        self.misses += 1
+        return None
+
+    def checkin(self, key: str, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        idle = self._idle.setdefault(key, deque())
+        idle.append(_Idle(reader, writer, monotonic()))
+        while len(idle) > self.max_idle:
+            self._close(idle.popleft().writer)
+
+    def discard(self, writer: asyncio.StreamWriter) -> None:
+        self._close(writer)
+
+    def evict_idle(self) -> None:
+        now = monotonic()
+        for key, idle in list(self._idle.items()):
+            keep = deque(e for e in idle if now - e.since < self.idle_timeout and not _is_stale(e))
+            for entry in idle:
+                if entry not in keep:
+                    self._close(entry.writer)
+            if keep:
+                self._idle[key] = keep
+            else:
+                del self._idle[key]
+
+    def close(self) -> None:
+        for idle in self._idle.values():
+            for entry in idle:
+                self._close(entry.writer)
+        self._idle.clear()
+
+    def _close(self, writer: asyncio.StreamWriter) -> None:
+        self.evictions += 1
+        with contextlib.suppress(Exception):
+            writer.close()
+
+
+def _is_stale(entry: _Idle) -> bool:
+    return stream_is_stale(entry.reader, entry.writer)
+
+
+__all__ = ["KeepAlivePool"]
@@ -0,0 +1,121 @@
+"""Unprivileged ICMP echo over Linux ``SOCK_DGRAM`` ping sockets."""
+from __future__ import annotations
+
+import asyncio
+import socket
+import struct
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+_PAYLOAD = b"GPING-NEXT-ECHO!"
+
+
+class IcmpPinger:
+    """Coalesce echo requests issued in the same loop tick onto one socket.
+
+    Every ``ping()`` started while a probe cycle fans out is queued and sent
+    from a single ping socket (``net.ipv4.ping_group_range`` must include the
+    agent's group). Replies are matched by source address and sequence number;
+    the kernel owns the identifier field for these sockets.
+    """
+
+    def __init__(self) -> None:
+        self.sent = 0
+        self.received = 0
+        self.batches = 0
+        self._seq = 0
+        self._queue: List[Tuple[str, float, asyncio.Future]] = []
+        self._flush_scheduled = False
+
+    async def ping(self, ip: str, timeout: float) -> Optional[float]:
+        """Return the echo RTT in ms, ``None`` on timeout; raise ``OSError`` if unavailable."""
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future = loop.create_future()
+        self._queue.append((ip, timeout, future))
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            loop.call_soon(self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        batch, self._queue = self._queue, []
+        self._flush_scheduled = False
+        if batch:
+            asyncio.ensure_future(self._run_batch(batch))
+
+    async def _run_batch(self, batch: List[Tuple[str, float, asyncio.Future]]) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+        except OSError as exc:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        self.batches += 1
+        sock.setblocking(False)
+        pending: Dict[Tuple[str, int], Tuple[asyncio.Future, float]] = {}
+
+        def on_readable() -> None:
+            while True:
+                try:
+                    data, addr = sock.recvfrom(1024)
+                except (BlockingIOError, InterruptedError):
+                    return
+                except OSError:
+                    return
+                if len(data) < 8 or data[0] != ICMP_ECHO_REPLY:
+                    continue
+                seq = struct.unpack_from("!H", data, 6)[0]
+                entry = pending.pop((addr[0], seq), None)
+                if entry and not entry[0].done():
+                    self.received += 1
+                    entry[0].set_result((perf_counter() - entry[1]) * 1000)
+
+        def expire(key: Tuple[str, int]) -> None:
+            entry = pending.pop(key, None)
+            if entry and not entry[0].done():
+                entry[0].set_result(None)
+
+        loop.add_reader(sock.fileno(), on_readable)
+        timers = []
+        try:
+            for ip, timeout, future in batch:
+                self._seq = (self._seq + 1) & 0xFFFF
+                key = (ip, self._seq)
+                pending[key] = (future, perf_counter())
+                try:
+                    sock.sendto(_echo_request(self._seq), (ip, 0))
+                except OSError:
+                    pending.pop(key, None)
+                    if not future.done():
+                        future.set_result(None)
+                    continue
+                self.sent += 1
+                timers.append(loop.call_later(timeout, expire, key))
+            await asyncio.gather(*(future for _, _, future in batch), return_exceptions=True)
+        finally:
+            for timer in timers:
+                timer.cancel()
+            loop.remove_reader(sock.fileno())
+            sock.close()
+
+
+def _echo_request(seq: int) -> bytes:
+    header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, 0, seq)
+    checksum = _checksum(header + _PAYLOAD)
+    return struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, checksum, 0, seq) + _PAYLOAD
+
+
+def _checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+__all__ = ["IcmpPinger"]
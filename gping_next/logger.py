@@ -2,28 +2,39 @@
 from __future__ import annotations
 
 import csv
-import json
-from dataclasses import asdict
+from bisect import bisect_right
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 
-from .config import LOG_DIR
+from rdsiq_core.records import dumps
+
+from .config import LOG_DIR, DeltaBands
 from .schemas import HealthPayload, TargetStatus
+from .telemetry import HealthRecord
 
 
 CSV_HEADER = ["timestamp", "target", "up", "code", "tcp_ms", "tls_ms", "http_ms", "note"]
-JSON_HEADER = ["ts", "store", "targets"]
+JSON_HEADER = ["ts", "store", "targets", "reason"]
+LATENCY_FIELDS = ("tcp_ms", "tls_ms", "http_ms")
 
 
 class DeltaLogger:
-    """Write delta-only log files with periodic heartbeats."""
+    """Write delta-only log files with periodic heartbeats.
+
+    A cycle is a delta when a target appears, flips ``up``, changes ``code``
+    or ``note``, or one of its ``LATENCY_FIELDS`` moves significantly under
+    ``bands`` (see ``DeltaBands``); latencies are compared with the last
+    written value, or with a per-target EWMA when ``bands.ewma_alpha`` is set.
+    """
 
-    def __init__(self, store: str, heartbeat: timedelta) -> None:
+    def __init__(self, store: str, heartbeat: timedelta, bands: Optional[DeltaBands] = None) -> None:
         self.store = store
         self.heartbeat = heartbeat
+        self.bands = bands or DeltaBands()
         self._last_status: Dict[str, TargetStatus] = {}
         self._last_written: Optional[datetime] = None
+        self._baseline: Dict[Tuple[str, str], float] = {}
 
     def _log_paths(self, when: datetime) -> Dict[str, Path]:
         stamp = when.strftime("%m%d%Y")
@@ -40,38 +51,40 @@ class DeltaLogger:
             for row in rows:
                 writer.writerow(row)
 
-    def _write_json(self, json_path: Path, payload: HealthPayload) -> None:
-        record = {
-            "ts": payload.ts.isoformat(),
-            "store": payload.store,
-            "targets": [asdict(t) for t in payload.targets],
-        }
-        with json_path.open("a") as fh:
-            fh.write(json.dumps(record) + "\n")
+    def _write_json(self, json_path: Path, record: HealthRecord, reason: str) -> None:
+        line = record.json[:-1] + b',"reason":' + dumps(reason) + b"}\n"
+        with json_path.open("ab") as fh:
+            fh.write(line)
 
-    def should_emit(self, statuses: List[TargetStatus], now: datetime) -> bool:
+    def should_emit(self, statuses: List[TargetStatus], now: datetime) -> Optional[str]:
+        """Return why this cycle should be written and uploaded, or None."""
         if self._last_written is None:
-            return True
+            return "first"
         if now - self._last_written >= self.heartbeat:
-            return True
+            return "heartbeat"
         for status in statuses:
             previous = self._last_status.get(status.name)
             if previous is None:
-                return True
-            if (
-                previous.up != status.up
-                or previous.code != status.code
-                or previous.tcp_ms != status.tcp_ms
-                or previous.tls_ms != status.tls_ms
-                or previous.http_ms != status.http_ms
-                or previous.note != status.note
-            ):
-                return True
-        return False
-
-    def record(self, payload: HealthPayload) -> None:
+                return f"{status.name}: new target"
+            if previous.up != status.up:
+                return f"{status.name}: {'up' if status.up else 'down'}"
+            if previous.code != status.code:
+                return f"{status.name}: code {previous.code} -> {status.code}"
+            if previous.note != status.note:
+                return f"{status.name}: note changed"
+            for field in LATENCY_FIELDS:
+                reason = self._latency_change(status.name, field, getattr(previous, field), getattr(status, field))
+                if reason:
+                    return f"{status.name}: {reason}"
+        return None
+
+    def record(self, health: Union[HealthPayload, HealthRecord]) -> None:
+        """Log ``health`` if it is a delta; a ``HealthRecord`` is only built to write it."""
+        payload = health.source if isinstance(health, HealthRecord) else health
         now = payload.ts
-        if not self.should_emit(payload.targets, now):
+        reason = self.should_emit(payload.targets, now)
+        self._observe(payload.targets)
+        if not reason:
             return
         paths = self._log_paths(now)
         rows: List[List[str]] = []
@@ -90,10 +103,42 @@ class DeltaLogger:
             )
             self._last_status[status.name] = status
         self._write_csv_rows(paths["csv"], rows)
-        self._write_json(paths["json"], payload)
+        self._write_json(paths["json"], HealthRecord.of(health), reason)
         self._last_written = now
         self._cleanup(now)
 
+    def _latency_change(
+        self, name: str, field: str, previous: Optional[float], value: Optional[float]
+    ) -> Optional[str]:
+        baseline = self._baseline.get((name, field)) if self.bands.ewma_alpha else previous
+        if baseline is None or value is None:
+            if (baseline is None) == (value is None):
+                return None
+            return f"{field} {'missing' if value is None else 'appeared'}"
+        change = abs(value - baseline)
+        if change < self.bands.abs_ms:
+            return None
+        if change >= self.bands.rel * baseline:
+            return f"{field} {baseline:.1f} -> {value:.1f} ms"
+        buckets = self.bands.buckets_ms
+        if bisect_right(buckets, value) != bisect_right(buckets, baseline):
+            return f"{field} {baseline:.1f} -> {value:.1f} ms (bucket)"
+        return None
+
+    def _observe(self, statuses: Iterable[TargetStatus]) -> None:
+        alpha = self.bands.ewma_alpha
+        if not alpha:
+            return
+        for status in statuses:
+            for field in LATENCY_FIELDS:
+                key = (status.name, field)
+                value = getattr(status, field)
+                baseline = self._baseline.get(key)
+                if value is None:
+                    self._baseline.pop(key, None)
+                else:
+                    self._baseline[key] = value if baseline is None else baseline + alpha * (value - baseline)
+
     def _cleanup(self, now: datetime) -> None:
         horizon = now - timedelta(days=7)
         for path in LOG_DIR.glob("GPing*.csv"):
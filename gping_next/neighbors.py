@@ -0,0 +1,131 @@
+"""Cached neighbor (ARP) table used to classify failed probes."""
+from __future__ import annotations
+
+import asyncio
+import re
+import subprocess
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from time import monotonic, perf_counter
+from typing import Dict, Optional
+
+PROC_ARP = Path("/proc/net/arp")
+ATF_COM = 0x02
+_INCOMPLETE_MACS = {"00:00:00:00:00:00", "00-00-00-00-00-00", ""}
+_ARP_LINE = re.compile(
+    r"(?P<ip>\d{1,3}(?:\.\d{1,3}){3})\D+?(?P<mac>[0-9a-fA-F]{2}(?:[:-][0-9a-fA-F]{2}){5})"
+)
+
+
+@dataclass(slots=True)
+class NeighborEntry:
+    ip: str
+    mac: str
+    state: str
+    device: Optional[str] = None
+
+    @property
+    def resolved(self) -> bool:
+        return self.state != "incomplete" and self.mac not in _INCOMPLETE_MACS
+
+
+class NeighborTable:
+    """Exact IP -> neighbor index, read from the kernel at most once per cycle.
+
+    ``invalidate()`` is called by the probe runner at the start of each cycle;
+    the first failing probe afterwards pays for a single read and every other
+    failing probe in the cycle reuses the index. ``max_age`` bounds staleness
+    for callers that never invalidate.
+    """
+
+    def __init__(self, proc_path: Path = PROC_ARP, max_age: float = 30.0) -> None:
+        self.proc_path = proc_path
+        self.max_age = max_age
+        self.reads = 0
+        self.last_read_ms: Optional[float] = None
+        self.last_source: Optional[str] = None
+        self._index: Optional[Dict[str, NeighborEntry]] = None
+        self._read_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self) -> None:
+        self._index = None
+
+    async def lookup(self, ip: str) -> Optional[NeighborEntry]:
+        index = await self._current()
+        return index.get(ip)
+
+    async def has_entry(self, ip: str) -> bool:
+        entry = await self.lookup(ip)
+        return entry is not None and entry.resolved
+
+    async def _current(self) -> Dict[str, NeighborEntry]:
+        if self._fresh():
+            return self._index  # type: ignore[return-value]
+        async with self._lock:
+            if not self._fresh():
+                if self.proc_path.exists():
+                    self._store(self.read_sync(), "proc")
+                else:
+                    # Fallback platforms need a subprocess; keep it off the loop.
+                    self._store(await asyncio.to_thread(self.read_sync), "arp")
+            return self._index  # type: ignore[return-value]
+
+    def _fresh(self) -> bool:
+        return self._index is not None and (monotonic() - self._read_at) < self.max_age
+
+    def _store(self, index: Dict[str, NeighborEntry], source: str) -> None:
+        self._index = index
+        self._read_at = monotonic()
+        self.last_source = source
+
+    def read_sync(self) -> Dict[str, NeighborEntry]:
+        start = perf_counter()
+        try:
+            if self.proc_path.exists():
+                return parse_proc_arp(self.proc_path.read_text())
+            return parse_arp_output(_run_arp())
+        except Exception:
+            return {}
+        finally:
+            self.reads += 1
+            self.last_read_ms = (perf_counter() - start) * 1000
+
+
+def parse_proc_arp(text: str) -> Dict[str, NeighborEntry]:
+    index: Dict[str, NeighborEntry] = {}
+    for line in text.splitlines()[1:]:
+        parts = line.split()
+        if len(parts) < 6:
+            continue
+        ip, _hw_type, flags, mac, _mask, device = parts[:6]
+        try:
+            complete = int(flags, 16) & ATF_COM
+        except ValueError:
+            complete = 0
+        state = "reachable" if complete else "incomplete"
+        index[ip] = NeighborEntry(ip=ip, mac=mac.lower(), state=state, device=device)
+    return index
+
+
+def parse_arp_output(text: str) -> Dict[str, NeighborEntry]:
+    index: Dict[str, NeighborEntry] = {}
+    for line in text.splitlines():
+        match = _ARP_LINE.search(line)
+        if not match:
+            continue
+        ip = match.group("ip")
+        mac = match.group("mac").lower().replace("-", ":")
+        state = "incomplete" if mac in _INCOMPLETE_MACS else "reachable"
+        index[ip] = NeighborEntry(ip=ip, mac=mac, state=state)
+    return index
+
+
+def _run_arp() -> str:
+    cmd = ["arp", "-a"] if sys.platform.startswith("win") else ["arp", "-an"]
+    result = subprocess.run(cmd, capture_output=True, text=True, timeout=2)
+    return result.stdout if result.returncode == 0 else ""
+
+
+__all__ = ["NeighborEntry", "NeighborTable", "parse_arp_output", "parse_proc_arp"]
@@ -0,0 +1,159 @@
+"""Incremental hop localisation with TTL-limited UDP probes."""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import socket
+import struct
+import sys
+from dataclasses import dataclass
+from time import monotonic, perf_counter
+from typing import Dict, Iterable, List, Optional
+
+_LINUX = sys.platform.startswith("linux")
+# Python only exports IP_RECVERR from 3.12; the Linux value is stable.
+IP_RECVERR = getattr(socket, "IP_RECVERR", 11 if _LINUX else None)
+MSG_ERRQUEUE = getattr(socket, "MSG_ERRQUEUE", 0x2000 if _LINUX else None)
+SO_EE_ORIGIN_ICMP = 2
+ICMP_UNREACH = 3
+ICMP_PORT_UNREACH = 3
+BASE_PORT = 33434
+
+
+@dataclass(slots=True)
+class Hop:
+    ttl: int
+    addr: Optional[str] = None
+    rtt_ms: Optional[float] = None
+    reached: bool = False
+    icmp_type: Optional[int] = None
+
+
+async def probe_hops(dest: str, ttls: Iterable[int], timeout: float) -> Dict[int, Hop]:
+    """Send one UDP datagram per TTL in parallel and collect ICMP errors.
+
+    Uses ``IP_RECVERR`` so time-exceeded replies arrive on each socket's error
+    queue; no raw socket or elevated privilege is needed.
+    """
+    loop = asyncio.get_running_loop()
+    hops: Dict[int, Hop] = {}
+    sockets: List[socket.socket] = []
+    waiters: List[asyncio.Future] = []
+    try:
+        for ttl in ttls:
+            hop = hops[ttl] = Hop(ttl=ttl)
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sockets.append(sock)
+            sock.setblocking(False)
+            sock.setsockopt(socket.SOL_IP, IP_RECVERR, 1)
+            sock.setsockopt(socket.SOL_IP, socket.IP_TTL, ttl)
+            sock.connect((dest, BASE_PORT + ttl))
+            done = loop.create_future()
+            waiters.append(done)
+            loop.add_reader(sock.fileno(), _read_error, sock, hop, perf_counter(), done)
+            with contextlib.suppress(OSError):
+                sock.send(b"GPING")
+        if waiters:
+            await asyncio.wait(waiters, timeout=timeout)
+    finally:
+        for sock in sockets:
+            with contextlib.suppress(Exception):
+                loop.remove_reader(sock.fileno())
+            sock.close()
+    return hops
+
+
+def _read_error(sock: socket.socket, hop: Hop, sent: float, done: asyncio.Future) -> None:
+    try:
+        _, ancillary, _, _ = sock.recvmsg(64, 512, MSG_ERRQUEUE)
+    except (BlockingIOError, InterruptedError):
+        return
+    except OSError:
+        if not done.done():
+            done.set_result(None)
+        return
+    for level, kind, data in ancillary:
+        if level != socket.SOL_IP or kind != IP_RECVERR or len(data) < 24:
+            continue
+        _errno, origin, icmp_type, icmp_code = struct.unpack_from("=IBBB", data)
+        if origin != SO_EE_ORIGIN_ICMP:
+            continue
+        hop.addr = socket.inet_ntoa(data[20:24])
+        hop.rtt_ms = (perf_counter() - sent) * 1000
+        hop.icmp_type = icmp_type
+        hop.reached = icmp_type == ICMP_UNREACH and icmp_code == ICMP_PORT_UNREACH
+    if not done.done():
+        done.set_result(None)
+
+
+class PathProber:
+    """Cache a known-good path per target and localise breaks incrementally.
+
+    ``refresh`` probes every hop at once while the target is healthy (at most
+    once per ``baseline_ttl``). ``localize`` walks the cached path in windows of
+    ``window`` TTLs and stops at the first hop that no longer matches, so a
+    failing cycle costs a handful of datagrams instead of a full traceroute.
+    """
+
+    def __init__(self, max_hops: int = 16, window: int = 4, timeout: float = 1.0, baseline_ttl: float = 86400.0) -> None:
+        self.max_hops = max_hops
+        self.window = window
+        self.timeout = timeout
+        self.baseline_ttl = baseline_ttl
+        self.datagrams = 0
+        self._baselines: Dict[str, List[Optional[str]]] = {}
+        self._refreshed: Dict[str, float] = {}
+
+    @staticmethod
+    def supported() -> bool:
+        return IP_RECVERR is not None and MSG_ERRQUEUE is not None
+
+    def baseline(self, key: str) -> Optional[List[Optional[str]]]:
+        return self._baselines.get(key)
+
+    async def refresh(self, key: str, dest: str, force: bool = False) -> None:
+        last = self._refreshed.get(key)
+        if not force and last is not None and monotonic() - last < self.baseline_ttl:
+            return
+        hops = await self._probe(dest, range(1, self.max_hops + 1))
+        path: List[Optional[str]] = []
+        for ttl in range(1, self.max_hops + 1):
+            hop = hops[ttl]
+            path.append(hop.addr)
+            if hop.reached:
+                break
+        while path and path[-1] is None:
+            path.pop()
+        if path:
+            self._baselines[key] = path
+            self._refreshed[key] = monotonic()
+
+    async def localize(self, key: str, dest: str) -> Optional[str]:
+        """Return ``hopN:<expected>><seen> after=<last good>`` for the first diverging hop."""
+        baseline = self._baselines.get(key)
+        if not baseline:
+            hops = await self._probe(dest, range(1, self.max_hops + 1))
+            last = max((h for h in hops.values() if h.addr), key=lambda h: h.ttl, default=None)
+            return f"last_hop{last.ttl}:{last.addr}" if last else "hop1:*"
+        last_good = "local"
+        for first in range(1, len(baseline) + 1, self.window):
+            ttls = range(first, min(first + self.window, len(baseline) + 1))
+            hops = await self._probe(dest, ttls)
+            for ttl in ttls:
+                expected = baseline[ttl - 1]
+                seen = hops[ttl].addr
+                if expected is None and seen is None:
+                    continue
+                if seen != expected:
+                    got = seen or "*"
+                    return f"hop{ttl}:{expected or '*'}>{got} after={last_good}"
+                last_good = seen or last_good
+        return None
+
+    async def _probe(self, dest: str, ttls: Iterable[int]) -> Dict[int, Hop]:
+        ttls = list(ttls)
+        self.datagrams += len(ttls)
+        return await probe_hops(dest, ttls, self.timeout)
+
+
+__all__ = ["Hop", "PathProber", "probe_hops"]
@@ -4,82 +4,194 @@ from __future__ import annotations
 import asyncio
 import ssl
 import contextlib
-from datetime import datetime
+from dataclasses import dataclass, field
 from time import perf_counter
-from typing import List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 
+from .concurrency import AdaptiveLimiter
+from .http_pool import KeepAlivePool
+from .icmp import IcmpPinger
+from .neighbors import NeighborTable
+from .pathprobe import PathProber
+from .resolver import DnsCache, DnsError
+from .sampling import SampleBuffer, SampleStats
 from .schemas import TargetSpec, TargetStatus
+from .tcp_info import read_tcp_info
+from .tls_engine import TLSProbeEngine
+from .topology import ProbeTopology, blocked_by, upstream_down
+
+
+@dataclass(slots=True)
+class ProbeServices:
+    """Long-lived helpers shared by every probe across cycles."""
+
+    neighbors: NeighborTable = field(default_factory=NeighborTable)
+    tls: TLSProbeEngine = field(default_factory=TLSProbeEngine)
+    icmp: IcmpPinger = field(default_factory=IcmpPinger)
+    dns: DnsCache = field(default_factory=DnsCache)
+    http: KeepAlivePool = field(default_factory=KeepAlivePool)
+    paths: PathProber = field(default_factory=PathProber)
+
+
+_DEFAULT_SERVICES = ProbeServices()
 
 
 class ProbeRunner:
-    def __init__(self, concurrency: int = 3) -> None:
-        self._sem = asyncio.Semaphore(concurrency)
+    def __init__(
+        self,
+        concurrency: int = 3,
+        services: Optional[ProbeServices] = None,
+        max_concurrency: int = 16,
+        cycle_deadline: Optional[float] = 30.0,
+    ) -> None:
+        self.limiter = AdaptiveLimiter(floor=concurrency, ceiling=max_concurrency)
+        self.services = services or ProbeServices()
+        self.cycle_deadline = cycle_deadline
 
-    async def probe_all(self, targets: List[TargetSpec]) -> List[TargetStatus]:
-        results = await asyncio.gather(
-            *[self._probe_with_sem(target) for target in targets], return_exceptions=False
-        )
+    async def probe_all(
+        self, targets: List[TargetSpec], known: Optional[Dict[str, TargetStatus]] = None
+    ) -> List[TargetStatus]:
+        """Probe ``targets``; parents outside the batch are judged by ``known`` results."""
+        self.services.neighbors.invalidate()
+        self.services.http.evict_idle()
+        if not targets:
+            return []
+        known = known or {}
+        topology = ProbeTopology(targets, external=known)
+        tasks: Dict[str, asyncio.Future] = {}
+        for target in targets:
+            tasks[target.name] = asyncio.ensure_future(self._probe_after(target, topology, tasks, known))
+        tasks_in_order = [tasks[target.name] for target in targets]
+        _, pending = await asyncio.wait(tasks_in_order, timeout=self.cycle_deadline)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        results: List[TargetStatus] = []
+        for target, task in zip(targets, tasks_in_order):
+            if task.cancelled():
+                results.append(TargetStatus(name=target.name, up=False, code="cycle_deadline"))
+            elif task.exception() is not None:
+                # A probe bug is not a slow target: keep it distinguishable on the dashboard.
+                note = type(task.exception()).__name__
+                results.append(TargetStatus(name=target.name, up=False, code="probe_error", note=note))
+            else:
+                results.append(task.result())
         return results
 
-    async def _probe_with_sem(self, target: TargetSpec) -> TargetStatus:
-        async with self._sem:
-            return await probe_target(target)
+    async def _probe_after(
+        self,
+        target: TargetSpec,
+        topology: ProbeTopology,
+        tasks: Dict[str, asyncio.Future],
+        known: Dict[str, TargetStatus],
+    ) -> TargetStatus:
+        # Upstream nodes are probed first; a dead parent short-circuits this target
+        # without opening a socket. Independent branches proceed in parallel.
+        for parent in topology.parents(target.name):
+            result = known.get(parent)
+            if parent in tasks:
+                try:
+                    result = await tasks[parent]
+                except Exception:
+                    result = None  # the parent's probe crashed: its state is unknown, probe this one
+            if blocked_by(result):
+                return upstream_down(target, parent)
+        return await self._probe_limited(target)
+
+    async def _probe_limited(self, target: TargetSpec) -> TargetStatus:
+        if target.kind == "icmp":
+            # Echo requests are coalesced onto one socket; no connection slot needed.
+            return await probe_target(target, self.services)
+        await self.limiter.acquire()
+        held = True
 
+        def connected(latency_ms: Optional[float], timed_out: bool) -> None:
+            # The slot covers the connection attempt only, not the RTT samples after it.
+            nonlocal held
+            if held:
+                held = False
+                self.limiter.record(latency_ms, timed_out)
+                self.limiter.release()
 
-async def probe_target(target: TargetSpec) -> TargetStatus:
+        try:
+            status = await probe_target(target, self.services, on_connected=connected)
+        except BaseException:
+            if held:
+                held = False
+                self.limiter.release()
+            raise
+        connected(_latency(status), status.code in _TIMEOUT_CODES)
+        return status
+
+
+_TIMEOUT_CODES = {"tcp_timeout", "tls_timeout"}
+# Told the connect latency (ms) and whether it timed out, before the code is reclassified.
+ConnectedCallback = Callable[[Optional[float], bool], None]
+_ARP_HINT_CODES = {"tcp_timeout", "tcp_refused", "tls_fail", "tls_timeout"}
+_PATH_BREAK_CODES = {"tcp_timeout", "tls_timeout", "l2_present_l3_blocked"}
+
+
+async def probe_target(
+    target: TargetSpec,
+    services: Optional[ProbeServices] = None,
+    on_connected: Optional[ConnectedCallback] = None,
+) -> TargetStatus:
+    """Probe one target; ``on_connected`` fires once the connection attempt is over.
+
+    Path localization and extra RTT samples run after that point.
+    """
+    services = services or _DEFAULT_SERVICES
+    if target.kind == "icmp":
+        return await probe_icmp(target, services)
+    dns_ms: Optional[float] = None
     tcp_ms: Optional[float] = None
     tls_ms: Optional[float] = None
     http_ms: Optional[float] = None
     note: Optional[str] = None
     code = "unknown"
     up = False
-    ssl_context = None
-    if target.use_tls:
-        ssl_context = ssl.create_default_context()
-        if target.sni:
-            ssl_context.check_hostname = True
-    host = target.host
     port = target.port
+    server_name = target.sni or target.host
+    try:
+        resolution = await services.dns.resolve(target.host, target.timeout)
+    except DnsError as exc:
+        return TargetStatus(name=target.name, up=False, code="dns_fail", note=str(exc))
+    dns_ms = resolution.dns_ms
+    host = resolution.addresses[0]
+    keep_alive = target.keepalive and bool(target.http_path)
+    if keep_alive and not services.http.cold_due(target.name, target.cold_every):
+        warm = await _probe_warm(target, services.http)
+        if warm is not None:
+            return warm
+    phase = "tcp"
     reader = writer = None
+    handshake = kernel = None
+    pooled = False
     start = perf_counter()
     try:
-        connect_task = asyncio.open_connection(host, port, ssl=ssl_context, server_hostname=target.sni or host if ssl_context else None)
-        reader, writer = await asyncio.wait_for(connect_task, timeout=target.timeout)
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout=target.timeout)
         tcp_ms = (perf_counter() - start) * 1000
+        handshake = read_tcp_info(writer.get_extra_info("socket"))
         if target.use_tls:
-            tls_ms = tcp_ms
-            cert = writer.get_extra_info("peercert")
-            if cert:
-                cn = _extract_cn(cert)
-                expiry = _extract_expiry(cert)
-                details = []
-                if cn:
-                    details.append(f"CN={cn}")
-                if expiry:
-                    details.append(f"exp={expiry}")
-                if details:
-                    note = ", ".join(details)
+            phase = "tls"
+            tls_start = perf_counter()
+            note = await services.tls.upgrade(writer, server_name, target.tls_verify, target.timeout)
+            tls_ms = (perf_counter() - tls_start) * 1000
         if target.http_path:
-            http_start = perf_counter()
-            request = _build_head_request(target)
-            writer.write(request)
-            await writer.drain()
-            header_bytes = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=target.timeout)
-            http_ms = (perf_counter() - http_start) * 1000
-            status_line = header_bytes.split(b"\r\n", 1)[0].decode(errors="ignore")
-            status_code = int(status_line.split()[1])
-            if 400 <= status_code < 500:
-                code = "http_4xx"
-            elif 500 <= status_code < 600:
-                code = "http_5xx"
-            else:
-                code = "success"
-                up = True
+            phase = "http"
+            code, http_ms, reusable = await _head(reader, writer, target, keep_alive)
+            up = code == "success"
+            if keep_alive:
+                services.http.mark_cold(target.name)
+                if reusable:
+                    services.http.checkin(target.name, reader, writer)
+                    pooled = True
         else:
             code = "success"
             up = True
     except asyncio.TimeoutError:
-        code = "tcp_timeout"
+        code = "tls_timeout" if phase == "tls" else "tcp_timeout"
     except ConnectionRefusedError:
         code = "tcp_refused"
     except ssl.SSLError:
@@ -89,74 +201,174 @@ async def probe_target(target: TargetSpec) -> TargetStatus:
         note = str(exc)
     finally:
         if writer is not None:
+            kernel = read_tcp_info(writer.get_extra_info("socket"))
+            if target.use_tls:
+                services.tls.remember(writer, server_name, target.tls_verify)
+        if writer is not None and not pooled:
             writer.close()
             with contextlib.suppress(Exception):
                 await writer.wait_closed()
-    if not up and code in {"tcp_timeout", "tcp_refused", "tls_fail"}:
-        if await _has_arp_entry(host):
+    if on_connected is not None:
+        rtt = handshake.rtt_ms if handshake is not None and handshake.rtt_ms is not None else tcp_ms
+        on_connected(rtt, code in _TIMEOUT_CODES)
+    if not up and code in _ARP_HINT_CODES:
+        if await services.neighbors.has_entry(host):
             code = "l2_present_l3_blocked"
-    return TargetStatus(
+    status = TargetStatus(
         name=target.name,
         up=up,
         code=code,
+        dns_ms=dns_ms,
         tcp_ms=tcp_ms,
         tls_ms=tls_ms,
         http_ms=http_ms,
         note=note,
+        conn_reused=False if keep_alive else None,
     )
+    if handshake is not None:
+        status.handshake_rtt_ms = handshake.rtt_ms
+    if kernel is not None:
+        status.kernel_rtt_ms = kernel.rtt_ms
+        status.kernel_rttvar_ms = kernel.rttvar_ms
+        status.kernel_retrans = kernel.total_retrans
+    if target.path_probe and PathProber.supported() and ":" not in host:
+        if up:
+            await services.paths.refresh(target.name, host)
+        elif code in _PATH_BREAK_CODES:
+            status.path_break = await services.paths.localize(target.name, host)
+    if target.samples > 1:
+        first_ms = status.handshake_rtt_ms if status.handshake_rtt_ms is not None else tcp_ms
+        stats = await _sample_rtts(target, host, first_ms, start)
+        status.samples = stats.sent
+        status.loss_pct = stats.loss_pct
+        status.rtt_min_ms = stats.min_ms
+        status.rtt_p50_ms = stats.p50_ms
+        status.rtt_p95_ms = stats.p95_ms
+        status.jitter_ms = stats.jitter_ms
+    return status
+
+
+def _latency(status: TargetStatus) -> Optional[float]:
+    return status.handshake_rtt_ms if status.handshake_rtt_ms is not None else status.tcp_ms
+
+
+async def probe_icmp(target: TargetSpec, services: ProbeServices) -> TargetStatus:
+    try:
+        resolution = await services.dns.resolve(target.host, target.timeout)
+    except DnsError as exc:
+        return TargetStatus(name=target.name, up=False, code="dns_fail", note=str(exc))
+    ip = next((a for a in resolution.addresses if ":" not in a), resolution.addresses[0])
+    try:
+        rtt = await services.icmp.ping(ip, target.timeout)
+    except PermissionError:
+        return TargetStatus(name=target.name, up=False, code="icmp_unavailable", note="ping_group_range")
+    except OSError as exc:
+        return TargetStatus(name=target.name, up=False, code="icmp_unavailable", note=str(exc))
+    if rtt is not None:
+        return TargetStatus(name=target.name, up=True, code="success", dns_ms=resolution.dns_ms, icmp_ms=rtt)
+    code = "icmp_timeout"
+    if await services.neighbors.has_entry(ip):
+        code = "l2_present_l3_blocked"
+    return TargetStatus(name=target.name, up=False, code=code, dns_ms=resolution.dns_ms)
+
+
+async def _sample_rtts(target: TargetSpec, host: str, first_ms: Optional[float], started: float) -> SampleStats:
+    """Spread extra bare TCP connects across ``sample_budget`` seconds.
+
+    The full probe counts as the first sample. Samples that would not fit in the
+    remaining budget are not sent, so the per-target cost stays bounded.
+    """
+    buffer = SampleBuffer(target.samples)
+    buffer.add(first_ms)
+    spacing = target.sample_budget / buffer.capacity
+    deadline = started + target.sample_budget
+    index = 1
+    while not buffer.full():
+        send_at = started + index * spacing
+        index += 1
+        delay = send_at - perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        remaining = deadline - perf_counter()
+        if remaining <= 0:
+            break
+        buffer.add(await _tcp_rtt(host, target.port, min(target.timeout, remaining)))
+    return buffer.summarize()
 
 
-def _build_head_request(target: TargetSpec) -> bytes:
+async def _tcp_rtt(host: str, port: int, timeout: float) -> Optional[float]:
+    start = perf_counter()
+    writer = None
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout=timeout)
+        elapsed_ms = (perf_counter() - start) * 1000
+        # Prefer the kernel's handshake RTT: it excludes event-loop scheduling delay.
+        info = read_tcp_info(writer.get_extra_info("socket"))
+        return info.rtt_ms if info is not None else elapsed_ms
+    except Exception:
+        return None
+    finally:
+        if writer is not None:
+            writer.close()
+            with contextlib.suppress(Exception):
+                await writer.wait_closed()
+
+
+async def _probe_warm(target: TargetSpec, pool: KeepAlivePool) -> Optional[TargetStatus]:
+    """HEAD over a pooled connection; ``None`` means fall back to a cold connect."""
+    stream = pool.checkout(target.name)
+    if stream is None:
+        return None
+    reader, writer = stream
+    try:
+        code, http_ms, reusable = await _head(reader, writer, target, keep_alive=True)
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, OSError, ValueError, IndexError):
+        pool.discard(writer)
+        return None
+    if reusable:
+        pool.checkin(target.name, reader, writer)
+    else:
+        pool.discard(writer)
+    return TargetStatus(
+        name=target.name, up=code == "success", code=code, http_ms=http_ms, conn_reused=True
+    )
+
+
+async def _head(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, target: TargetSpec, keep_alive: bool
+) -> Tuple[str, float, bool]:
+    """Send one HEAD request; return (code, http_ms, connection reusable)."""
+    http_start = perf_counter()
+    writer.write(_build_head_request(target, keep_alive))
+    await writer.drain()
+    header_bytes = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=target.timeout)
+    http_ms = (perf_counter() - http_start) * 1000
+    lines = header_bytes.split(b"\r\n")
+    status_code = int(lines[0].decode(errors="ignore").split()[1])
+    if 400 <= status_code < 500:
+        code = "http_4xx"
+    elif 500 <= status_code < 600:
+        code = "http_5xx"
+    else:
+        code = "success"
+    reusable = keep_alive and lines[0].startswith(b"HTTP/1.1") and not any(
+        line.lower().replace(b" ", b"") == b"connection:close" for line in lines[1:]
+    )
+    return code, http_ms, reusable
+
+
+def _build_head_request(target: TargetSpec, keep_alive: bool = False) -> bytes:
     host_header = target.sni or target.host
     path = target.http_path or "/"
     lines = [
         f"HEAD {path} HTTP/1.1",
         f"Host: {host_header}",
         "User-Agent: GPING-NEXT/1.0",
-        "Connection: close",
+        "Connection: keep-alive" if keep_alive else "Connection: close",
         "",
         "",
     ]
     return "\r\n".join(lines).encode()
 
 
-async def _has_arp_entry(host: str) -> bool:
-    loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(None, _check_arp_sync, host)
-
-
-def _check_arp_sync(host: str) -> bool:
-    import subprocess
-
-    commands = [["arp", "-a"], ["ip", "neigh"]]
-    for cmd in commands:
-        try:
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=2)
-            if result.returncode == 0 and host in result.stdout:
-                return True
-        except Exception:
-            continue
-    return False
-
-
-def _extract_cn(cert: dict) -> Optional[str]:
-    subject = cert.get("subject", [])
-    for attrs in subject:
-        for key, value in attrs:
-            if key == "commonName":
-                return value
-    return None
-
-
-def _extract_expiry(cert: dict) -> Optional[str]:
-    expiry = cert.get("notAfter")
-    if not expiry:
-        return None
-    try:
-        parsed = datetime.strptime(expiry, "%b %d %H:%M:%S %Y %Z")
-        return parsed.date().isoformat()
-    except Exception:
-        return expiry
-
-
-__all__ = ["ProbeRunner", "probe_target"]
+__all__ = ["ProbeRunner", "ProbeServices", "probe_icmp", "probe_target"]
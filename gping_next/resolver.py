@@ -0,0 +1,274 @@
+"""TTL-respecting DNS cache shared by every probe."""
+from __future__ import annotations
+
+import asyncio
+import random
+import socket
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+from time import monotonic, perf_counter
+from typing import Dict, List, Optional, Tuple
+
+RESOLV_CONF = Path("/etc/resolv.conf")
+HOSTS_FILE = Path("/etc/hosts")
+Nameserver = Tuple[str, int]
+
+
+class DnsError(Exception):
+    """Name could not be resolved (NXDOMAIN, no A records, or no answer)."""
+
+
+@dataclass(slots=True)
+class Resolution:
+    addresses: List[str]
+    dns_ms: Optional[float] = None
+    cached: bool = False
+
+
+@dataclass(slots=True)
+class _Entry:
+    addresses: List[str]
+    expires: float
+    error: Optional[str] = None
+
+
+@dataclass(slots=True)
+class _Stats:
+    queries: int = 0
+    hits: int = 0
+    failures: int = 0
+
+
+class DnsCache:
+    """Resolve target names once per TTL instead of once per probe.
+
+    Dotted names are queried directly against the system nameservers so the
+    answer TTL can be honoured (clamped to ``min_ttl``/``max_ttl``); failures
+    are cached for ``negative_ttl``. Single-label names, names in the hosts
+    file, platforms without ``resolv.conf`` and names the direct query cannot
+    answer (NXDOMAIN, no A records) go through ``getaddrinfo`` for any address
+    family and are cached for ``default_ttl``. Concurrent lookups of one name share a
+    single query.
+    """
+
+    def __init__(
+        self,
+        nameservers: Optional[List[Nameserver]] = None,
+        timeout: float = 2.0,
+        min_ttl: float = 5.0,
+        max_ttl: float = 3600.0,
+        default_ttl: float = 60.0,
+        negative_ttl: float = 15.0,
+    ) -> None:
+        self.nameservers = nameservers if nameservers is not None else _system_nameservers()
+        self.timeout = timeout
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.default_ttl = default_ttl
+        self.negative_ttl = negative_ttl
+        self.stats = _Stats()
+        self._cache: Dict[str, _Entry] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._hosts = _read_hosts()
+
+    async def resolve(self, host: str, timeout: Optional[float] = None) -> Resolution:
+        if _is_ip(host):
+            return Resolution(addresses=[host])
+        name = host.rstrip(".").lower()
+        entry = self._cache.get(name)
+        if entry and entry.expires > monotonic():
+            self.stats.hits += 1
+            if entry.error:
+                raise DnsError(entry.error)
+            return Resolution(addresses=entry.addresses, cached=True)
+        waiter = self._inflight.get(name)
+        if waiter is None:
+            waiter = asyncio.ensure_future(self._lookup(name, timeout or self.timeout))
+            self._inflight[name] = waiter
+            waiter.add_done_callback(self._lookup_done(name))
+        return await asyncio.shield(waiter)
+
+    def _lookup_done(self, name: str):
+        def done(future: asyncio.Future) -> None:
+            self._inflight.pop(name, None)
+            if not future.cancelled():
+                future.exception()  # waiters may all have been cancelled
+
+        return done
+
+    async def _lookup(self, name: str, timeout: float) -> Resolution:
+        start = perf_counter()
+        self.stats.queries += 1
+        try:
+            addresses, ttl = await self._query(name, timeout)
+        except (DnsError, OSError, asyncio.TimeoutError) as exc:
+            self.stats.failures += 1
+            reason = str(exc) or exc.__class__.__name__
+            self._cache[name] = _Entry([], monotonic() + self.negative_ttl, error=reason)
+            raise DnsError(reason) from None
+        ttl = min(self.max_ttl, max(self.min_ttl, ttl))
+        self._cache[name] = _Entry(addresses, monotonic() + ttl)
+        return Resolution(addresses=addresses, dns_ms=(perf_counter() - start) * 1000)
+
+    async def _query(self, name: str, timeout: float) -> Tuple[List[str], float]:
+        if name in self._hosts:
+            return self._hosts[name], self.default_ttl
+        if "." not in name or not self.nameservers:
+            return await self._getaddrinfo(name, timeout)
+        last_error: Exception = DnsError("no nameserver answered")
+        for server in self.nameservers:
+            try:
+                return await asyncio.wait_for(_udp_query(name, server), timeout=timeout)
+            except _Truncated:
+                return await self._getaddrinfo(name, timeout)
+            except DnsError as exc:
+                # Search domains, mDNS and AAAA-only names still resolve through the system.
+                try:
+                    return await self._getaddrinfo(name, timeout)
+                except (DnsError, OSError, asyncio.TimeoutError):
+                    raise exc from None
+            except (OSError, asyncio.TimeoutError) as exc:
+                last_error = exc
+        raise last_error
+
+    async def _getaddrinfo(self, name: str, timeout: float) -> Tuple[List[str], float]:
+        loop = asyncio.get_running_loop()
+        try:
+            infos = await asyncio.wait_for(
+                loop.getaddrinfo(name, None, family=socket.AF_UNSPEC, type=socket.SOCK_STREAM), timeout=timeout
+            )
+        except socket.gaierror as exc:
+            raise DnsError(str(exc)) from None
+        # IPv4 first: the ICMP and path probes only speak IPv4.
+        infos = sorted(infos, key=lambda info: info[0] != socket.AF_INET)
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        if not addresses:
+            raise DnsError("no addresses")
+        return addresses, self.default_ttl
+
+
+class _Truncated(Exception):
+    pass
+
+
+class _DnsProtocol(asyncio.DatagramProtocol):
+    def __init__(self, future: asyncio.Future, query_id: int) -> None:
+        self.future = future
+        self.query_id = query_id
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        if len(data) >= 2 and struct.unpack_from("!H", data)[0] == self.query_id and not self.future.done():
+            self.future.set_result(data)
+
+    def error_received(self, exc: Exception) -> None:
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+
+async def _udp_query(name: str, server: Nameserver) -> Tuple[List[str], float]:
+    loop = asyncio.get_running_loop()
+    query_id = random.getrandbits(16)
+    future: asyncio.Future = loop.create_future()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: _DnsProtocol(future, query_id), remote_addr=server
+    )
+    try:
+        transport.sendto(build_query(name, query_id))
+        return parse_response(await future, query_id)
+    finally:
+        transport.close()
+
+
+def build_query(name: str, query_id: int) -> bytes:
+    header = struct.pack("!HHHHHH", query_id, 0x0100, 1, 0, 0, 0)
+    return header + _encode_name(name) + struct.pack("!HH", 1, 1)
+
+
+def parse_response(data: bytes, query_id: int) -> Tuple[List[str], float]:
+    rid, flags, qdcount, ancount, _, _ = struct.unpack_from("!HHHHHH", data)
+    if rid != query_id:
+        raise DnsError("mismatched response id")
+    if flags & 0x0200:
+        raise _Truncated()
+    rcode = flags & 0x000F
+    if rcode == 3:
+        raise DnsError("NXDOMAIN")
+    if rcode:
+        raise DnsError(f"rcode={rcode}")
+    offset = 12
+    for _ in range(qdcount):
+        offset = _skip_name(data, offset) + 4
+    addresses: List[str] = []
+    ttl: Optional[float] = None
+    for _ in range(ancount):
+        offset = _skip_name(data, offset)
+        rtype, _rclass, rttl, rdlength = struct.unpack_from("!HHIH", data, offset)
+        offset += 10
+        if rtype in (1, 5):
+            ttl = float(rttl) if ttl is None else min(ttl, float(rttl))
+        if rtype == 1 and rdlength == 4:
+            addresses.append(socket.inet_ntoa(data[offset : offset + 4]))
+        offset += rdlength
+    if not addresses:
+        raise DnsError("no A records")
+    return addresses, ttl or 0.0
+
+
+def _encode_name(name: str) -> bytes:
+    out = b""
+    for label in name.rstrip(".").split("."):
+        raw = label.encode("idna")
+        out += bytes([len(raw)]) + raw
+    return out + b"\0"
+
+
+def _skip_name(data: bytes, offset: int) -> int:
+    while True:
+        length = data[offset]
+        if length == 0:
+            return offset + 1
+        if length & 0xC0 == 0xC0:
+            return offset + 2
+        offset += length + 1
+
+
+def _is_ip(host: str) -> bool:
+    for family in (socket.AF_INET, socket.AF_INET6):
+        try:
+            socket.inet_pton(family, host)
+            return True
+        except OSError:
+            continue
+    return False
+
+
+def _system_nameservers() -> List[Nameserver]:
+    try:
+        lines = RESOLV_CONF.read_text().splitlines()
+    except OSError:
+        return []
+    servers = []
+    for line in lines:
+        parts = line.split()
+        if len(parts) >= 2 and parts[0] == "nameserver" and ":" not in parts[1]:
+            servers.append((parts[1], 53))
+    return servers
+
+
+def _read_hosts() -> Dict[str, List[str]]:
+    try:
+        lines = HOSTS_FILE.read_text().splitlines()
+    except OSError:
+        return {}
+    hosts: Dict[str, List[str]] = {}
+    for line in lines:
+        parts = line.split("#", 1)[0].split()
+        if len(parts) < 2 or ":" in parts[0]:
+            continue
+        for alias in parts[1:]:
+            hosts.setdefault(alias.lower(), []).append(parts[0])
+    return hosts
+
+
+__all__ = ["DnsCache", "DnsError", "Resolution", "build_query", "parse_response"]
@@ -0,0 +1,88 @@
+"""Compact latency sample buffers and distribution summaries."""
+from __future__ import annotations
+
+import math
+from array import array
+from dataclasses import dataclass
+from typing import Iterable, Optional, Tuple
+
+MAX_SAMPLES = 20
+LOST = math.nan
+
+
+@dataclass(slots=True)
+class SampleStats:
+    sent: int
+    lost: int
+    loss_pct: float
+    min_ms: Optional[float] = None
+    p50_ms: Optional[float] = None
+    p95_ms: Optional[float] = None
+    jitter_ms: Optional[float] = None
+
+
+class SampleBuffer:
+    """Fixed-capacity ``array('d')`` of RTT samples; NaN marks a lost sample."""
+
+    __slots__ = ("capacity", "_values")
+
+    def __init__(self, capacity: int = MAX_SAMPLES) -> None:
+        self.capacity = max(1, min(capacity, MAX_SAMPLES))
+        self._values = array("d")
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def full(self) -> bool:
+        return len(self._values) >= self.capacity
+
+    def add(self, value_ms: Optional[float]) -> None:
+        if not self.full():
+            self._values.append(LOST if value_ms is None else value_ms)
+
+    def summarize(self) -> SampleStats:
+        sent = len(self._values)
+        received = [v for v in self._values if not math.isnan(v)]
+        lost = sent - len(received)
+        loss_pct = round(100.0 * lost / sent, 1) if sent else 0.0
+        if not received:
+            return SampleStats(sent=sent, lost=lost, loss_pct=loss_pct)
+        ordered = sorted(received)
+        jitter = None
+        if len(received) > 1:
+            # Mean absolute difference between consecutive replies (RFC 3550 style).
+            diffs = [abs(b - a) for a, b in zip(received, received[1:])]
+            jitter = round(sum(diffs) / len(diffs), 2)
+        return SampleStats(
+            sent=sent,
+            lost=lost,
+            loss_pct=loss_pct,
+            min_ms=round(ordered[0], 2),
+            p50_ms=round(_percentile(ordered, 50), 2),
+            p95_ms=round(_percentile(ordered, 95), 2),
+            jitter_ms=jitter,
+        )
+
+
+def _percentile(ordered: list, pct: float) -> float:
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def aggregate(stats: Iterable[Tuple[Optional[int], Optional[float], Optional[float]]]) -> Tuple[Optional[float], Optional[float]]:
+    """Fold per-target (samples, loss_pct, jitter_ms) into store-wide loss and worst jitter."""
+    sent = lost = 0.0
+    worst_jitter: Optional[float] = None
+    for samples, loss_pct, jitter_ms in stats:
+        if not samples or loss_pct is None:
+            continue
+        sent += samples
+        lost += samples * loss_pct / 100.0
+        if jitter_ms is not None and (worst_jitter is None or jitter_ms > worst_jitter):
+            worst_jitter = jitter_ms
+    if not sent:
+        return None, None
+    return round(100.0 * lost / sent, 1), worst_jitter
+
+
+__all__ = ["MAX_SAMPLES", "SampleBuffer", "SampleStats", "aggregate"]
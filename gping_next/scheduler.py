@@ -0,0 +1,67 @@
+"""Per-target probe schedules kept in a min-heap of due times."""
+from __future__ import annotations
+
+import heapq
+import random
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .schemas import TargetSpec
+
+
+class TargetScheduler:
+    """Fire only the targets that are due.
+
+    Times are monotonic seconds. Each target has one live heap entry; entries
+    superseded by a reschedule are skipped lazily when popped, so ``due()`` and
+    ``reschedule()`` cost O(log n) per target actually probed.
+    """
+
+    def __init__(self, targets: Iterable[TargetSpec], rng: Optional[random.Random] = None) -> None:
+        self._rng = rng or random.Random()
+        self._specs: Dict[str, TargetSpec] = {}
+        self._order: Dict[str, int] = {}
+        self._due_at: Dict[str, float] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        for index, target in enumerate(targets):
+            self._specs[target.name] = target
+            self._order[target.name] = index
+            self._push(target.name, float("-inf"))
+
+    def due(self, now: float) -> List[TargetSpec]:
+        fired: List[str] = []
+        while self._heap and self._heap[0][0] <= now:
+            due_at, _, name = heapq.heappop(self._heap)
+            if self._due_at.get(name) == due_at:
+                del self._due_at[name]
+                fired.append(name)
+        fired.sort(key=self._order.__getitem__)
+        return [self._specs[name] for name in fired]
+
+    def reschedule(self, targets: Iterable[TargetSpec], now: float, default_interval: float) -> None:
+        for target in targets:
+            if target.name not in self._specs:
+                continue
+            interval = target.interval if target.interval else default_interval
+            jitter = self._rng.uniform(0.0, target.jitter) if target.jitter > 0 else 0.0
+            self._push(target.name, now + interval + jitter)
+
+    def clamp(self, max_delay: float, now: float) -> None:
+        """Pull cadence-driven targets (no explicit interval) in to ``now + max_delay``."""
+        limit = now + max_delay
+        for name, due_at in list(self._due_at.items()):
+            if self._specs[name].interval is None and due_at > limit:
+                self._push(name, limit)
+
+    def next_delay(self, now: float) -> Optional[float]:
+        while self._heap and self._due_at.get(self._heap[0][2]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - now)
+
+    def _push(self, name: str, due_at: float) -> None:
+        self._due_at[name] = due_at
+        heapq.heappush(self._heap, (due_at, self._order[name], name))
+
+
+__all__ = ["TargetScheduler"]
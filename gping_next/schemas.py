@@ -15,6 +15,16 @@ class TargetSpec:
     http_path: Optional[str] = None
     sni: Optional[str] = None
     timeout: float = 3.0
+    tls_verify: bool = True
+    samples: int = 1
+    sample_budget: float = 2.0
+    depends_on: List[str] = field(default_factory=list)
+    interval: Optional[float] = None
+    jitter: float = 0.0
+    keepalive: bool = False
+    cold_every: float = 3600.0
+    path_probe: bool = False
+    kind: str = "tcp"
 
 
 @dataclass(slots=True)
@@ -22,10 +32,24 @@ class TargetStatus:
     name: str
     up: bool
     code: str
+    dns_ms: Optional[float] = None
     tcp_ms: Optional[float] = None
     tls_ms: Optional[float] = None
     http_ms: Optional[float] = None
     note: Optional[str] = None
+    icmp_ms: Optional[float] = None
+    conn_reused: Optional[bool] = None
+    handshake_rtt_ms: Optional[float] = None
+    kernel_rtt_ms: Optional[float] = None
+    kernel_rttvar_ms: Optional[float] = None
+    kernel_retrans: Optional[int] = None
+    path_break: Optional[str] = None
+    samples: Optional[int] = None
+    loss_pct: Optional[float] = None
+    rtt_min_ms: Optional[float] = None
+    rtt_p50_ms: Optional[float] = None
+    rtt_p95_ms: Optional[float] = None
+    jitter_ms: Optional[float] = None
 
 
 @dataclass(slots=True)
@@ -33,6 +57,8 @@ class HealthPayload:
     ts: datetime
     store: str
     targets: List[TargetStatus]
+    loss_pct: Optional[float] = None
+    jitter_ms: Optional[float] = None
 
 
 @dataclass(slots=True)
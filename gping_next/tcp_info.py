@@ -0,0 +1,50 @@
+"""Kernel TCP statistics (``TCP_INFO``) for probe connections."""
+from __future__ import annotations
+
+import socket
+import struct
+from dataclasses import dataclass
+from typing import Any, Optional
+
+# struct tcp_info (linux/tcp.h): 8 single-byte fields, then u32 counters.
+_TCP_INFO_LEN = 104
+_RETRANSMITS_OFFSET = 2
+_RTT_OFFSET = 68
+_RTTVAR_OFFSET = 72
+_TOTAL_RETRANS_OFFSET = 100
+TCP_INFO = getattr(socket, "TCP_INFO", None)
+
+
+@dataclass(slots=True)
+class TcpInfo:
+    rtt_ms: float
+    rttvar_ms: float
+    retransmits: int
+    total_retrans: int
+
+
+def read_tcp_info(sock: Any) -> Optional[TcpInfo]:
+    """Return the kernel's smoothed RTT and retransmit counters, or ``None`` off Linux."""
+    if sock is None or TCP_INFO is None:
+        return None
+    try:
+        raw = sock.getsockopt(socket.IPPROTO_TCP, TCP_INFO, _TCP_INFO_LEN)
+    except (OSError, AttributeError):
+        return None
+    return parse_tcp_info(raw)
+
+
+def parse_tcp_info(raw: bytes) -> Optional[TcpInfo]:
+    if len(raw) < _TCP_INFO_LEN:
+        return None
+    rtt_us, rttvar_us = struct.unpack_from("=II", raw, _RTT_OFFSET)
+    (total_retrans,) = struct.unpack_from("=I", raw, _TOTAL_RETRANS_OFFSET)
+    return TcpInfo(
+        rtt_ms=rtt_us / 1000.0,
+        rttvar_ms=rttvar_us / 1000.0,
+        retransmits=raw[_RETRANSMITS_OFFSET],
+        total_retrans=total_retrans,
+    )
+
+
+__all__ = ["TcpInfo", "read_tcp_info", "parse_tcp_info"]
@@ -1,8 +1,12 @@
 """GPING NEXT telemetry wrappers built on the RDSIQ core manager."""
 from __future__ import annotations
 
-from dataclasses import asdict
-from typing import Dict
+import base64
+import json
+from dataclasses import fields
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
 
 from rdsiq_core.config import QUEUE_DIR as CORE_QUEUE_DIR
 from rdsiq_core.telemetry import (
@@ -14,32 +18,502 @@ from rdsiq_core.telemetry import (
     TelemetrySink,
     VigilixPlaceholderSink,
 )
+from rdsiq_core.records import EncodedRecord, compile_encoder
 
-from .schemas import HealthPayload, InventoryPayload
+from .schemas import HealthPayload, InventoryPayload, TargetStatus
 
 
 QUEUE_DIR = CORE_QUEUE_DIR
 
 
+KEYFRAME_EVERY = 12
+
+
 class TelemetryManager(BaseTelemetryManager):
     def __init__(self, config) -> None:
         super().__init__(config, queue_dir=QUEUE_DIR)
+        self.health_encoder = HealthDeltaEncoder(state_path=QUEUE_DIR / "health_seq.json")
+
+    def request_keyframe(self) -> None:
+        self.health_encoder.request_keyframe()
 
-    async def send_health(self, payload: HealthPayload) -> None:
-        data = _serialize_health(payload)
-        await self.send_payload("health", data, payload.ts, payload.store)
+    async def send_health(self, payload: Union[HealthPayload, "HealthRecord"]) -> None:
+        record = HealthRecord.of(payload)
+        data = self.health_encoder.encode(record)
+        await self.send_payload("health", data, record.source.ts, record.source.store)
+
+    def pack_backlog(self, records: List[Dict[str, object]]) -> List[Dict[str, object]]:
+        return pack_health_history(records)
 
     async def send_inventory(self, payload: InventoryPayload) -> None:
         data = _serialize_inventory(payload)
         await self.send_payload("inventory", data, payload.ts, payload.store)
 
 
+encode_target = compile_encoder(TargetStatus)
+
+
+class HealthRecord(EncodedRecord):
+    """A ``HealthPayload`` serialized once per cycle.
+
+    The logger, the delta encoder, the queue and every sink share its JSON
+    bytes (and lazily compressed gzip) instead of re-encoding the payload.
+    ``source`` keeps the payload it was built from.
+    """
+
+    __slots__ = ("source",)
+
+    def __init__(self, payload: HealthPayload) -> None:
+        super().__init__(_serialize_health(payload))
+        self.source = payload
+
+    @classmethod
+    def of(cls, payload: Union[HealthPayload, "HealthRecord"]) -> "HealthRecord":
+        return payload if isinstance(payload, HealthRecord) else cls(payload)
+
+
 def _serialize_health(payload: HealthPayload) -> Dict[str, object]:
-    return {
+    data: Dict[str, object] = {
         "ts": payload.ts.isoformat(),
         "store": payload.store,
-        "targets": [asdict(target) for target in payload.targets],
+        "targets": [encode_target(target) for target in payload.targets],
     }
+    if payload.loss_pct is not None:
+        data["loss_pct"] = payload.loss_pct
+        data["jitter_ms"] = payload.jitter_ms
+    return data
+
+
+class HealthDeltaEncoder:
+    """Turn successive health payloads into keyframes and status deltas.
+
+    Every upload carries a per-store ``seq`` that keeps increasing across
+    restarts (persisted in ``state_path``). A ``"key"`` frame lists every
+    target; it is sent first, every ``keyframe_every`` uploads and after
+    ``request_keyframe()``. A ``"delta"`` frame lists only targets with any
+    field (latencies included) changed since the previous upload, plus
+    ``removed`` names.
+    ``HealthDeltaDecoder`` rebuilds the full target list.
+    """
+
+    def __init__(self, keyframe_every: int = KEYFRAME_EVERY, state_path: Optional[Path] = None) -> None:
+        self.keyframe_every = keyframe_every
+        self.state_path = state_path
+        self.seq = self._load_seq()
+        self._last: Dict[str, Dict[str, object]] = {}
+        self._since_key: Optional[int] = None
+
+    def request_keyframe(self) -> None:
+        self._since_key = None
+
+    def encode(self, payload: Union[HealthPayload, HealthRecord]) -> Dict[str, object]:
+        record = HealthRecord.of(payload)
+        targets: List[Dict[str, object]] = record["targets"]  # type: ignore[assignment]
+        # Whole serialized targets: a latency-only upload must carry the new latency.
+        current = {str(t["name"]): t for t in targets}
+        self.seq += 1
+        self._save_seq()
+        keyframe = self._since_key is None or self._since_key + 1 >= self.keyframe_every
+        if keyframe:
+            # A keyframe is the full record plus two keys: splice, don't re-encode.
+            data: Dict[str, object] = record.extend(seq=self.seq, kind="key")
+            self._since_key = 0
+        else:
+            data = dict(record, seq=self.seq, kind="delta")
+            data["targets"] = [t for t in targets if self._last.get(str(t["name"])) != current[str(t["name"])]]
+            data["removed"] = [name for name in self._last if name not in current]
+            self._since_key = (self._since_key or 0) + 1
+        self._last = current
+        return data
+
+    def _load_seq(self) -> int:
+        if self.state_path is None:
+            return 0
+        try:
+            return int(json.loads(self.state_path.read_text()).get("seq", 0))
+        except (OSError, ValueError, TypeError, AttributeError):
+            return 0
+
+    def _save_seq(self) -> None:
+        if self.state_path is None:
+            return
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"seq": self.seq}))
+        tmp.replace(self.state_path)
+
+
+class HealthDeltaDecoder:
+    """Reference decoder: rebuild full per-store state from key/delta frames.
+
+    Frames older than the last applied ``seq`` are ignored. A delta that
+    arrives after a seq gap is still applied, but ``stale`` is set for that
+    store until the next keyframe because a dropped delta may have carried a
+    change.
+    """
+
+    def __init__(self) -> None:
+        self.state: Dict[str, Dict[str, Dict[str, object]]] = {}
+        self.last_seq: Dict[str, int] = {}
+        self.stale: Dict[str, bool] = {}
+
+    def apply(self, frame: Dict[str, object]) -> Dict[str, object]:
+        store = str(frame.get("store"))
+        seq = int(frame.get("seq", 0))  # type: ignore[arg-type]
+        last = self.last_seq.get(store)
+        targets: List[Dict[str, object]] = frame.get("targets") or []  # type: ignore[assignment]
+        if last is not None and seq <= last:
+            return self.snapshot(store)
+        if frame.get("kind") == "delta" and store in self.state:
+            merged = self.state[store]
+            for name in frame.get("removed") or []:  # type: ignore[union-attr]
+                merged.pop(str(name), None)
+            for target in targets:
+                merged[str(target["name"])] = dict(target)
+            if last is not None and seq != last + 1:
+                self.stale[store] = True
+        else:
+            self.state[store] = {str(t["name"]): dict(t) for t in targets}
+            self.stale[store] = frame.get("kind") == "delta"
+        self.last_seq[store] = seq
+        snapshot = self.snapshot(store)
+        snapshot["ts"] = frame.get("ts")
+        return snapshot
+
+    def snapshot(self, store: str) -> Dict[str, object]:
+        return {
+            "store": store,
+            "seq": self.last_seq.get(store),
+            "stale": self.stale.get(store, True),
+            "targets": list(self.state.get(store, {}).values()),
+        }
+
+
+HISTORY_ENCODING = "gh1"
+_HISTORY_MAGIC = b"GH1"
+_SCALE = 100  # float columns are quantized to 1/100 (0.01 ms for *_ms fields)
+_EPOCH = datetime(1970, 1, 1)
+# Frame keys that may be absent, in presence-mask bit order.
+_FRAME_OPTIONAL = ("seq", "kind", "removed", "loss_pct", "jitter_ms")
+_FRAME_KEYS = {"ts", "store", "targets", *_FRAME_OPTIONAL}
+
+
+def _field_kind(annotation: str) -> str:
+    base = annotation.replace("Optional[", "").rstrip("]")
+    return {"str": "str", "bool": "bool", "float": "float", "int": "int"}[base]
+
+
+_TARGET_FIELDS: List[Tuple[str, str]] = [(f.name, _field_kind(str(f.type))) for f in fields(TargetStatus)]
+_TARGET_KEYS = {name for name, _ in _TARGET_FIELDS}
+
+
+def encode_health_history(frames: Sequence[Dict[str, object]]) -> bytes:
+    """Columnar encoding of serialized health frames (key or delta).
+
+    Timestamps are delta-of-delta microseconds; every float column is
+    quantized to 1/100 and delta-coded against the same target's previous
+    value; strings (``name``, ``code``, ``note``, store, kind...) go through one
+    dictionary; booleans are tri-state. All integers are zigzag varints,
+    written column by column so repeated values sit next to each other.
+    ``decode_health_history`` is the reference decoder.
+    """
+    strings = _StringTable()
+    out = _Writer()
+    ts_col, store_col, mask_col, count_col = [], [], [], []
+    seq_col, kind_col, removed_col, frame_floats = [], [], [], []
+    rows: List[Dict[str, object]] = []
+    for frame in frames:
+        ts_col.append(_ts_to_us(str(frame["ts"])))
+        store_col.append(strings.index(frame.get("store")))
+        mask = 0
+        for bit, key in enumerate(_FRAME_OPTIONAL):
+            if key in frame:
+                mask |= 1 << bit
+        mask_col.append(mask)
+        if "seq" in frame:
+            seq_col.append(int(frame["seq"]))  # type: ignore[arg-type]
+        if "kind" in frame:
+            kind_col.append(strings.index(frame["kind"]))
+        if "removed" in frame:
+            removed = list(frame["removed"])  # type: ignore[call-overload]
+            removed_col.append(len(removed))
+            removed_col.extend(strings.index(name) for name in removed)
+        for key in ("loss_pct", "jitter_ms"):
+            if key in frame:
+                frame_floats.append((key, frame[key]))
+        targets = list(frame.get("targets") or [])  # type: ignore[call-overload]
+        count_col.append(len(targets))
+        rows.extend(targets)
+
+    out.varint(len(frames))
+    out.column(_zigzag(v) for v in _delta_of_delta(ts_col))
+    out.column(store_col)
+    out.column(mask_col)
+    out.column(_zigzag(v) for v in _deltas(seq_col))
+    out.column(kind_col)
+    out.column(removed_col)
+    out.column(_quantized(frame_floats, _SCALE))
+    out.column(count_col)
+    names = [strings.index(row.get("name")) for row in rows]
+    out.column(names)
+    for name, kind in _TARGET_FIELDS:
+        if name == "name":
+            continue
+        values = [row.get(name) for row in rows]
+        if kind == "str":
+            out.column(strings.index(v) for v in values)
+        elif kind == "bool":
+            out.column(0 if v is None else 2 if v else 1 for v in values)
+        else:
+            out.column(_quantized(zip(names, values), _SCALE if kind == "float" else 1))
+    return _HISTORY_MAGIC + strings.encode() + out.getvalue()
+
+
+def decode_health_history(blob: bytes) -> List[Dict[str, object]]:
+    if not blob.startswith(_HISTORY_MAGIC):
+        raise ValueError("not a gh1 history blob")
+    reader = _Reader(blob, len(_HISTORY_MAGIC))
+    strings = [None] + [reader.read(reader.varint()).decode("utf-8") for _ in range(reader.varint())]
+    count = reader.varint()
+    ts_col = _undo_delta_of_delta([_unzigzag(v) for v in reader.column(count)])
+    store_col = reader.column(count)
+    mask_col = reader.column(count)
+    seq_col = iter(_undo_deltas(_unzigzag(v) for v in reader.column(sum(1 for m in mask_col if m & 1))))
+    kind_col = iter(reader.column(sum(1 for m in mask_col if m & 2)))
+    removed_counts = []
+    removed_col: List[int] = []
+    for mask in mask_col:
+        if mask & 4:
+            n = reader.varint()
+            removed_counts.append(n)
+            removed_col.extend(reader.column(n))
+    frame_keys = [key for m in mask_col for bit, key in enumerate(_FRAME_OPTIONAL) if bit >= 3 and m & (1 << bit)]
+    frame_floats = iter(_unquantized(frame_keys, reader.column(len(frame_keys)), _SCALE))
+    count_col = reader.column(count)
+    total = sum(count_col)
+    names = reader.column(total)
+    columns: Dict[str, List[object]] = {"name": [strings[i] for i in names]}
+    for name, kind in _TARGET_FIELDS:
+        if name == "name":
+            continue
+        raw = reader.column(total)
+        if kind == "str":
+            columns[name] = [strings[i] for i in raw]
+        elif kind == "bool":
+            columns[name] = [None if v == 0 else v == 2 for v in raw]
+        else:
+            scale = _SCALE if kind == "float" else 1
+            values = _unquantized(names, raw, scale)
+            columns[name] = values if kind == "float" else [None if v is None else int(v) for v in values]
+
+    frames: List[Dict[str, object]] = []
+    row = 0
+    removed_iter = iter(removed_col)
+    removed_counts_iter = iter(removed_counts)
+    for i in range(count):
+        frame: Dict[str, object] = {"ts": _us_to_ts(ts_col[i]), "store": strings[store_col[i]]}
+        mask = mask_col[i]
+        if mask & 1:
+            frame["seq"] = next(seq_col)
+        if mask & 2:
+            frame["kind"] = strings[next(kind_col)]
+        targets = []
+        for r in range(row, row + count_col[i]):
+            targets.append({name: columns[name][r] for name, _ in _TARGET_FIELDS})
+        row += count_col[i]
+        frame["targets"] = targets
+        if mask & 4:
+            frame["removed"] = [strings[next(removed_iter)] for _ in range(next(removed_counts_iter))]
+        for bit in (3, 4):
+            if mask & (1 << bit):
+                frame[_FRAME_OPTIONAL[bit]] = next(frame_floats)
+        frames.append(frame)
+    return frames
+
+
+def pack_health_history(records: List[Dict[str, object]]) -> List[Dict[str, object]]:
+    """Fold queued health frames into one ``health_history`` record per store.
+
+    The packed record lists the ids it replaces in ``members``; frames the
+    encoder cannot represent exactly (unknown keys) are left as they are.
+    """
+    packable: Dict[str, List[Dict[str, object]]] = {}
+    out: List[Dict[str, object]] = []
+    for record in records:
+        payload = record.get("payload")
+        if record.get("payload_type") == "health" and _history_safe(payload):
+            packable.setdefault(str(payload["store"]), []).append(record)  # type: ignore[index]
+        else:
+            out.append(record)
+    for store, group in packable.items():
+        if len(group) < 2:
+            out.extend(group)
+            continue
+        blob = encode_health_history([r["payload"] for r in group])  # type: ignore[misc]
+        out.append(
+            {
+                "payload_type": "health_history",
+                "id": f"history-{group[0]['id']}-{len(group)}",
+                "members": [str(r["id"]) for r in group],
+                "payload": {
+                    "store": store,
+                    "encoding": HISTORY_ENCODING,
+                    "count": len(group),
+                    "data": base64.b64encode(blob).decode("ascii"),
+                },
+            }
+        )
+    return out
+
+
+def _history_safe(payload: object) -> bool:
+    if not isinstance(payload, dict) or not set(payload) <= _FRAME_KEYS or "ts" not in payload:
+        return False
+    try:
+        _ts_to_us(str(payload["ts"]))
+    except ValueError:
+        return False
+    targets = payload.get("targets") or []
+    return all(isinstance(t, dict) and set(t) == _TARGET_KEYS for t in targets)
+
+
+def _ts_to_us(value: str) -> int:
+    ts = datetime.fromisoformat(value)
+    if ts.tzinfo is not None or ts.isoformat() != value:
+        raise ValueError("only naive isoformat() timestamps round-trip")
+    delta = ts - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def _us_to_ts(value: int) -> str:
+    return (_EPOCH + timedelta(microseconds=value)).isoformat()
+
+
+def _deltas(values: Iterable[int]) -> List[int]:
+    out, prev = [], 0
+    for value in values:
+        out.append(value - prev)
+        prev = value
+    return out
+
+
+def _undo_deltas(values: Iterable[int]) -> List[int]:
+    out, prev = [], 0
+    for value in values:
+        prev += value
+        out.append(prev)
+    return out
+
+
+def _delta_of_delta(values: List[int]) -> List[int]:
+    return _deltas(_deltas(values))
+
+
+def _undo_delta_of_delta(values: List[int]) -> List[int]:
+    return _undo_deltas(_undo_deltas(values))
+
+
+def _quantized(pairs: Iterable[Tuple[object, object]], scale: int) -> List[int]:
+    """0 encodes None; otherwise 1 + zigzag(delta from the key's previous value)."""
+    previous: Dict[object, int] = {}
+    out = []
+    for key, value in pairs:
+        if value is None:
+            out.append(0)
+            continue
+        q = round(float(value) * scale)  # type: ignore[arg-type]
+        delta = q - previous.get(key, 0)
+        previous[key] = q
+        out.append(1 + _zigzag(delta))
+    return out
+
+
+def _unquantized(keys: Iterable[object], raw: Iterable[int], scale: int) -> List[Optional[float]]:
+    previous: Dict[object, int] = {}
+    out: List[Optional[float]] = []
+    for key, value in zip(keys, raw):
+        if value == 0:
+            out.append(None)
+            continue
+        q = previous.get(key, 0) + _unzigzag(value - 1)
+        previous[key] = q
+        out.append(q / scale)
+    return out
+
+
+def _zigzag(value: int) -> int:
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def _unzigzag(value: int) -> int:
+    return value >> 1 if not value & 1 else -(value >> 1) - 1
+
+
+class _StringTable:
+    def __init__(self) -> None:
+        self._index: Dict[str, int] = {}
+
+    def index(self, value: object) -> int:
+        if value is None:
+            return 0
+        text = str(value)
+        if text not in self._index:
+            self._index[text] = len(self._index) + 1
+        return self._index[text]
+
+    def encode(self) -> bytes:
+        out = _Writer()
+        out.varint(len(self._index))
+        for text in self._index:
+            raw = text.encode("utf-8")
+            out.varint(len(raw))
+            out.raw(raw)
+        return out.getvalue()
+
+
+class _Writer:
+    def __init__(self) -> None:
+        self._buf = bytearray()
+
+    def varint(self, value: int) -> None:
+        while value >= 0x80:
+            self._buf.append((value & 0x7F) | 0x80)
+            value >>= 7
+        self._buf.append(value)
+
+    def column(self, values: Iterable[int]) -> None:
+        for value in values:
+            self.varint(value)
+
+    def raw(self, data: bytes) -> None:
+        self._buf += data
+
+    def getvalue(self) -> bytes:
+        return bytes(self._buf)
+
+
+class _Reader:
+    def __init__(self, data: bytes, offset: int = 0) -> None:
+        self._data = data
+        self._pos = offset
+
+    def varint(self) -> int:
+        shift = result = 0
+        while True:
+            byte = self._data[self._pos]
+            self._pos += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+    def column(self, count: int) -> List[int]:
+        return [self.varint() for _ in range(count)]
+
+    def read(self, size: int) -> bytes:
+        chunk = self._data[self._pos : self._pos + size]
+        self._pos += size
+        return chunk
 
 
 def _serialize_inventory(payload: InventoryPayload) -> Dict[str, object]:
@@ -56,6 +530,13 @@ def _serialize_inventory(payload: InventoryPayload) -> Dict[str, object]:
 
 __all__ = [
     "TelemetryManager",
+    "HealthDeltaEncoder",
+    "HealthDeltaDecoder",
+    "HealthRecord",
+    "KEYFRAME_EVERY",
+    "encode_health_history",
+    "decode_health_history",
+    "pack_health_history",
     "TelemetrySink",
     "LocalFileSink",
     "AppsScriptSink",
@@ -0,0 +1,141 @@
+"""Shared TLS contexts, session resumption and peer certificate caching."""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import ssl
+from collections import OrderedDict
+from datetime import datetime
+from time import monotonic
+from typing import Dict, Optional, Tuple
+
+CERT_TTL = 86400.0
+
+
+class _ResumingContext(ssl.SSLContext):
+    """Client context that offers the cached session for the server it wraps."""
+
+    sessions: "OrderedDict[str, ssl.SSLSession]"
+
+    def wrap_bio(self, incoming, outgoing, server_side=False, server_hostname=None, session=None):  # type: ignore[override]
+        if session is None and not server_side and server_hostname:
+            session = self.sessions.get(server_hostname)
+        return super().wrap_bio(
+            incoming, outgoing, server_side=server_side, server_hostname=server_hostname, session=session
+        )
+
+
+class TLSProbeEngine:
+    """Upgrade probe connections to TLS without rebuilding contexts per probe.
+
+    One context is kept per (server name, verification) profile so the CA bundle
+    is loaded once, sessions are resumed across cycles, and each peer certificate
+    is parsed at most once per ``cert_ttl`` seconds per fingerprint.
+    """
+
+    def __init__(self, cert_ttl: float = CERT_TTL, max_sessions: int = 64) -> None:
+        self.cert_ttl = cert_ttl
+        self.max_sessions = max_sessions
+        self.contexts_built = 0
+        self.resumed = 0
+        self._contexts: Dict[Tuple[str, bool], _ResumingContext] = {}
+        self._certs: Dict[str, Tuple[float, Optional[str]]] = {}
+
+    def context_for(self, server_name: str, verify: bool = True) -> ssl.SSLContext:
+        key = (server_name, verify)
+        context = self._contexts.get(key)
+        if context is None:
+            context = _ResumingContext(ssl.PROTOCOL_TLS_CLIENT)
+            if verify:
+                context.load_default_certs()
+            else:
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            context.sessions = OrderedDict()
+            self._contexts[key] = context
+            self.contexts_built += 1
+        return context
+
+    async def upgrade(
+        self,
+        writer: asyncio.StreamWriter,
+        server_name: str,
+        verify: bool = True,
+        timeout: float = 3.0,
+    ) -> Optional[str]:
+        """Run the handshake on an open TCP stream and return a certificate note."""
+        context = self.context_for(server_name, verify)
+        await asyncio.wait_for(
+            writer.start_tls(context, server_hostname=server_name, ssl_handshake_timeout=timeout),
+            timeout=timeout,
+        )
+        ssl_object = writer.get_extra_info("ssl_object")
+        if ssl_object is None:
+            return None
+        if ssl_object.session_reused:
+            self.resumed += 1
+        self.remember(writer, server_name, verify)
+        return self.describe_peer(ssl_object)
+
+    def remember(self, writer: asyncio.StreamWriter, server_name: str, verify: bool = True) -> None:
+        """Store the session (TLS 1.3 tickets may only arrive after the first read)."""
+        ssl_object = writer.get_extra_info("ssl_object")
+        context = self._contexts.get((server_name, verify))
+        if ssl_object is None or context is None:
+            return
+        session = ssl_object.session
+        if session is None:
+            return
+        context.sessions[server_name] = session
+        context.sessions.move_to_end(server_name)
+        while len(context.sessions) > self.max_sessions:
+            context.sessions.popitem(last=False)
+
+    def describe_peer(self, ssl_object: ssl.SSLObject) -> Optional[str]:
+        der = ssl_object.getpeercert(binary_form=True)
+        if not der:
+            return None
+        fingerprint = hashlib.sha256(der).hexdigest()
+        now = monotonic()
+        cached = self._certs.get(fingerprint)
+        if cached and now - cached[0] < self.cert_ttl:
+            return cached[1]
+        note = _cert_note(ssl_object.getpeercert() or {})
+        self._certs[fingerprint] = (now, note)
+        if len(self._certs) > self.max_sessions:
+            self._certs = {k: v for k, v in self._certs.items() if now - v[0] < self.cert_ttl}
+        return note
+
+
+def _cert_note(cert: dict) -> Optional[str]:
+    details = []
+    cn = _extract_cn(cert)
+    expiry = _extract_expiry(cert)
+    if cn:
+        details.append(f"CN={cn}")
+    if expiry:
+        details.append(f"exp={expiry}")
+    return ", ".join(details) or None
+
+
+def _extract_cn(cert: dict) -> Optional[str]:
+    subject = cert.get("subject", [])
+    for attrs in subject:
+        for key, value in attrs:
+            if key == "commonName":
+                return value
+    return None
+
+
+def _extract_expiry(cert: dict) -> Optional[str]:
+    expiry = cert.get("notAfter")
+    if not expiry:
+        return None
+    try:
+        parsed = datetime.strptime(expiry, "%b %d %H:%M:%S %Y %Z")
+        return parsed.date().isoformat()
+    except Exception:
+        return expiry
+
+
+__all__ = ["TLSProbeEngine", "CERT_TTL"]
@@ -0,0 +1,70 @@
+"""Dependency graph between probe targets (gateway -> ISP -> public)."""
+from __future__ import annotations
+
+from collections import Counter, deque
+from typing import Dict, Iterable, List, Optional
+
+from .schemas import TargetSpec, TargetStatus
+
+# Codes that prove the host answered even though the probe failed; an ARP
+# answer (``l2_present_l3_blocked``) means it is there but filtering the port.
+REACHABLE_CODES = {"tcp_refused", "tls_fail", "http_4xx", "http_5xx", "l2_present_l3_blocked"}
+
+
+class ProbeTopology:
+    """Validated ``depends_on`` edges for one set of targets.
+
+    Unknown parents are ignored and targets caught in a dependency cycle lose
+    their edges, so a bad config degrades to independent probing. ``external``
+    names parents outside this batch whose last result is already known.
+    Target names must be unique (``ValueError`` otherwise).
+    """
+
+    def __init__(self, targets: Iterable[TargetSpec], external: Iterable[str] = ()) -> None:
+        targets = list(targets)
+        counts = Counter(t.name for t in targets)
+        duplicates = sorted(name for name, count in counts.items() if count > 1)
+        if duplicates:
+            raise ValueError(f"duplicate target names: {', '.join(duplicates)}")
+        names = set(counts)
+        known = names | set(external)
+        self._parents: Dict[str, List[str]] = {
+            t.name: [p for p in t.depends_on if p in known and p != t.name] for t in targets
+        }
+        self.cyclic = self._break_cycles()
+
+    def parents(self, name: str) -> List[str]:
+        return self._parents.get(name, [])
+
+    def _break_cycles(self) -> List[str]:
+        indegree = {name: len(parents) for name, parents in self._parents.items()}
+        children: Dict[str, List[str]] = {name: [] for name in self._parents}
+        for name, parents in self._parents.items():
+            for parent in parents:
+                if parent in children:
+                    children[parent].append(name)
+                else:
+                    indegree[name] -= 1
+        ready = deque(name for name, degree in indegree.items() if degree == 0)
+        while ready:
+            name = ready.popleft()
+            for child in children[name]:
+                indegree[child] -= 1
+                if indegree[child] == 0:
+                    ready.append(child)
+        cyclic = [name for name, degree in indegree.items() if degree > 0]
+        for name in cyclic:
+            self._parents[name] = []
+        return cyclic
+
+
+def blocked_by(status: Optional[TargetStatus]) -> bool:
+    """True when a parent result means downstream probes cannot succeed."""
+    return status is not None and not status.up and status.code not in REACHABLE_CODES
+
+
+def upstream_down(target: TargetSpec, parent: str) -> TargetStatus:
+    return TargetStatus(name=target.name, up=False, code="upstream_down", note=f"via={parent}")
+
+
+__all__ = ["ProbeTopology", "REACHABLE_CODES", "blocked_by", "upstream_down"]
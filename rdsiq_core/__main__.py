@@ -11,6 +11,7 @@ from pathlib import Path
 import sys
 
 from .config import FoundationConfig, load_foundation_config
+from .relay import Relay
 from .runtime import RDSIQCoreAgent
 from .schemas import TriggerState
 
@@ -75,6 +76,13 @@ def _register_modules(agent: FoundationAgent, modules: list[str]) -> None:
 
 async def main() -> None:
     parser = argparse.ArgumentParser(description="Run the RDSIQ foundation agent")
+    parser.add_argument(
+        "mode",
+        nargs="?",
+        default="agent",
+        choices=["agent", "relay"],
+        help="'relay' runs the store-hub relay that batches uploads from local agents",
+    )
     parser.add_argument("--once", action="store_true", help="Run a single loop and exit")
     parser.add_argument("--config", type=str, default=None, help="Optional path to rdsiq_config.json")
     args = parser.parse_args()
@@ -84,14 +92,39 @@ async def main() -> None:
             asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())  # type: ignore[attr-defined]
 
     config = load_foundation_config(None if args.config is None else Path(args.config))
+    if args.mode == "relay":
+        await _run_relay(config)
+        return
     agent = FoundationAgent(config)
     _register_modules(agent, config.modules)
 
     if args.once:
         await agent.on_startup()
         await agent.run_cycle(datetime.utcnow(), TriggerState())
+        await agent.telemetry.close()
         return
 
+    stop_event = _stop_event()
+    runner = asyncio.create_task(agent.run_forever())
+    await stop_event.wait()
+    runner.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await runner
+    await agent.telemetry.close()
+
+
+async def _run_relay(config: FoundationConfig) -> None:
+    relay = Relay.from_config(config)
+    await relay.start()
+    print(f"[rdsiq_core] Relay listening on {config.relay.host}:{relay.port}, forwarding to {relay.upstream.base_url}")
+    try:
+        await _stop_event().wait()
+    finally:
+        await relay.flush()
+        await relay.close()
+
+
+def _stop_event() -> asyncio.Event:
     stop_event = asyncio.Event()
 
     def _handle_stop(*_: object) -> None:
@@ -101,12 +134,7 @@ async def main() -> None:
     for sig in (signal.SIGINT, signal.SIGTERM):
         with contextlib.suppress(NotImplementedError):
             loop.add_signal_handler(sig, _handle_stop)
-
-    runner = asyncio.create_task(agent.run_forever())
-    await stop_event.wait()
-    runner.cancel()
-    with contextlib.suppress(asyncio.CancelledError):
-        await runner
+    return stop_event
 
 
 if __name__ == "__main__":
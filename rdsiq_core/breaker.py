@@ -0,0 +1,75 @@
+"""Per-sink circuit breaker with exponential backoff and jitter."""
+from __future__ import annotations
+
+import random
+from time import monotonic
+from typing import Callable, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Stop calling a sink that keeps failing and retry it on a backoff.
+
+    After ``failure_threshold`` consecutive failures the breaker opens for
+    ``base_delay * 2**n`` seconds (capped at ``max_delay``, +/- ``jitter``
+    fraction, ``n`` counting back-to-back trips). Once the delay has elapsed
+    ``ready()`` admits exactly one caller in the half-open state; its outcome
+    closes the breaker again or re-opens it with a longer delay.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        base_delay: float = 5.0,
+        max_delay: float = 900.0,
+        jitter: float = 0.2,
+        clock: Callable[[], float] = monotonic,
+        rng: Optional[random.Random] = None,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.state = CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.retry_at = 0.0
+        self._clock = clock
+        self._rng = rng or random.Random()
+
+    def ready(self) -> bool:
+        """Return whether a call may go out now; moves open -> half-open when due."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and self._clock() >= self.retry_at:
+            self.state = HALF_OPEN
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.state = CLOSED
+        self.failures = 0
+        self.trips = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            delay = min(self.max_delay, self.base_delay * 2**self.trips)
+            delay *= 1 + self.jitter * (2 * self._rng.random() - 1)
+            self.trips += 1
+            self.state = OPEN
+            self.retry_at = self._clock() + delay
+
+    def snapshot(self) -> Dict[str, object]:
+        retry_in = max(0.0, self.retry_at - self._clock()) if self.state == OPEN else None
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "retry_in_s": round(retry_in, 1) if retry_in is not None else None,
+        }
+
+
+__all__ = ["CircuitBreaker", "CLOSED", "OPEN", "HALF_OPEN"]
@@ -26,18 +26,45 @@ class Cadence:
 class AppScriptConfig:
     base_url: str = "https://script.google.com/macros/s/app-id"
     api_key: str = "demo-key"
+    long_poll: float = 0.0
+    cafile: Optional[str] = None
 
 
 @dataclass(slots=True)
 class TelemetryConfig:
     sinks: List[str] = field(default_factory=lambda: ["local", "apps_script", "vigilix"])
     app_script: AppScriptConfig = field(default_factory=AppScriptConfig)
+    batch_max_records: int = 200
+    batch_max_bytes: int = 256 * 1024
+    batch_max_chunks: int = 4
+    batch_pack_history: bool = False
+    sink_timeout: float = 10.0
+    queue_max_records: int = 2000
+    queue_max_bytes: int = 8 * 1024 * 1024
+    local_flush_interval: float = 1.0
+    local_fsync: bool = False
+    local_max_bytes: int = 16 * 1024 * 1024
+    local_rotate_daily: bool = True
+    local_keep: int = 30
+
+
+@dataclass(slots=True)
+class RelayConfig:
+    host: str = "0.0.0.0"
+    port: int = 8787
+    buffer_dir: Path = DATA_DIR / "relay"
+    flush_interval: float = 5.0
+    flush_records: int = 200
+    watchlist_ttl: float = 60.0
+    certfile: Optional[str] = None
+    keyfile: Optional[str] = None
 
 
 @dataclass(slots=True)
 class FoundationConfig:
     store_id: str
     telemetry: TelemetryConfig = field(default_factory=TelemetryConfig)
+    relay: RelayConfig = field(default_factory=RelayConfig)
     cadence: Cadence = field(default_factory=Cadence)
     modules: List[str] = field(default_factory=list)
     metadata: Dict[str, Any] = field(default_factory=dict)
@@ -68,12 +95,32 @@ def load_foundation_config(path: Optional[Path] = None) -> FoundationConfig:
     telemetry_dict = data.get("telemetry") or {}
     sinks = telemetry_dict.get("sinks", ["local", "apps_script", "vigilix"])
     app_script_dict = telemetry_dict.get("app_script") or {}
+    batch_dict = telemetry_dict.get("batch") or {}
+    queue_dict = telemetry_dict.get("queue") or {}
+    local_dict = telemetry_dict.get("local") or {}
+    defaults_telemetry = TelemetryConfig()
     telemetry = TelemetryConfig(
         sinks=list(sinks),
         app_script=AppScriptConfig(
             base_url=str(app_script_dict.get("base_url") or defaults_app.base_url),
             api_key=str(app_script_dict.get("api_key") or defaults_app.api_key),
+            long_poll=_positive_float(app_script_dict.get("long_poll"), defaults_app.long_poll),
+            cafile=app_script_dict.get("cafile") or None,
+        ),
+        batch_max_records=_positive_int(batch_dict.get("max_records"), defaults_telemetry.batch_max_records),
+        batch_max_bytes=_positive_int(batch_dict.get("max_bytes"), defaults_telemetry.batch_max_bytes),
+        batch_max_chunks=_positive_int(batch_dict.get("max_chunks"), defaults_telemetry.batch_max_chunks),
+        batch_pack_history=bool(batch_dict.get("pack_history", defaults_telemetry.batch_pack_history)),
+        sink_timeout=_positive_float(telemetry_dict.get("sink_timeout"), defaults_telemetry.sink_timeout),
+        queue_max_records=_positive_int(queue_dict.get("max_records"), defaults_telemetry.queue_max_records),
+        queue_max_bytes=_positive_int(queue_dict.get("max_bytes"), defaults_telemetry.queue_max_bytes),
+        local_flush_interval=_non_negative_float(
+            local_dict.get("flush_interval"), defaults_telemetry.local_flush_interval
         ),
+        local_fsync=bool(local_dict.get("fsync", defaults_telemetry.local_fsync)),
+        local_max_bytes=_positive_int(local_dict.get("max_bytes"), defaults_telemetry.local_max_bytes),
+        local_rotate_daily=bool(local_dict.get("rotate_daily", defaults_telemetry.local_rotate_daily)),
+        local_keep=_positive_int(local_dict.get("keep"), defaults_telemetry.local_keep),
     )
     cadence_dict = data.get("cadence") or {}
     cadence = Cadence(
@@ -82,9 +129,23 @@ def load_foundation_config(path: Optional[Path] = None) -> FoundationConfig:
         heartbeat=_parse_timedelta(cadence_dict.get("heartbeat"), defaults_cadence.heartbeat),
         refresh_poll=_parse_timedelta(cadence_dict.get("refresh_poll"), defaults_cadence.refresh_poll),
     )
+    relay_dict = data.get("relay") or {}
+    defaults_relay = RelayConfig()
+    relay = RelayConfig(
+        host=str(relay_dict.get("host") or defaults_relay.host),
+        port=_positive_int(relay_dict.get("port"), defaults_relay.port),
+        buffer_dir=Path(relay_dict.get("buffer_dir") or defaults_relay.buffer_dir),
+        flush_interval=_positive_float(relay_dict.get("flush_interval"), defaults_relay.flush_interval),
+        flush_records=_positive_int(relay_dict.get("flush_records"), defaults_relay.flush_records),
+        watchlist_ttl=_positive_float(relay_dict.get("watchlist_ttl"), defaults_relay.watchlist_ttl),
+        certfile=relay_dict.get("certfile") or None,
+        keyfile=relay_dict.get("keyfile") or None,
+    )
     metadata = data.get("metadata") or {}
     modules = [str(m).strip() for m in data.get("modules", []) if str(m).strip()]
-    return FoundationConfig(store_id=store, telemetry=telemetry, cadence=cadence, modules=modules, metadata=metadata)
+    return FoundationConfig(
+        store_id=store, telemetry=telemetry, cadence=cadence, relay=relay, modules=modules, metadata=metadata
+    )
 
 
 def _parse_timedelta(value: Any, default: timedelta) -> timedelta:
@@ -100,6 +161,30 @@ def _parse_timedelta(value: Any, default: timedelta) -> timedelta:
     return default
 
 
+def _positive_int(value: Any, default: int) -> int:
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return default
+    return number if number > 0 else default
+
+
+def _positive_float(value: Any, default: float) -> float:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return default
+    return number if number > 0 else default
+
+
+def _non_negative_float(value: Any, default: float) -> float:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return default
+    return number if number >= 0 else default
+
+
 def _safe_store_id() -> str:
     try:
         return socket.gethostname().upper()
@@ -112,6 +197,7 @@ __all__ = [
     "AppScriptConfig",
     "TelemetryConfig",
     "FoundationConfig",
+    "RelayConfig",
     "DATA_DIR",
     "LOG_DIR",
     "QUEUE_DIR",
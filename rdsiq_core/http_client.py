@@ -0,0 +1,271 @@
+"""Non-blocking HTTP/1.1 client for telemetry sinks, built on asyncio streams."""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import gzip
+import ssl
+from collections import deque
+from dataclasses import dataclass
+from time import monotonic
+from typing import Deque, Dict, Mapping, Optional, Tuple
+from urllib.parse import urlsplit
+
+_LOOPBACK = {"127.0.0.1", "localhost", "::1"}
+_NO_BODY_STATUS = {204, 304}
+# Errors that mean a reused keep-alive connection went stale between requests.
+_STALE_ERRORS = (asyncio.IncompleteReadError, ConnectionError)
+
+Origin = Tuple[str, str, int]
+
+
+class HTTPError(Exception):
+    """The peer sent a response this client cannot parse."""
+
+
+@dataclass(slots=True)
+class HTTPResult:
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+
+
+@dataclass(slots=True)
+class _Conn:
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+    since: float = 0.0
+
+
+class AsyncHTTPClient:
+    """Keep-alive HTTP/1.1 client that runs entirely on the event loop.
+
+    Idle connections are pooled per origin and reused while idle for less than
+    ``idle_timeout`` seconds. A request that fails on a reused connection is
+    retried once on a fresh one (uploads carry idempotency keys, so a replay is
+    harmless). Responses may be chunked and/or gzip-encoded; ``body`` is always
+    the decoded payload. ``timeout`` bounds each request end to end. Plain
+    ``http://`` is accepted for loopback hosts only.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 5.0,
+        max_idle: int = 2,
+        idle_timeout: float = 60.0,
+        context: Optional[ssl.SSLContext] = None,
+    ) -> None:
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.hits = 0
+        self.misses = 0
+        self.reconnects = 0
+        self._context = context
+        self._idle: Dict[Origin, Deque[_Conn]] = {}
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        body: Optional[bytes] = None,
+        headers: Optional[Mapping[str, str]] = None,
+        timeout: Optional[float] = None,
+    ) -> HTTPResult:
+        """Send one request; ``timeout`` overrides the client default (long polls)."""
+        origin, path = split_url(url)
+        limit = self.timeout if timeout is None else timeout
+        return await asyncio.wait_for(self._request(origin, method, path, body, headers), timeout=limit)
+
+    def stats(self) -> Dict[str, int]:
+        idle = sum(len(v) for v in self._idle.values())
+        return {"hits": self.hits, "misses": self.misses, "reconnects": self.reconnects, "idle": idle}
+
+    async def close(self) -> None:
+        pools, self._idle = self._idle, {}
+        for idle in pools.values():
+            for conn in idle:
+                conn.writer.close()
+                with contextlib.suppress(Exception):
+                    await conn.writer.wait_closed()
+
+    async def _request(
+        self,
+        origin: Origin,
+        method: str,
+        path: str,
+        body: Optional[bytes],
+        headers: Optional[Mapping[str, str]],
+    ) -> HTTPResult:
+        conn = self._checkout(origin)
+        reused = conn is not None
+        if conn is None:
+            conn = await self._connect(origin)
+        try:
+            result, keep = await self._exchange(conn, origin, method, path, body, headers)
+        except _STALE_ERRORS:
+            _abort(conn)
+            if not reused:
+                raise
+            self.reconnects += 1
+            conn = await self._connect(origin)
+            try:
+                result, keep = await self._exchange(conn, origin, method, path, body, headers)
+            except BaseException:
+                _abort(conn)
+                raise
+        except BaseException:
+            # Includes cancellation by the request timeout: the stream is mid-response.
+            _abort(conn)
+            raise
+        if keep:
+            self._checkin(origin, conn)
+        else:
+            conn.writer.close()
+        return result
+
+    async def _exchange(
+        self,
+        conn: _Conn,
+        origin: Origin,
+        method: str,
+        path: str,
+        body: Optional[bytes],
+        headers: Optional[Mapping[str, str]],
+    ) -> Tuple[HTTPResult, bool]:
+        conn.writer.write(_encode_request(origin, method, path, body, headers))
+        await conn.writer.drain()
+        head = await conn.reader.readuntil(b"\r\n\r\n")
+        version, status, response_headers = _parse_head(head)
+        if method == "HEAD" or status in _NO_BODY_STATUS or 100 <= status < 200:
+            data = b""
+            complete = True
+        elif "chunked" in response_headers.get("transfer-encoding", "").lower():
+            data = await _read_chunked(conn.reader)
+            complete = True
+        elif "content-length" in response_headers:
+            data = await conn.reader.readexactly(int(response_headers["content-length"]))
+            complete = True
+        else:
+            data = await conn.reader.read()
+            complete = False
+        if response_headers.get("content-encoding", "").lower() == "gzip":
+            response_headers.pop("content-encoding")
+            data = gzip.decompress(data) if data else data
+        connection = response_headers.get("connection", "").lower()
+        keep = complete and connection != "close" and (version != "HTTP/1.0" or connection == "keep-alive")
+        return HTTPResult(status=status, headers=response_headers, body=data), keep
+
+    def _checkout(self, origin: Origin) -> Optional[_Conn]:
+        idle = self._idle.get(origin)
+        now = monotonic()
+        while idle:
+            conn = idle.pop()
+            if now - conn.since < self.idle_timeout and not stream_is_stale(conn.reader, conn.writer):
+                self.hits += 1
+                return conn
+            conn.writer.close()
+        self.misses += 1
+        return None
+
+    def _checkin(self, origin: Origin, conn: _Conn) -> None:
+        conn.since = monotonic()
+        idle = self._idle.setdefault(origin, deque())
+        idle.append(conn)
+        while len(idle) > self.max_idle:
+            idle.popleft().writer.close()
+
+    async def _connect(self, origin: Origin) -> _Conn:
+        scheme, host, port = origin
+        if scheme == "https":
+            if self._context is None:
+                self._context = ssl.create_default_context()
+            reader, writer = await asyncio.open_connection(host, port, ssl=self._context, server_hostname=host)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return _Conn(reader, writer)
+
+
+def split_url(url: str) -> Tuple[Origin, str]:
+    parts = urlsplit(url)
+    host = parts.hostname or ""
+    if parts.scheme != "https" and not (parts.scheme == "http" and host in _LOOPBACK):
+        raise ValueError("Apps Script endpoint must be HTTPS")
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    path = parts.path or "/"
+    if parts.query:
+        path = f"{path}?{parts.query}"
+    return (parts.scheme, host, port), path
+
+
+def _encode_request(
+    origin: Origin, method: str, path: str, body: Optional[bytes], headers: Optional[Mapping[str, str]]
+) -> bytes:
+    scheme, host, port = origin
+    default_port = 443 if scheme == "https" else 80
+    lines = [
+        f"{method} {path} HTTP/1.1",
+        f"Host: {host}" if port == default_port else f"Host: {host}:{port}",
+        "Accept-Encoding: gzip",
+        "Connection: keep-alive",
+    ]
+    for key, value in (headers or {}).items():
+        lines.append(f"{key}: {value}")
+    if body is not None or method in {"POST", "PUT"}:
+        lines.append(f"Content-Length: {len(body or b'')}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + (body or b"")
+
+
+def _parse_head(head: bytes) -> Tuple[str, int, Dict[str, str]]:
+    lines = head.decode("latin-1").split("\r\n")
+    parts = lines[0].split(" ", 2)
+    if len(parts) < 2 or not parts[0].startswith("HTTP/") or not parts[1].isdigit():
+        raise HTTPError(f"bad status line: {lines[0]!r}")
+    headers: Dict[str, str] = {}
+    for line in lines[1:]:
+        if not line:
+            continue
+        key, _, value = line.partition(":")
+        headers[key.strip().lower()] = value.strip()
+    return parts[0], int(parts[1]), headers
+
+
+async def _read_chunked(reader: asyncio.StreamReader) -> bytes:
+    chunks = []
+    while True:
+        size_line = await reader.readuntil(b"\r\n")
+        try:
+            size = int(size_line.split(b";", 1)[0].strip(), 16)
+        except ValueError:
+            raise HTTPError(f"bad chunk size: {size_line!r}") from None
+        if size == 0:
+            # Skip optional trailers up to the terminating blank line.
+            while await reader.readuntil(b"\r\n") != b"\r\n":
+                pass
+            return b"".join(chunks)
+        chunks.append(await reader.readexactly(size))
+        await reader.readexactly(2)
+
+
+def stream_is_stale(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bool:
+    """True when an idle keep-alive stream must not be reused.
+
+    An idle HTTP connection should never have readable data; EOF or stray
+    bytes mean the server closed it or the stream is out of sync.
+    """
+    return reader.at_eof() or _has_unread_bytes(reader) or writer.is_closing()
+
+
+def _has_unread_bytes(reader: asyncio.StreamReader) -> bool:
+    # StreamReader has no public peek; CPython keeps unread bytes in ``_buffer``.
+    # Elsewhere stray bytes go unnoticed and the request fails into the reconnect.
+    buffer = getattr(reader, "_buffer", None)
+    return bool(buffer) if isinstance(buffer, (bytes, bytearray)) else False
+
+
+def _abort(conn: _Conn) -> None:
+    with contextlib.suppress(Exception):
+        conn.writer.transport.abort()
+
+
+__all__ = ["AsyncHTTPClient", "HTTPError", "HTTPResult", "split_url", "stream_is_stale"]
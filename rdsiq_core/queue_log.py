@@ -0,0 +1,325 @@
+"""Segmented append-only queue log with CRC-framed records."""
+from __future__ import annotations
+
+import json
+import os
+import struct
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from time import monotonic
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Set, Tuple, Union
+
+# Frame header: payload length, CRC32 of the payload, record sequence number.
+_HEADER = struct.Struct("<IIQ")
+FRAME_OVERHEAD = _HEADER.size  # bytes each record adds to a segment besides its JSON
+_SEGMENT_GLOB = "segment-*.log"
+CURSOR_FILE = "cursor.json"
+FSYNC_POLICIES = ("always", "interval", "never")
+DEFAULT_CONSUMER = "queue"
+
+
+@dataclass(slots=True)
+class _Segment:
+    path: Path
+    first_seq: int
+    last_seq: int = 0
+    size: int = 0
+
+
+@dataclass(slots=True)
+class _Cursor:
+    floor: int = 0
+    acked: Set[int] = field(default_factory=set)
+
+
+class QueueLog:
+    """Durable FIFO of JSON records stored in fixed-size append-only segments.
+
+    Each record is framed as ``<len, crc32, seq>`` + JSON so a torn write at the
+    tail is detected and truncated on open. Every named consumer acknowledges
+    sequence numbers independently; its cursor keeps a contiguous ``floor``
+    plus any out-of-order acks above it, and all cursors are replaced
+    atomically in one file. Segments whose records sit at or below every
+    consumer's floor are deleted by ``compact``. A consumer seen for the first
+    time starts at the lowest existing floor.
+
+    ``fsync`` is ``"always"`` (every append), ``"interval"`` (at most once per
+    ``fsync_interval`` seconds, plus on ack and close) or ``"never"``.
+    """
+
+    def __init__(
+        self,
+        base_dir: Path,
+        segment_bytes: int = 1 << 20,
+        fsync: str = "always",
+        fsync_interval: float = 1.0,
+        consumers: Sequence[str] = (DEFAULT_CONSUMER,),
+    ) -> None:
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}")
+        self.base_dir = base_dir
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self._segments: List[_Segment] = []
+        self._active: Optional[BinaryIO] = None
+        self._dirty = False
+        self._last_sync = monotonic()
+        self._cursors = self._read_cursors(consumers)
+        self._next_seq = self._recover()
+
+    @property
+    def next_seq(self) -> int:
+        return self._next_seq
+
+    @property
+    def consumers(self) -> List[str]:
+        return list(self._cursors)
+
+    @property
+    def floor(self) -> int:
+        """Highest seq every consumer has acknowledged contiguously."""
+        # With no consumers nothing is waiting, so every appended record is done.
+        return min((cursor.floor for cursor in self._cursors.values()), default=self._next_seq - 1)
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(segment.size for segment in self._segments)
+
+    def done(self, seq: int) -> bool:
+        return all(_acked(cursor, seq) for cursor in self._cursors.values())
+
+    def append(self, record: Union[Dict[str, object], bytes]) -> int:
+        """Append ``record`` (a dict, or its JSON already encoded) and return its seq."""
+        seq = self._next_seq
+        payload = record if isinstance(record, bytes) else json.dumps(record, separators=(",", ":")).encode("utf-8")
+        frame = _HEADER.pack(len(payload), zlib.crc32(payload), seq) + payload
+        segment = self._writable_segment()
+        assert self._active is not None
+        self._active.write(frame)
+        self._active.flush()
+        segment.size += len(frame)
+        segment.last_seq = seq
+        self._next_seq = seq + 1
+        self._dirty = True
+        if self.fsync == "always" or (
+            self.fsync == "interval" and monotonic() - self._last_sync >= self.fsync_interval
+        ):
+            self._sync()
+        return seq
+
+    def replay(self, consumer: Optional[str] = None) -> Iterator[Tuple[int, Dict[str, object]]]:
+        """Yield ``(seq, record)`` pairs ``consumer`` (default: any consumer) still needs."""
+        for seq, record, waiting in self.backlog():
+            if consumer is None or consumer in waiting:
+                yield seq, record
+
+    def backlog(self) -> Iterator[Tuple[int, Dict[str, object], List[str]]]:
+        """Yield ``(seq, record, consumers still waiting)`` in one sequential pass."""
+        floor = self.floor
+        for segment in list(self._segments):
+            if segment.last_seq <= floor:
+                continue
+            for seq, payload in _read_frames(segment.path)[0]:
+                if seq <= floor:
+                    continue
+                waiting = [name for name, cursor in self._cursors.items() if not _acked(cursor, seq)]
+                if waiting:
+                    yield seq, json.loads(payload), waiting
+
+    def ack(self, seqs: Iterable[int], consumer: Optional[str] = None) -> None:
+        """Acknowledge ``seqs`` for ``consumer``, or for every consumer when omitted."""
+        seqs = list(seqs)
+        names = [consumer] if consumer is not None else list(self._cursors)
+        self.ack_many({name: seqs for name in names})
+
+    def ack_many(self, acks: Mapping[str, Iterable[int]]) -> None:
+        changed = False
+        for name, seqs in acks.items():
+            cursor = self._cursors.get(name)
+            if cursor is None:
+                continue
+            for seq in seqs:
+                if not _acked(cursor, seq):
+                    cursor.acked.add(seq)
+                    changed = True
+            while cursor.floor + 1 in cursor.acked:
+                cursor.floor += 1
+                cursor.acked.discard(cursor.floor)
+        if not changed:
+            self.compact()
+            return
+        # Records must be on disk before the cursor claims they were consumed.
+        if self._dirty and self.fsync != "never":
+            self._sync()
+        self._write_cursor()
+        self.compact()
+
+    def compact(self) -> int:
+        """Delete segments whose every record is acknowledged; return how many."""
+        removed = 0
+        floor = self.floor
+        while self._segments:
+            segment = self._segments[0]
+            empty = segment.last_seq == 0
+            if (empty and len(self._segments) == 1) or (not empty and segment.last_seq > floor):
+                break
+            self._segments.pop(0)
+            if not self._segments and self._active is not None:
+                self._active.close()
+                self._active = None
+            segment.path.unlink(missing_ok=True)
+            removed += 1
+        return removed
+
+    def rewrite(self, entries: Sequence[Tuple[Dict[str, object], Iterable[str]]]) -> List[int]:
+        """Replace the whole backlog with ``(record, waiting consumers)`` pairs.
+
+        New records are appended with fresh sequence numbers and synced first;
+        the cursors then mark every older seq as consumed and pre-acknowledge
+        each new record for the consumers not waiting on it; only after that
+        are the old segments deleted. A crash part-way can replay a record
+        twice but never loses one.
+        """
+        old = list(self._segments)
+        if self._active is not None:
+            self._active.close()
+            self._active = None
+        self._segments = []
+        last_old = self._next_seq - 1
+        seqs = []
+        waiting_by_seq: Dict[int, Set[str]] = {}
+        policy, self.fsync = self.fsync, "never"  # one sync for the whole rewrite
+        try:
+            for record, waiting in entries:
+                seq = self.append(record)
+                seqs.append(seq)
+                waiting_by_seq[seq] = set(waiting)
+        finally:
+            self.fsync = policy
+        if self._dirty and self.fsync != "never":
+            self._sync()
+        for name, cursor in self._cursors.items():
+            cursor.floor = last_old
+            cursor.acked = {seq for seq in seqs if name not in waiting_by_seq[seq]}
+            while cursor.floor + 1 in cursor.acked:
+                cursor.floor += 1
+                cursor.acked.discard(cursor.floor)
+        self._write_cursor()
+        for segment in old:
+            segment.path.unlink(missing_ok=True)
+        self.compact()
+        return seqs
+
+    def sync(self) -> None:
+        """Force appended records to disk now (group commit under ``"interval"``)."""
+        if self._dirty:
+            self._sync()
+
+    def close(self) -> None:
+        if self._active is not None:
+            if self._dirty and self.fsync != "never":
+                self._sync()
+            self._active.close()
+            self._active = None
+
+    def _writable_segment(self) -> _Segment:
+        segment = self._segments[-1] if self._segments else None
+        if segment is None or segment.size >= self.segment_bytes:
+            if self._active is not None:
+                if self._dirty and self.fsync != "never":
+                    self._sync()
+                self._active.close()
+            segment = _Segment(self.base_dir / f"segment-{self._next_seq:020d}.log", first_seq=self._next_seq)
+            self._segments.append(segment)
+            self._active = segment.path.open("ab")
+        elif self._active is None:
+            self._active = segment.path.open("ab")
+        return segment
+
+    def _sync(self) -> None:
+        if self._active is not None:
+            os.fsync(self._active.fileno())
+        self._dirty = False
+        self._last_sync = monotonic()
+
+    def _recover(self) -> int:
+        next_seq = max((cursor.floor for cursor in self._cursors.values()), default=0) + 1
+        for path in sorted(self.base_dir.glob(_SEGMENT_GLOB)):
+            try:
+                first_seq = int(path.stem.split("-", 1)[1])
+            except ValueError:
+                continue
+            frames, good_end = _read_frames(path)
+            size = path.stat().st_size
+            if good_end < size:
+                # Torn or corrupt tail from a crash mid-append: drop it.
+                with path.open("r+b") as fh:
+                    fh.truncate(good_end)
+            segment = _Segment(path, first_seq=first_seq, size=good_end)
+            if frames:
+                segment.last_seq = frames[-1][0]
+                next_seq = max(next_seq, segment.last_seq + 1)
+            self._segments.append(segment)
+        return next_seq
+
+    def _read_cursors(self, consumers: Sequence[str]) -> Dict[str, _Cursor]:
+        path = self.base_dir / CURSOR_FILE
+        stored: Dict[str, _Cursor] = {}
+        try:
+            data = json.loads(path.read_text())
+            # Single-cursor files predate per-consumer state and apply to everyone.
+            entries = data["consumers"] if "consumers" in data else {name: data for name in consumers}
+            for name, entry in entries.items():
+                stored[name] = _Cursor(floor=int(entry.get("floor", 0)), acked={int(s) for s in entry.get("acked", [])})
+        except (OSError, ValueError, TypeError, AttributeError, KeyError):
+            stored = {}
+        start = min((cursor.floor for cursor in stored.values()), default=0)
+        # Consumers no longer configured are dropped so they cannot pin old segments.
+        return {name: stored.get(name) or _Cursor(floor=start) for name in dict.fromkeys(consumers)}
+
+    def _write_cursor(self) -> None:
+        path = self.base_dir / CURSOR_FILE
+        tmp = path.with_suffix(".tmp")
+        data = json.dumps(
+            {
+                "consumers": {
+                    name: {"floor": cursor.floor, "acked": sorted(cursor.acked)}
+                    for name, cursor in self._cursors.items()
+                }
+            }
+        )
+        with tmp.open("w") as fh:
+            fh.write(data)
+            if self.fsync != "never":
+                fh.flush()
+                os.fsync(fh.fileno())
+        os.replace(tmp, path)
+
+
+def _acked(cursor: _Cursor, seq: int) -> bool:
+    return seq <= cursor.floor or seq in cursor.acked
+
+
+def _read_frames(path: Path) -> Tuple[List[Tuple[int, bytes]], int]:
+    """Return the valid ``(seq, payload)`` frames of a segment and where they end."""
+    try:
+        data = path.read_bytes()
+    except OSError:
+        return [], 0
+    frames: List[Tuple[int, bytes]] = []
+    offset = 0
+    while offset + _HEADER.size <= len(data):
+        length, crc, seq = _HEADER.unpack_from(data, offset)
+        start = offset + _HEADER.size
+        payload = data[start : start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        frames.append((seq, payload))
+        offset = start + length
+    return frames, offset
+
+
+__all__ = ["QueueLog", "FSYNC_POLICIES", "CURSOR_FILE", "DEFAULT_CONSUMER", "FRAME_OVERHEAD"]
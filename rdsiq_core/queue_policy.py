@@ -0,0 +1,163 @@
+"""Priority-aware compaction for the offline telemetry queue."""
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+HEALTH = "health"
+HEALTH_SUMMARY = "health_summary"
+INVENTORY = "inventory"
+
+
+@dataclass(slots=True)
+class QueueEntry:
+    """A queued record and the consumers (sinks) still waiting for it."""
+
+    record: Dict[str, object]
+    waiting: Set[str] = field(default_factory=set)
+
+    @property
+    def size(self) -> int:
+        return len(json.dumps(self.record, separators=(",", ":")))
+
+
+def compact_entries(
+    entries: List[QueueEntry], max_records: int, max_bytes: int, record_overhead: int = 0
+) -> List[QueueEntry]:
+    """Shrink a backlog while keeping what the dashboard needs.
+
+    Health payloads whose target states (name, up, code) differ from the
+    previous one are transitions and are kept. Delta frames (``kind`` /
+    ``removed``, see ``HealthDeltaEncoder``) are compared by the per-store
+    state they decode to, not by the changed targets they carry. Runs of
+    identical heartbeats after a transition collapse into one
+    ``health_summary`` record with ``first_ts``, ``last_ts``, ``count``, the
+    full decoded ``targets`` and, for sequenced frames, ``first_seq`` /
+    ``last_seq``; only the newest inventory is kept.
+    The result replays transitions first, then the inventory, then backfill
+    (summaries and unknown payload types). If it is still above 90% of the
+    limits the oldest backfill, then the oldest transitions, are dropped until
+    it fits; the newest transition and inventory always survive. Sizes count
+    ``record_overhead`` extra bytes per record, what the store adds on disk.
+    """
+    transitions: List[QueueEntry] = []
+    backfill: List[QueueEntry] = []
+    inventory: Optional[QueueEntry] = None
+    inventory_ts = ""
+    run: Optional[QueueEntry] = None
+    previous: Optional[str] = None
+    states: Dict[object, Dict[str, Dict[str, object]]] = {}
+    for entry in entries:
+        payload_type = entry.record.get("payload_type")
+        payload = entry.record.get("payload")
+        if not isinstance(payload, dict):
+            backfill.append(entry)
+            continue
+        if payload_type == INVENTORY:
+            if inventory is None or str(payload.get("ts", "")) >= inventory_ts:
+                inventory, inventory_ts = entry, str(payload.get("ts", ""))
+            continue
+        if payload_type not in (HEALTH, HEALTH_SUMMARY):
+            backfill.append(entry)
+            continue
+        targets = _decoded_targets(states, payload)
+        signature = _signature(payload, targets)
+        if payload_type == HEALTH and signature != previous:
+            transitions.append(entry)
+            run = None
+        elif run is not None and run.record["payload"]["signature"] == signature:  # type: ignore[index]
+            _extend_summary(run, entry, targets)
+        else:
+            run = _start_summary(entry, signature, targets)
+            backfill.append(run)
+        previous = signature
+    return _trim(transitions, inventory, backfill, max_records, max_bytes, record_overhead)
+
+
+def _trim(
+    transitions: List[QueueEntry],
+    inventory: Optional[QueueEntry],
+    backfill: List[QueueEntry],
+    max_records: int,
+    max_bytes: int,
+    record_overhead: int,
+) -> List[QueueEntry]:
+    ordered = transitions + ([inventory] if inventory else []) + backfill
+    count = len(ordered)
+    size = sum(entry.size + record_overhead for entry in ordered)
+    # Always aim below the limits, or the next append would compact again.
+    record_goal = int(max_records * 0.9)
+    byte_goal = int(max_bytes * 0.9)
+    dropped: Set[int] = set()
+    for entry in backfill + transitions[:-1]:
+        if count <= record_goal and size <= byte_goal:
+            break
+        dropped.add(id(entry))
+        count -= 1
+        size -= entry.size + record_overhead
+    return [entry for entry in ordered if id(entry) not in dropped]
+
+
+def _decoded_targets(states: Dict[object, Dict[str, Dict[str, object]]], payload: Dict[str, object]) -> List[object]:
+    """Full target list after ``payload``, applying delta frames to the store's state."""
+    targets = [t for t in payload.get("targets") or [] if isinstance(t, dict)]  # type: ignore[union-attr]
+    store = payload.get("store")
+    if payload.get("kind") == "delta" and store in states:
+        state = dict(states[store])
+        for name in payload.get("removed") or []:  # type: ignore[union-attr]
+            state.pop(str(name), None)
+    else:
+        state = {}
+    for target in targets:
+        state[str(target.get("name"))] = target
+    states[store] = state
+    return list(state.values())
+
+
+def _signature(payload: Dict[str, object], targets: List[object]) -> str:
+    if "signature" in payload:
+        return str(payload["signature"])
+    states = [[t.get("name"), t.get("up"), t.get("code")] for t in targets if isinstance(t, dict)]
+    return json.dumps(states, separators=(",", ":"))
+
+
+def _start_summary(entry: QueueEntry, signature: str, targets: List[object]) -> QueueEntry:
+    payload = entry.record["payload"]
+    assert isinstance(payload, dict)
+    if entry.record.get("payload_type") == HEALTH_SUMMARY:
+        return QueueEntry(record=dict(entry.record, payload=dict(payload)), waiting=set(entry.waiting))
+    summary = {
+        "store": payload.get("store"),
+        "signature": signature,
+        "first_ts": payload.get("ts"),
+        "last_ts": payload.get("ts"),
+        "count": 1,
+        "targets": targets,
+    }
+    if "seq" in payload:
+        summary["first_seq"] = summary["last_seq"] = payload["seq"]
+    record = {"payload_type": HEALTH_SUMMARY, "payload": summary, "id": f"summary-{entry.record['id']}"}
+    return QueueEntry(record=record, waiting=set(entry.waiting))
+
+
+def _extend_summary(run: QueueEntry, entry: QueueEntry, targets: List[object]) -> None:
+    summary = run.record["payload"]
+    payload = entry.record["payload"]
+    assert isinstance(summary, dict) and isinstance(payload, dict)
+    if entry.record.get("payload_type") == HEALTH_SUMMARY:
+        summary["count"] = int(summary["count"]) + int(payload.get("count", 1))
+        summary["last_ts"] = payload.get("last_ts")
+        seq = payload.get("last_seq")
+    else:
+        summary["count"] = int(summary["count"]) + 1
+        summary["last_ts"] = payload.get("ts")
+        summary["targets"] = targets
+        seq = payload.get("seq")
+    if seq is not None:
+        summary.setdefault("first_seq", seq)
+        summary["last_seq"] = seq
+    run.waiting |= entry.waiting
+
+
+__all__ = ["QueueEntry", "compact_entries", "HEALTH", "HEALTH_SUMMARY", "INVENTORY"]
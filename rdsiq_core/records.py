@@ -0,0 +1,72 @@
+"""Serialize-once payloads shared by the queue, sinks and uploads."""
+from __future__ import annotations
+
+import gzip
+import json
+from dataclasses import fields
+from typing import Any, Callable, Dict, Mapping, Optional
+
+
+def dumps(value: object) -> bytes:
+    """Canonical compact JSON bytes."""
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+class EncodedRecord(dict):
+    """A payload dict that carries its canonical JSON bytes.
+
+    The bytes are computed once when the record is built (or supplied by a
+    caller that spliced them from another record) and ``gzip`` is compressed on
+    first use, so every consumer of one payload shares a single encoding. The
+    dict must not be mutated afterwards; code that only needs a mapping can
+    keep treating it as a plain dict.
+    """
+
+    __slots__ = ("json", "_gzip")
+
+    def __init__(self, data: Mapping[str, object], json_bytes: Optional[bytes] = None) -> None:
+        super().__init__(data)
+        self.json = json_bytes if json_bytes is not None else dumps(self)
+        self._gzip: Optional[bytes] = None
+
+    @property
+    def gzip(self) -> bytes:
+        if self._gzip is None:
+            self._gzip = gzip.compress(self.json, mtime=0)
+        return self._gzip
+
+    def extend(self, **extra: object) -> "EncodedRecord":
+        """Copy with ``extra`` keys appended, splicing bytes instead of re-encoding."""
+        if not extra or any(key in self for key in extra):
+            return EncodedRecord({**self, **extra})
+        tail = dumps(extra)[1:]
+        return EncodedRecord({**self, **extra}, self.json[:-1] + (b"," + tail if self else tail))
+
+
+def payload_json(payload: Mapping[str, object]) -> bytes:
+    """Encoded bytes of ``payload``, reused when it is an ``EncodedRecord``."""
+    return payload.json if isinstance(payload, EncodedRecord) else dumps(payload)
+
+
+def envelope(payload: Mapping[str, object], **fields_: object) -> bytes:
+    """``{**fields_, "payload": payload}`` as JSON without re-encoding the payload."""
+    head = dumps(fields_)[:-1]
+    return head + (b"," if fields_ else b"") + b'"payload":' + payload_json(payload) + b"}"
+
+
+def compile_encoder(cls: type) -> Callable[[Any], Dict[str, object]]:
+    """Build a ``dataclass -> dict`` function once for a flat dataclass.
+
+    Equivalent to ``dataclasses.asdict`` for dataclasses whose fields hold
+    scalars, without walking the fields and deep-copying values on every call.
+    """
+    names = [f.name for f in fields(cls)]
+    body = ", ".join(f"{name!r}: obj.{name}" for name in names)
+    namespace: Dict[str, Any] = {}
+    exec(f"def encode(obj):\n    return {{{body}}}\n", namespace)
+    encode = namespace["encode"]
+    encode.__qualname__ = f"encode_{cls.__name__}"
+    return encode
+
+
+__all__ = ["EncodedRecord", "compile_encoder", "dumps", "envelope", "payload_json"]
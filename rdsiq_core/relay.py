@@ -0,0 +1,356 @@
+"""Store-hub relay: accept uploads from many local agents, forward them in batches."""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import functools
+import gzip
+import hashlib
+import json
+import ssl
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from time import monotonic
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, parse_qsl, urlencode, urlsplit
+
+from .breaker import CircuitBreaker
+from .config import FoundationConfig
+from .http_client import AsyncHTTPClient, HTTPError
+from .queue_log import FRAME_OVERHEAD, QueueLog
+from .queue_policy import QueueEntry, compact_entries
+from .telemetry import AppsScriptSink, Record
+
+RELAY_CONSUMER = "upstream"
+MAX_BODY = 8 * 1024 * 1024
+# Malformed bodies (bad gzip, bad JSON, lines that are not objects) answer 400.
+_BAD_REQUEST = (ValueError, KeyError, TypeError, AttributeError, EOFError, OSError, zlib.error)
+_REASONS = {
+    200: "OK",
+    304: "Not Modified",
+    400: "Bad Request",
+    401: "Unauthorized",
+    404: "Not Found",
+    502: "Bad Gateway",
+}
+
+Response = Tuple[int, bytes, Dict[str, str]]
+
+
+class Relay:
+    """Serve the Apps Script contract locally and forward it upstream in batches.
+
+    Agents point ``telemetry.app_script.base_url`` at the relay. ``POST /ingest``
+    and ``POST /ingest/batch`` are appended to a durable ``QueueLog`` and
+    acknowledged once on disk; concurrent uploads share one fsync. Idempotency
+    keys seen recently (``dedupe_keys``) are acknowledged without storing them
+    again. Past ``max_records`` or ``max_bytes`` the buffer is compacted with
+    ``compact_entries``, like the agent queue. It is forwarded through
+    ``upstream.send_batch`` when
+    ``flush_records`` are waiting or every ``flush_interval`` seconds, over the
+    upstream client's pooled connection, behind a ``CircuitBreaker``.
+    ``GET /watchlist[/<store>]`` is answered from one upstream copy refreshed
+    at most every ``watchlist_ttl`` seconds (with ``ETag`` and ``version`` so
+    agents revalidate cheaply). ``/trigger/<store>`` is passed through; agents
+    long-polling the same store at once share one upstream poll, and an
+    upstream failure is answered with ``502`` rather than a dropped connection.
+    """
+
+    def __init__(
+        self,
+        upstream: AppsScriptSink,
+        buffer_dir: Path,
+        api_key: str,
+        host: str = "0.0.0.0",
+        port: int = 8787,
+        flush_interval: float = 5.0,
+        flush_records: int = 200,
+        watchlist_ttl: float = 60.0,
+        dedupe_keys: int = 50_000,
+        context: Optional[ssl.SSLContext] = None,
+        max_records: int = 2000,
+        max_bytes: int = 8 * 1024 * 1024,
+    ) -> None:
+        self.upstream = upstream
+        self.api_key = api_key
+        self.host = host
+        self.port = port
+        self.flush_interval = flush_interval
+        self.flush_records = flush_records
+        self.watchlist_ttl = watchlist_ttl
+        self.dedupe_keys = dedupe_keys
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.breaker = CircuitBreaker()
+        self.stats = {"received": 0, "duplicates": 0, "forwarded": 0, "flushes": 0, "coalesced": 0, "compactions": 0}
+        # Appends are synced by the group commit below, on rollover, ack and close.
+        self.log = QueueLog(buffer_dir, fsync="interval", fsync_interval=float("inf"), consumers=(RELAY_CONSUMER,))
+        self._context = context
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self.pending = 0
+        for _, record in self.log.replay(RELAY_CONSUMER):
+            self._remember(str(record["id"]))
+            self.pending += 1
+        self._wake = asyncio.Event()
+        self._commit: Optional[asyncio.Future] = None
+        self._watch: Optional[Dict[str, Dict[str, str]]] = None
+        self._watch_at = 0.0
+        self._watch_lock = asyncio.Lock()
+        self._trigger_polls: Dict[str, asyncio.Future] = {}
+        self._flush_lock = asyncio.Lock()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._forwarder: Optional[asyncio.Future] = None
+
+    @classmethod
+    def from_config(cls, config: FoundationConfig) -> "Relay":
+        app = config.telemetry.app_script
+        relay = config.relay
+        client_ctx = ssl.create_default_context(cafile=app.cafile) if app.cafile else None
+        upstream = AppsScriptSink(
+            app.base_url,
+            app.api_key,
+            http=AsyncHTTPClient(context=client_ctx),
+            batch_max_records=config.telemetry.batch_max_records,
+            batch_max_bytes=config.telemetry.batch_max_bytes,
+        )
+        server_ctx = None
+        if relay.certfile:
+            server_ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            server_ctx.load_cert_chain(relay.certfile, relay.keyfile)
+        return cls(
+            upstream,
+            relay.buffer_dir,
+            app.api_key,
+            host=relay.host,
+            port=relay.port,
+            flush_interval=relay.flush_interval,
+            flush_records=relay.flush_records,
+            watchlist_ttl=relay.watchlist_ttl,
+            context=server_ctx,
+            max_records=config.telemetry.queue_max_records,
+            max_bytes=config.telemetry.queue_max_bytes,
+        )
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, ssl=self._context)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._forwarder = asyncio.ensure_future(self._forward_loop())
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._forwarder is not None:
+            self._forwarder.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._forwarder
+        self.log.close()
+        await self.upstream.close()
+
+    async def flush(self) -> int:
+        """Forward the buffered backlog now; return how many records upstream acknowledged."""
+        forwarded = 0
+        async with self._flush_lock:
+            backlog = list(self.log.replay(RELAY_CONSUMER))
+            for start in range(0, len(backlog), self.flush_records):
+                chunk = backlog[start : start + self.flush_records]
+                acked = await self.upstream.send_batch([record for _, record in chunk])
+                if not acked:
+                    self.breaker.record_failure()
+                    break
+                self.breaker.record_success()
+                seqs = [seq for seq, record in chunk if record["id"] in acked]
+                self.log.ack(seqs, RELAY_CONSUMER)
+                self.pending -= len(seqs)
+                forwarded += len(seqs)
+        self.stats["forwarded"] += forwarded
+        self.stats["flushes"] += 1
+        return forwarded
+
+    async def _forward_loop(self) -> None:
+        while True:
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            self._wake.clear()
+            if self.pending and self.breaker.ready():
+                await self.flush()
+
+    async def _store(self, records: List[Record]) -> None:
+        for record in records:
+            idem = str(record["id"])
+            self.stats["received"] += 1
+            if idem in self._seen:
+                self.stats["duplicates"] += 1
+                continue
+            self.log.append(record)
+            self._remember(idem)
+            self.pending += 1
+        await self._group_commit()
+        # A flush in progress holds seqs of the current log; compact on a later upload.
+        over = self.pending > self.max_records or self.log.size_bytes > self.max_bytes
+        if over and not self._flush_lock.locked():
+            self._compact()
+        if self.pending >= self.flush_records:
+            self._wake.set()
+
+    def _compact(self) -> None:
+        entries = [QueueEntry(record, set(waiting)) for _, record, waiting in self.log.backlog()]
+        kept = compact_entries(entries, self.max_records, self.max_bytes, record_overhead=FRAME_OVERHEAD)
+        self.log.rewrite([(entry.record, entry.waiting) for entry in kept])
+        self.pending = len(kept)
+        self.stats["compactions"] += 1
+
+    async def _group_commit(self) -> None:
+        """Wait until everything appended so far is on disk, sharing one fsync."""
+        if self._commit is None:
+            self._commit = asyncio.ensure_future(self._sync_soon())
+        await asyncio.shield(self._commit)
+
+    async def _sync_soon(self) -> None:
+        await asyncio.sleep(0)  # let uploads already in flight append first
+        self._commit = None
+        self.log.sync()
+
+    def _remember(self, idem: str) -> None:
+        self._seen[idem] = None
+        self._seen.move_to_end(idem)
+        while len(self._seen) > self.dedupe_keys:
+            self._seen.popitem(last=False)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                try:
+                    status, data, extra = await self._dispatch(method, target, headers, body)
+                except _BAD_REQUEST:
+                    status, data, extra = 400, b"invalid payload", {}
+                close = headers.get("connection", "").lower() == "close"
+                writer.write(_encode_response(status, data, extra, close))
+                await writer.drain()
+                if close:
+                    break
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method: str, target: str, headers: Dict[str, str], body: bytes) -> Response:
+        if headers.get("x-rds-key") != self.api_key:
+            return 401, b"unauthorized", {}
+        parts = urlsplit(target)
+        path = parts.path.rstrip("/")
+        if headers.get("content-encoding", "").lower() == "gzip":
+            body = gzip.decompress(body)
+        if method == "POST" and path.endswith("/ingest"):
+            idem = headers["x-idempotency-key"]
+            payload_type = headers.get("x-payload-type") or idem.split("-", 1)[0]
+            await self._store([{"payload_type": payload_type, "payload": json.loads(body), "id": idem}])
+            return 200, b"ok", {}
+        if method == "POST" and path.endswith("/ingest/batch"):
+            lines = [json.loads(line) for line in body.splitlines() if line.strip()]
+            records = [
+                {"payload_type": line["type"], "payload": line["payload"], "id": str(line["id"])} for line in lines
+            ]
+            await self._store(records)
+            return 200, json.dumps({"acked": [r["id"] for r in records]}).encode(), {}
+        if method == "GET" and "/watchlist" in path:
+            store = path.rsplit("/", 1)[1] if not path.endswith("/watchlist") else None
+            return await self._watchlist(store, headers, parse_qs(parts.query))
+        if "/trigger/" in path:
+            return await self._pass_through(method, target, headers, body)
+        return 404, b"not found", {}
+
+    async def _watchlist(self, store: Optional[str], headers: Dict[str, str], query: Dict[str, List[str]]) -> Response:
+        async with self._watch_lock:
+            # Hundreds of agents polling at once share a single upstream fetch.
+            if self._watch is None or monotonic() - self._watch_at >= self.watchlist_ttl:
+                self._watch = await self.upstream.fetch_watchlist()
+                self._watch_at = monotonic()
+        stores = self._watch if store is None else {k: v for k, v in self._watch.items() if k == store}
+        canonical = json.dumps(stores, sort_keys=True, separators=(",", ":")).encode()
+        version = hashlib.sha1(canonical).hexdigest()[:16]
+        etag = {"ETag": f'"{version}"'}
+        if headers.get("if-none-match") == etag["ETag"]:
+            return 304, b"", etag
+        if query.get("since", [None])[0] == version:
+            return 200, json.dumps({"unchanged": True, "version": version}).encode(), etag
+        return 200, json.dumps({"stores": stores, "version": version}).encode(), etag
+
+    async def _pass_through(self, method: str, target: str, headers: Dict[str, str], body: bytes) -> Response:
+        parts = urlsplit(target)
+        url = self.upstream.base_url + parts.path[parts.path.index("/trigger/") :]
+        query = parts.query
+        if method == "GET":
+            # Each agent's ``since`` differs; drop it so a store's pollers share one URL.
+            query = urlencode([(k, v) for k, v in parse_qsl(query) if k != "since"])
+        if query:
+            url += f"?{query}"
+        if method != "GET":
+            return await self._forward(method, url, headers, body)
+        # Every agent of a store long-polls the same URL: share one upstream poll.
+        shared = self._trigger_polls.get(url)
+        if shared is None or shared.done():
+            shared = asyncio.ensure_future(self._forward(method, url, headers, body))
+            self._trigger_polls[url] = shared
+            shared.add_done_callback(functools.partial(self._forget_poll, url))
+        else:
+            self.stats["coalesced"] += 1
+        return await asyncio.shield(shared)
+
+    def _forget_poll(self, url: str, done: asyncio.Future) -> None:
+        if self._trigger_polls.get(url) is done:
+            del self._trigger_polls[url]
+
+    async def _forward(self, method: str, url: str, headers: Dict[str, str], body: bytes) -> Response:
+        wait = float(parse_qs(urlsplit(url).query).get("wait", ["0"])[0])
+        forward = {"X-RDS-Key": self.upstream.api_key}
+        if method == "POST":
+            forward.update({"Content-Type": "application/json", "Content-Encoding": "gzip"})
+            forward["X-Idempotency-Key"] = headers.get("x-idempotency-key", "")
+            body = gzip.compress(body)
+        http = self.upstream.http
+        try:
+            response = await http.request(
+                method, url, body=body if method == "POST" else None, headers=forward, timeout=http.timeout + wait
+            )
+        except (HTTPError, OSError, asyncio.TimeoutError):
+            return 502, b"bad gateway", {}
+        return response.status, response.body, {}
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as exc:
+        if exc.partial:
+            raise
+        return None
+    lines = head.decode("latin-1").split("\r\n")
+    method, target = lines[0].split(" ")[:2]
+    headers: Dict[str, str] = {}
+    for line in lines[1:]:
+        if line:
+            key, _, value = line.partition(":")
+            headers[key.strip().lower()] = value.strip()
+    length = int(headers.get("content-length") or 0)
+    if length > MAX_BODY:
+        raise ValueError("request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method, target, headers, body
+
+
+def _encode_response(status: int, body: bytes, headers: Dict[str, str], close: bool) -> bytes:
+    lines = [f"HTTP/1.1 {status} {_REASONS.get(status, 'OK')}", f"Content-Length: {len(body)}"]
+    if body.startswith(b"{"):
+        lines.append("Content-Type: application/json")
+    lines.extend(f"{key}: {value}" for key, value in headers.items())
+    if close:
+        lines.append("Connection: close")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+__all__ = ["Relay", "RELAY_CONSUMER"]
@@ -0,0 +1,108 @@
+"""Append-only JSONL file with a cached handle and day/size rotation."""
+from __future__ import annotations
+
+import gzip
+import os
+import shutil
+from datetime import date, datetime
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, TextIO
+
+
+class RotatingFile:
+    """Keep ``path`` open for appends and rotate it by UTC day and/or size.
+
+    A write that would push the file past ``max_bytes`` (0 disables), or that
+    lands on a later day than the file was started (``daily``), first moves
+    the file to ``<stem>.<YYYY-MM-DD>[.<n>]<suffix>`` and gzips it when
+    ``compress`` is set. Only the newest ``keep`` rotated segments are kept, so
+    disk use stays bounded. Not thread-safe; callers serialise writes.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_bytes: int = 16 * 1024 * 1024,
+        daily: bool = True,
+        keep: int = 30,
+        compress: bool = True,
+        clock: Callable[[], datetime] = datetime.utcnow,
+    ) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.daily = daily
+        self.keep = keep
+        self.compress = compress
+        self.rotations = 0
+        self._clock = clock
+        self._fh: Optional[TextIO] = None
+        self._size = 0
+        self._day: Optional[date] = None
+
+    def write(self, lines: Iterable[str], fsync: bool = False) -> None:
+        """Append ``lines`` (newline-terminated) with one flush, rotating between lines."""
+        self._open()
+        today = self._clock().date()
+        for line in lines:
+            size = len(line.encode("utf-8"))
+            if self._size and (
+                (self.daily and self._day != today) or (self.max_bytes and self._size + size > self.max_bytes)
+            ):
+                self._sync(fsync)
+                self._rotate()
+                self._open()
+            assert self._fh is not None
+            if not self._size:
+                self._day = today
+            self._fh.write(line)
+            self._size += size
+        self._sync(fsync)
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def segments(self) -> List[Path]:
+        """Rotated segments, oldest first."""
+        pattern = f"{self.path.stem}.????-??-??*{self.path.suffix}*"
+        return sorted(self.path.parent.glob(pattern), key=lambda p: (p.stat().st_mtime, p.name))
+
+    def _sync(self, fsync: bool) -> None:
+        if self._fh is not None:
+            self._fh.flush()
+            if fsync:
+                os.fsync(self._fh.fileno())
+
+    def _open(self) -> None:
+        if self._fh is not None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = self.path.open("a", encoding="utf-8", newline="")
+        self._size = self._fh.tell()
+        if self._size:
+            # An existing file belongs to the day it was last written.
+            self._day = datetime.utcfromtimestamp(self.path.stat().st_mtime).date()
+
+    def _rotate(self) -> None:
+        self.close()
+        stamp = (self._day or self._clock().date()).isoformat()
+        base = self.path.with_name(f"{self.path.stem}.{stamp}")
+        target = base.with_name(base.name + self.path.suffix)
+        n = 0
+        while target.exists() or Path(f"{target}.gz").exists():
+            n += 1
+            target = base.with_name(f"{base.name}.{n}{self.path.suffix}")
+        os.replace(self.path, target)
+        if self.compress:
+            with target.open("rb") as src, gzip.open(f"{target}.gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            target.unlink()
+        self.rotations += 1
+        self._size = 0
+        if self.keep:
+            for old in self.segments()[: -self.keep]:
+                old.unlink(missing_ok=True)
+
+
+__all__ = ["RotatingFile"]
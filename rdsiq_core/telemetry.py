@@ -2,66 +2,341 @@
 from __future__ import annotations
 
 import asyncio
+import contextlib
 import gzip
-import http.client
 import json
+import logging
+import ssl
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Set, Tuple
+from urllib.parse import quote, urlencode
 
+from .breaker import HALF_OPEN, CircuitBreaker
 from .config import QUEUE_DIR, TelemetryConfig
+from .http_client import AsyncHTTPClient
+from .queue_log import DEFAULT_CONSUMER, FRAME_OVERHEAD, QueueLog
+from .queue_policy import QueueEntry, compact_entries
+from .records import EncodedRecord, envelope
+from .rotating_file import RotatingFile
+
+
+# Queued records share the QueueStorage shape: {"payload_type", "payload", "id"}.
+Record = Dict[str, object]
+_log = logging.getLogger(__name__)
+
+# Called once per delivered chunk of a batch with the ids it acknowledged.
+ChunkCallback = Callable[[Set[str]], None]
+# Longest trigger hold the server grants (TRIGGER_MAX_WAIT in ingest.gs).
+LONG_POLL_MAX_WAIT = 25.0
 
 
 class TelemetrySink:
     name = "base"
+    # Whether send_batch accepts records folded by TelemetryManager.pack_backlog.
+    packable = False
 
     async def send(self, payload_type: str, payload: Dict[str, object], idempotency: str) -> bool:
         raise NotImplementedError
 
+    async def send_batch(self, records: List[Record], on_chunk: Optional[ChunkCallback] = None) -> Set[str]:
+        """Deliver several records and return the ids the sink acknowledged.
+
+        ``on_chunk`` is told about each record as it lands, so a caller that
+        times out part-way still knows what was delivered.
+        """
+        acked: Set[str] = set()
+        for record in records:
+            idem = str(record["id"])
+            ok = await self.send(str(record["payload_type"]), record["payload"], idem)  # type: ignore[arg-type]
+            if ok:
+                acked.add(idem)
+            if on_chunk is not None:
+                on_chunk({idem} if ok else set())
+        return acked
+
+    async def close(self) -> None:
+        """Flush and release resources on shutdown."""
+
 
 class LocalFileSink(TelemetrySink):
+    """Append records to ``<type>.jsonl`` files through cached, rotating handles.
+
+    Lines are buffered in memory and written (in one worker-thread hop for all
+    types) once ``buffer_bytes`` are waiting or ``flush_interval`` seconds after
+    the first buffered line; ``flush_interval`` 0 writes on every send. A send
+    returns only after the flush holding its lines has written them, so the
+    queue never acknowledges a record that is still in memory. A failed write
+    keeps the lines buffered for the next flush and reports the send as not
+    delivered; a resend of an id that is still buffered is not buffered twice.
+    ``fsync`` syncs each write. Files rotate by day and ``max_bytes`` and
+    rotated segments are gzipped (see ``RotatingFile``). ``close()`` flushes
+    what is left.
+    """
+
     name = "local"
 
-    def __init__(self, base_dir: Path) -> None:
+    def __init__(
+        self,
+        base_dir: Path,
+        flush_interval: float = 1.0,
+        buffer_bytes: int = 64 * 1024,
+        fsync: bool = False,
+        max_bytes: int = 16 * 1024 * 1024,
+        daily: bool = True,
+        keep: int = 30,
+        clock: Callable[[], datetime] = datetime.utcnow,
+    ) -> None:
         self.base_dir = base_dir
         self.base_dir.mkdir(parents=True, exist_ok=True)
+        self.flush_interval = flush_interval
+        self.buffer_bytes = buffer_bytes
+        self.fsync = fsync
+        self.max_bytes = max_bytes
+        self.daily = daily
+        self.keep = keep
+        self.write_errors = 0
+        self._clock = clock
+        self._files: Dict[str, RotatingFile] = {}
+        self._buffer: Dict[str, List[str]] = {}
+        self._buffered = 0
+        self._buffered_ids: Set[str] = set()
+        self._waiters: List[asyncio.Future] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
 
     async def send(self, payload_type: str, payload: Dict[str, object], idempotency: str) -> bool:
-        path = self.base_dir / f"{payload_type}.jsonl"
-        record = json.dumps({"id": idempotency, "payload": payload})
-        await asyncio.to_thread(self._append, path, record)
-        return True
-
-    def _append(self, path: Path, record: str) -> None:
-        path.parent.mkdir(parents=True, exist_ok=True)
-        with path.open("a") as fh:
-            fh.write(record + "\n")
+        self._buffer_line(payload_type, idempotency, payload)
+        return await self._commit()
+
+    async def send_batch(self, records: List[Record], on_chunk: Optional[ChunkCallback] = None) -> Set[str]:
+        for record in records:
+            payload: Dict[str, object] = record["payload"]  # type: ignore[assignment]
+            self._buffer_line(str(record["payload_type"]), str(record["id"]), payload)
+        written = await self._commit()
+        acked = {str(record["id"]) for record in records} if written else set()
+        if on_chunk is not None:
+            on_chunk(acked)
+        return acked
+
+    async def flush(self) -> bool:
+        """Write everything buffered; return False (keeping the lines) if the write failed."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        async with self._flush_lock:
+            pending, ids, waiters = self._buffer, self._buffered_ids, self._waiters
+            self._buffer, self._buffered, self._buffered_ids, self._waiters = {}, 0, set(), []
+            try:
+                if pending:
+                    await asyncio.to_thread(self._write, pending)
+            except Exception as exc:
+                self.write_errors += 1
+                _log.warning("local sink: write to %s failed, %d ids stay buffered: %s", self.base_dir, len(ids), exc)
+                self._restore(pending, ids)
+                written = False
+            else:
+                written = True
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(written)
+        return written
+
+    async def close(self) -> None:
+        await self.flush()
+        if self._flush_task is not None:
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        for handle in self._files.values():
+            handle.close()
+        self._files.clear()
+
+    def _buffer_line(self, payload_type: str, idempotency: str, payload: Dict[str, object]) -> None:
+        if idempotency in self._buffered_ids:
+            return
+        line = envelope(payload, id=idempotency).decode("utf-8")
+        self._buffer.setdefault(payload_type, []).append(line + "\n")
+        self._buffered += len(line) + 1
+        self._buffered_ids.add(idempotency)
+
+    def _restore(self, pending: Dict[str, List[str]], ids: Set[str]) -> None:
+        # Lines from the failed write go back in front of anything buffered since.
+        for payload_type, lines in self._buffer.items():
+            pending.setdefault(payload_type, []).extend(lines)
+        self._buffer = pending
+        self._buffered = sum(len(line) for lines in pending.values() for line in lines)
+        self._buffered_ids |= ids
+
+    async def _commit(self) -> bool:
+        """Wait for the flush that writes what is buffered now."""
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        await self._maybe_flush()
+        return await waiter
+
+    async def _maybe_flush(self) -> None:
+        if self.flush_interval <= 0 or self._buffered >= self.buffer_bytes:
+            await self.flush()
+        elif self._timer is None:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(self.flush_interval, self._flush_later)
+
+    def _flush_later(self) -> None:
+        self._timer = None
+        self._flush_task = asyncio.ensure_future(self.flush())
+        self._flush_task.add_done_callback(_log_task_error)
+
+    def _write(self, pending: Dict[str, List[str]]) -> None:
+        for payload_type, lines in pending.items():
+            handle = self._files.get(payload_type)
+            if handle is None:
+                path = self.base_dir / f"{payload_type}.jsonl"
+                handle = RotatingFile(
+                    path, max_bytes=self.max_bytes, daily=self.daily, keep=self.keep, clock=self._clock
+                )
+                self._files[payload_type] = handle
+            handle.write(lines, fsync=self.fsync)
+
+
+@dataclass(slots=True)
+class _CachedPoll:
+    data: Dict[str, object]
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    version: Optional[str] = None
 
 
 class AppsScriptSink(TelemetrySink):
+    """Uploads to the Apps Script endpoint and polls its watchlist and triggers.
+
+    Polls are conditional: the last response per URL is cached with its
+    ``ETag``/``Last-Modified`` (sent back as ``If-None-Match`` /
+    ``If-Modified-Since``) and its body ``version`` (sent as ``?since=``). A
+    ``304`` or an ``{"unchanged": true}`` body reuses the cached data. With
+    ``long_poll`` > 0 trigger polls also pass ``?wait=`` (capped at
+    ``LONG_POLL_MAX_WAIT``) so the server can hold the request until a refresh
+    is set.
+
+    Batches go out as at most ``batch_max_chunks`` requests per call, each
+    bounded by ``timeout`` seconds (the client default when None).
+    """
+
     name = "apps_script"
 
-    def __init__(self, base_url: str, api_key: str) -> None:
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        http: Optional[AsyncHTTPClient] = None,
+        batch_max_records: int = 200,
+        batch_max_bytes: int = 256 * 1024,
+        packable: bool = False,
+        long_poll: float = 0.0,
+        batch_max_chunks: int = 4,
+        timeout: Optional[float] = None,
+    ) -> None:
         self.base_url = base_url.rstrip("/")
+        self.packable = packable
         self.api_key = api_key
+        self.http = http or AsyncHTTPClient()
+        self.batch_max_records = batch_max_records
+        self.batch_max_bytes = batch_max_bytes
+        self.batch_max_chunks = batch_max_chunks
+        self.timeout = timeout
+        self.long_poll = min(long_poll, LONG_POLL_MAX_WAIT)
+        self.not_modified = 0
+        self._polls: Dict[str, _CachedPoll] = {}
 
     async def send(self, payload_type: str, payload: Dict[str, object], idempotency: str) -> bool:
         url = f"{self.base_url}/ingest"
-        return await _post_gzip_json(url, payload, self.api_key, idempotency)
-
-    async def fetch_watchlist(self) -> Dict[str, Dict[str, str]]:
-        url = f"{self.base_url}/watchlist"
-        data = await _get_json(url, self.api_key)
-        return data.get("stores", {}) if isinstance(data, dict) else {}
-
-    async def check_trigger(self, store: str) -> bool:
-        url = f"{self.base_url}/trigger/{store}"
-        data = await _get_json(url, self.api_key)
-        if isinstance(data, dict) and data.get("refresh"):
-            await _post_gzip_json(url, {"cleared": True}, self.api_key, f"clear-{store}")
+        return await _post_gzip_json(self.http, url, payload, self.api_key, idempotency, payload_type)
+
+    async def send_batch(self, records: List[Record], on_chunk: Optional[ChunkCallback] = None) -> Set[str]:
+        """POST records as gzip NDJSON to ``/ingest/batch``, one request per chunk.
+
+        The endpoint answers ``{"acked": [ids]}``; ids it leaves out (or every id
+        in a chunk whose request failed) are reported as unacknowledged. A chunk
+        that fails or times out ends the call, and chunks past
+        ``batch_max_chunks`` wait for the next one.
+        """
+        url = f"{self.base_url}/ingest/batch"
+        acked: Set[str] = set()
+        chunks = _ndjson_chunks(records, self.batch_max_records, self.batch_max_bytes)
+        for _, (ids, body) in zip(range(self.batch_max_chunks), chunks):
+            landed = await _post_gzip_batch(self.http, url, body, ids, self.api_key, self.timeout)
+            acked |= landed
+            if on_chunk is not None:
+                on_chunk(landed)
+            if not landed:
+                break
+        return acked
+
+    async def fetch_watchlist(self, store: Optional[str] = None) -> Dict[str, Dict[str, str]]:
+        """Return the watchlist ``stores`` map, only ``store``'s entry when given."""
+        url = f"{self.base_url}/watchlist" + (f"/{quote(store, safe='')}" if store else "")
+        data = await self._poll(url)
+        stores = data.get("stores", {})
+        return stores if isinstance(stores, dict) else {}
+
+    async def check_trigger(self, store: str) -> Optional[bool]:
+        """Return whether a refresh was flagged (clearing it), or None if the poll failed."""
+        url = f"{self.base_url}/trigger/{quote(store, safe='')}"
+        data = await self._poll(url, wait=self.long_poll)
+        if "refresh" not in data:
+            return None
+        if data.get("refresh"):
+            # The flag is consumed: never answer a later 304 with this cached body.
+            self._polls.pop(url, None)
+            await _post_gzip_json(self.http, url, {"cleared": True}, self.api_key, f"clear-{store}")
             return True
         return False
 
+    def pool_stats(self) -> Dict[str, int]:
+        return dict(self.http.stats(), not_modified=self.not_modified)
+
+    async def _poll(self, url: str, wait: float = 0.0) -> Dict[str, object]:
+        cached = self._polls.get(url)
+        headers = {"X-RDS-Key": self.api_key}
+        query: Dict[str, object] = {}
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+            if cached.version is not None:
+                query["since"] = cached.version
+        if wait > 0:
+            query["wait"] = f"{wait:g}"
+        target = f"{url}?{urlencode(query)}" if query else url
+        timeout = self.http.timeout + wait if wait > 0 else None
+        try:
+            response = await self.http.request("GET", target, headers=headers, timeout=timeout)
+            if response.status == 304 and cached is not None:
+                self.not_modified += 1
+                return cached.data
+            if response.status != 200:
+                return {}
+            data = json.loads(response.body.decode("utf-8"))
+        except Exception:
+            return {}
+        if not isinstance(data, dict):
+            return {}
+        if data.get("unchanged") and cached is not None:
+            self.not_modified += 1
+            return cached.data
+        version = data.get("version")
+        self._polls[url] = _CachedPoll(
+            data=data,
+            etag=response.headers.get("etag"),
+            last_modified=response.headers.get("last-modified"),
+            version=str(version) if version is not None else None,
+        )
+        return data
+
+    async def close(self) -> None:
+        await self.http.close()
+
 
 class VigilixPlaceholderSink(TelemetrySink):
     name = "vigilix"
@@ -79,118 +354,320 @@ SINK_REGISTRY = {
 
 
 class TelemetryManager:
+    """Fan payloads out to every sink through one shared durable queue.
+
+    Each payload is appended to the queue log first. Every sink then gets its
+    own backlog (records it has not acknowledged yet), concurrently and bounded
+    by ``sink_timeout``, so a hung or failing sink neither delays the others nor
+    makes them receive duplicates. A per-sink ``CircuitBreaker`` skips sinks
+    that keep failing and counts every request (each batch chunk) as one
+    success or failure; once its backoff expires a single record is sent as a
+    probe, followed by at most ``batch_max_records`` more that cycle.
+    """
+
     def __init__(self, config: TelemetryConfig, queue_dir: Optional[Path] = None) -> None:
         self.config = config
         self.queue_dir = queue_dir or QUEUE_DIR
+        self.sink_timeout = config.sink_timeout
         self.sinks: List[TelemetrySink] = []
-        self._queue = QueueStorage(self.queue_dir)
         for name in config.sinks:
             sink_cls = SINK_REGISTRY.get(name)
             if not sink_cls:
                 continue
             if sink_cls is LocalFileSink:
-                self.sinks.append(sink_cls(self.queue_dir / "sent"))
+                self.sinks.append(
+                    sink_cls(
+                        self.queue_dir / "sent",
+                        # Sends wait for their flush, which has to land inside the sink timeout.
+                        flush_interval=min(config.local_flush_interval, self.sink_timeout / 2),
+                        fsync=config.local_fsync,
+                        max_bytes=config.local_max_bytes,
+                        daily=config.local_rotate_daily,
+                        keep=config.local_keep,
+                    )
+                )
             elif sink_cls is AppsScriptSink:
-                self.sinks.append(sink_cls(config.app_script.base_url, config.app_script.api_key))
+                # A private CA lets agents trust a store-hub relay's certificate.
+                cafile = config.app_script.cafile
+                context = ssl.create_default_context(cafile=cafile) if cafile else None
+                self.sinks.append(
+                    sink_cls(
+                        config.app_script.base_url,
+                        config.app_script.api_key,
+                        http=AsyncHTTPClient(context=context),
+                        batch_max_records=config.batch_max_records,
+                        batch_max_bytes=config.batch_max_bytes,
+                        packable=config.batch_pack_history,
+                        long_poll=config.app_script.long_poll,
+                        batch_max_chunks=config.batch_max_chunks,
+                        timeout=config.sink_timeout,
+                    )
+                )
             else:
                 self.sinks.append(sink_cls())
+        self._queue = QueueStorage(
+            self.queue_dir,
+            consumers=[sink.name for sink in self.sinks],
+            max_records=config.queue_max_records,
+            max_bytes=config.queue_max_bytes,
+        )
+        self.breakers: Dict[str, CircuitBreaker] = {sink.name: CircuitBreaker() for sink in self.sinks}
 
     async def send_payload(self, payload_type: str, payload: Dict[str, object], ts: datetime, store: str) -> None:
         idempotency = f"{payload_type}-{store}-{ts.isoformat()}"
-        pending = await self._queue.load()
-        for entry in list(pending):
-            ok = await self._dispatch(entry["payload_type"], entry["payload"], entry["id"])
-            if not ok:
-                await self._queue.save(entry["payload_type"], entry["payload"], entry["id"])
-        success = await self._dispatch(payload_type, payload, idempotency)
-        if not success:
-            await self._queue.save(payload_type, payload, idempotency)
-
-    async def _dispatch(self, payload_type: str, payload: Dict[str, object], idempotency: str) -> bool:
-        ok_any = False
+        # Encoded once: the queue, the local file and the upload reuse these bytes.
+        encoded = payload if isinstance(payload, EncodedRecord) else EncodedRecord(payload)
+        await self._queue.save(payload_type, encoded, idempotency)
+        backlog = await self._queue.pending()
+        for records in backlog.values():
+            for record in records:
+                if record["id"] == idempotency:
+                    record["payload"] = encoded
+        acked = await asyncio.gather(*(self._deliver(sink, backlog.get(sink.name, [])) for sink in self.sinks))
+        await self._queue.ack_many({sink.name: ids for sink, ids in zip(self.sinks, acked)})
+
+    def pack_backlog(self, records: List[Record]) -> List[Record]:
+        """Hook for modules to fold a backlog into fewer, denser records.
+
+        A folded record lists the ids it replaces in ``members``; acknowledging
+        it acknowledges all of them. Only sinks with ``packable`` set get it.
+        """
+        return records
+
+    def breaker_states(self) -> Dict[str, Dict[str, object]]:
+        return {name: breaker.snapshot() for name, breaker in self.breakers.items()}
+
+    def pool_stats(self) -> Dict[str, Dict[str, int]]:
+        """Connection reuse and conditional-poll counters of the sinks that keep them."""
+        return {sink.name: sink.pool_stats() for sink in self.sinks if isinstance(sink, AppsScriptSink)}
+
+    async def close(self) -> None:
+        """Flush buffered sinks, close connections and the queue log."""
         for sink in self.sinks:
+            with contextlib.suppress(Exception):
+                await sink.close()
+        self._queue.log.close()
+
+    async def _deliver(self, sink: TelemetrySink, records: List[Record]) -> Set[str]:
+        breaker = self.breakers[sink.name]
+        if not records or not breaker.ready():
+            return set()
+        if breaker.state == HALF_OPEN and len(records) > 1:
+            probe = await self._send_records(sink, records[:1], breaker)
+            if not probe:
+                return set()
+            # A recovering link gets one bounded slice; the rest waits for the next cycle.
+            return probe | await self._send_records(sink, records[1 : 1 + self.config.batch_max_records], breaker)
+        return await self._send_records(sink, records, breaker)
+
+    async def _send_records(self, sink: TelemetrySink, records: List[Record], breaker: CircuitBreaker) -> Set[str]:
+        """Send ``records`` and feed the breaker one outcome per request (chunk)."""
+        if len(records) == 1:
+            record = records[0]
             try:
-                ok = await sink.send(payload_type, payload, idempotency)
+                send = sink.send(str(record["payload_type"]), record["payload"], str(record["id"]))  # type: ignore[arg-type]
+                ok = await asyncio.wait_for(send, timeout=self.sink_timeout)
             except Exception:
                 ok = False
-            ok_any = ok_any or ok
-        return ok_any
+            if ok:
+                breaker.record_success()
+                return {str(record["id"])}
+            breaker.record_failure()
+            return set()
+        if sink.packable:
+            records = self.pack_backlog(records)
+        acked: Set[str] = set()
+        chunks = 0
+
+        def landed(ids: Set[str]) -> None:
+            nonlocal chunks
+            chunks += 1
+            acked.update(ids)
+            if ids:
+                breaker.record_success()
+            else:
+                breaker.record_failure()
+
+        try:
+            # AppsScriptSink times each chunk itself; this bounds the call as a whole.
+            limit = self.sink_timeout * max(1, self.config.batch_max_chunks)
+            acked |= await asyncio.wait_for(sink.send_batch(records, on_chunk=landed), timeout=limit)
+        except Exception:
+            if not chunks:
+                breaker.record_failure()  # nothing came back at all
+        for record in records:
+            if "members" in record and record["id"] in acked:
+                acked |= set(record["members"])  # type: ignore[call-overload]
+        return acked
 
 
 class QueueStorage:
-    def __init__(self, base_dir: Path) -> None:
+    """Offline payload queue backed by a segmented ``QueueLog``.
+
+    Records are stored once and acknowledged per consumer (one per sink).
+    ``load``/``pending`` return undelivered records without removing them;
+    callers ``ack`` the ids that reached a sink. A record stays in the log (and
+    is replayed after a crash) until every consumer has acknowledged it.
+    Saving an id that is still pending is a no-op. When the backlog exceeds
+    ``max_records`` or ``max_bytes`` it is compacted with ``compact_entries``.
+    """
+
+    def __init__(
+        self,
+        base_dir: Path,
+        fsync: str = "always",
+        consumers: Sequence[str] = (DEFAULT_CONSUMER,),
+        max_records: int = 2000,
+        max_bytes: int = 8 * 1024 * 1024,
+    ) -> None:
         self.base_dir = base_dir
         self.base_dir.mkdir(parents=True, exist_ok=True)
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.compactions = 0
+        self.log = QueueLog(base_dir, fsync=fsync, consumers=consumers)
+        self._pending: Dict[str, int] = {}
+        self._reindex()
+        self._import_legacy()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    async def load(self, consumer: Optional[str] = None) -> List[Record]:
+        return await asyncio.to_thread(self._load_sync, consumer)
+
+    def _load_sync(self, consumer: Optional[str] = None) -> List[Record]:
+        return [record for _, record in self.log.replay(consumer)]
+
+    async def pending(self) -> Dict[str, List[Record]]:
+        return await asyncio.to_thread(self._pending_sync)
+
+    def _pending_sync(self) -> Dict[str, List[Record]]:
+        """Backlog per consumer, read in a single pass over the log."""
+        backlog: Dict[str, List[Record]] = {}
+        for _, record, waiting in self.log.backlog():
+            for name in waiting:
+                backlog.setdefault(name, []).append(record)
+        return backlog
 
-    async def load(self) -> List[Dict[str, object]]:
-        return await asyncio.to_thread(self._load_sync)
+    async def save(self, payload_type: str, payload: Dict[str, object], idempotency: str) -> None:
+        await asyncio.to_thread(self._save_sync, payload_type, payload, idempotency)
 
-    def _load_sync(self) -> List[Dict[str, object]]:
-        items = []
+    def _save_sync(self, payload_type: str, payload: Dict[str, object], idempotency: str) -> None:
+        if idempotency in self._pending:
+            return
+        record = envelope(payload, payload_type=payload_type, id=idempotency)
+        self._pending[idempotency] = self.log.append(record)
+        if len(self._pending) > self.max_records or self.log.size_bytes > self.max_bytes:
+            self._compact_sync()
+
+    def _compact_sync(self) -> None:
+        entries = [QueueEntry(record, set(waiting)) for _, record, waiting in self.log.backlog()]
+        kept = compact_entries(entries, self.max_records, self.max_bytes, record_overhead=FRAME_OVERHEAD)
+        self.log.rewrite([(entry.record, entry.waiting) for entry in kept])
+        self.compactions += 1
+        self._reindex()
+
+    def _reindex(self) -> None:
+        self._pending = {str(record["id"]): seq for seq, record in self.log.replay()}
+
+    async def ack(self, ids: Iterable[str], consumer: Optional[str] = None) -> None:
+        await asyncio.to_thread(self._ack_sync, list(ids), consumer)
+
+    def _ack_sync(self, ids: Iterable[str], consumer: Optional[str] = None) -> None:
+        names = [consumer] if consumer is not None else self.log.consumers
+        self._ack_many_sync({name: ids for name in names})
+
+    async def ack_many(self, acks: Mapping[str, Iterable[str]]) -> None:
+        await asyncio.to_thread(self._ack_many_sync, {name: list(ids) for name, ids in acks.items()})
+
+    def _ack_many_sync(self, acks: Mapping[str, Iterable[str]]) -> None:
+        self.log.ack_many(
+            {name: [self._pending[idem] for idem in ids if idem in self._pending] for name, ids in acks.items()}
+        )
+        for idem, seq in list(self._pending.items()):
+            if self.log.done(seq):
+                del self._pending[idem]
+
+    def _import_legacy(self) -> None:
+        # Queues written by the file-per-payload layout are moved into the log once.
         for path in sorted(self.base_dir.glob("queued-*.json")):
             try:
                 data = json.loads(path.read_text())
+                self._save_sync(str(data["payload_type"]), data["payload"], str(data["id"]))
             except Exception:
-                path.unlink(missing_ok=True)
-                continue
-            items.append(data)
+                pass
             path.unlink(missing_ok=True)
-        return items
 
-    async def save(self, payload_type: str, payload: Dict[str, object], idempotency: str) -> None:
-        await asyncio.to_thread(self._save_sync, payload_type, payload, idempotency)
-
-    def _save_sync(self, payload_type: str, payload: Dict[str, object], idempotency: str) -> None:
-        safe_id = idempotency.replace(":", "_")
-        path = self.base_dir / f"queued-{safe_id}.json"
-        if path.exists():
-            return
-        record = {"payload_type": payload_type, "payload": payload, "id": idempotency}
-        path.write_text(json.dumps(record))
 
+def _log_task_error(task: "asyncio.Future[object]") -> None:
+    if not task.cancelled() and task.exception() is not None:
+        _log.error("background task failed", exc_info=task.exception())
 
-async def _post_gzip_json(url: str, payload: Dict[str, object], api_key: str, idem: str) -> bool:
-    return await asyncio.to_thread(_post_sync, url, payload, api_key, idem)
 
-
-def _post_sync(url: str, payload: Dict[str, object], api_key: str, idem: str) -> bool:
+async def _post_gzip_json(
+    http: AsyncHTTPClient,
+    url: str,
+    payload: Dict[str, object],
+    api_key: str,
+    idem: str,
+    payload_type: Optional[str] = None,
+) -> bool:
     try:
-        conn, path = _build_connection(url)
-        body = gzip.compress(json.dumps(payload).encode("utf-8"))
+        body = payload.gzip if isinstance(payload, EncodedRecord) else EncodedRecord(payload).gzip
         headers = {
             "Content-Type": "application/json",
             "Content-Encoding": "gzip",
             "X-RDS-Key": api_key,
             "X-Idempotency-Key": idem,
         }
-        conn.request("POST", path, body=body, headers=headers)
-        response = conn.getresponse()
+        if payload_type:
+            headers["X-Payload-Type"] = payload_type
+        response = await http.request("POST", url, body=body, headers=headers)
         return 200 <= response.status < 300
     except Exception:
         return False
 
 
-def _get_json(url: str, api_key: str) -> Dict[str, object]:
+def _ndjson_chunks(
+    records: Iterable[Record], max_records: int, max_bytes: int
+) -> Iterator[Tuple[List[str], bytes]]:
+    """Yield ``(ids, ndjson_bytes)`` chunks bounded by record count and raw size."""
+    ids: List[str] = []
+    lines: List[bytes] = []
+    size = 0
+    for record in records:
+        line = envelope(record["payload"], id=record["id"], type=record["payload_type"])  # type: ignore[arg-type]
+        if lines and (len(lines) >= max_records or size + len(line) + 1 > max_bytes):
+            yield ids, b"\n".join(lines) + b"\n"
+            ids, lines, size = [], [], 0
+        ids.append(str(record["id"]))
+        lines.append(line)
+        size += len(line) + 1
+    if lines:
+        yield ids, b"\n".join(lines) + b"\n"
+
+
+async def _post_gzip_batch(
+    http: AsyncHTTPClient, url: str, body: bytes, ids: List[str], api_key: str, timeout: Optional[float] = None
+) -> Set[str]:
+    headers = {
+        "Content-Type": "application/x-ndjson",
+        "Content-Encoding": "gzip",
+        "X-RDS-Key": api_key,
+        "X-Idempotency-Key": f"batch-{ids[0]}-{len(ids)}",
+    }
     try:
-        conn, path = _build_connection(url)
-        conn.request("GET", path, headers={"X-RDS-Key": api_key})
-        response = conn.getresponse()
-        if response.status != 200:
-            return {}
-        data = response.read()
-        if response.getheader("Content-Encoding") == "gzip":
-            data = gzip.decompress(data)
-        return json.loads(data.decode("utf-8"))
+        response = await http.request("POST", url, body=gzip.compress(body), headers=headers, timeout=timeout)
+        if not 200 <= response.status < 300:
+            return set()
+        data = json.loads(response.body.decode("utf-8"))
     except Exception:
-        return {}
-
-
-def _build_connection(url: str) -> tuple[http.client.HTTPSConnection, str]:
-    if not url.startswith("https://"):
-        raise ValueError("Apps Script endpoint must be HTTPS")
-    without_scheme = url[len("https://") :]
-    host, _, path = without_scheme.partition("/")
-    return http.client.HTTPSConnection(host, timeout=5), "/" + path
+        return set()
+    acked = data.get("acked") if isinstance(data, dict) else None
+    if not isinstance(acked, list):
+        return set()
+    return {str(idem) for idem in acked} & set(ids)
 
 
 __all__ = [
@@ -32,6 +32,8 @@ class LocalUIBridge:
         last_failure: Optional[str],
         last_upload: Optional[datetime],
         summary: Dict[str, str],
+        sinks: Optional[Dict[str, Dict[str, object]]] = None,
+        diagnostics: Optional[Dict[str, object]] = None,
     ) -> None:
         if not self._token:
             self.lock()
@@ -43,6 +45,8 @@ class LocalUIBridge:
             "last_failure_reason": last_failure or "None recorded",
             "last_upload": last_upload.isoformat() if last_upload else None,
             "summary": summary,
+            "sinks": sinks or {},
+            "diagnostics": diagnostics or {},
             "tooltips": {
                 "status": "Green steady means all clear",
                 "send": "Uploads status to dashboard now",
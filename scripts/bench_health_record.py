@@ -0,0 +1,99 @@
+"""Benchmark per-cycle serialization of one health payload, before and after HealthRecord.
+
+A cycle turns the payload into the JSONL log line, the keyframe, the queue
+record, the local sink line and the gzip upload body. The legacy path
+(``asdict`` per target and a fresh ``json.dumps`` for every consumer) is
+replicated inline because it no longer ships. CPU is ``process_time`` per
+cycle; memory is the ``tracemalloc`` peak of one cycle.
+
+    python scripts/bench_health_record.py [--targets 10 100 1000] [--cycles 200]
+"""
+from __future__ import annotations
+
+import argparse
+from dataclasses import asdict
+from datetime import datetime
+import gzip
+import json
+from pathlib import Path
+import sys
+from time import process_time
+import tracemalloc
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from gping_next.schemas import HealthPayload, TargetStatus  # noqa: E402
+from gping_next.telemetry import HealthDeltaEncoder, HealthRecord  # noqa: E402
+from rdsiq_core.records import EncodedRecord, dumps, envelope  # noqa: E402
+
+
+def _legacy_cycle(payload: HealthPayload) -> int:
+    ts = payload.ts.isoformat()
+    log_line = json.dumps(
+        {"ts": ts, "store": payload.store, "targets": [asdict(t) for t in payload.targets], "reason": "heartbeat"}
+    )
+    data = {"ts": ts, "store": payload.store, "targets": [asdict(t) for t in payload.targets]}
+    data["loss_pct"], data["jitter_ms"] = payload.loss_pct, payload.jitter_ms
+    data["seq"], data["kind"] = 1, "key"
+    queued = json.dumps({"payload_type": "health", "payload": data, "id": "health-1"}, separators=(",", ":"))
+    local_line = json.dumps({"id": "health-1", "payload": data})
+    body = gzip.compress(json.dumps(data).encode("utf-8"))
+    return len(log_line) + len(queued) + len(local_line) + len(body)
+
+
+def _record_cycle(payload: HealthPayload) -> int:
+    record = HealthRecord(payload)
+    log_line = record.json[:-1] + b',"reason":' + dumps("heartbeat") + b"}"
+    data = HealthDeltaEncoder(keyframe_every=1).encode(record)
+    assert isinstance(data, EncodedRecord)
+    queued = envelope(data, payload_type="health", id="health-1")
+    local_line = envelope(data, id="health-1")
+    return len(log_line) + len(queued) + len(local_line) + len(data.gzip)
+
+
+def _payload(count: int) -> HealthPayload:
+    targets = [
+        TargetStatus(
+            name=f"target-{i:04d}",
+            up=i % 7 != 0,
+            code="success" if i % 7 else "tcp_timeout",
+            dns_ms=0.4,
+            tcp_ms=12.5 + i % 13,
+            tls_ms=30.25,
+            http_ms=48.0 + i % 5,
+            conn_reused=bool(i % 2),
+        )
+        for i in range(count)
+    ]
+    return HealthPayload(ts=datetime(2024, 1, 1, 12), store="KS-218", targets=targets, loss_pct=0.0, jitter_ms=1.2)
+
+
+def _measure(cycle, payload: HealthPayload, cycles: int) -> tuple:
+    start = process_time()
+    for _ in range(cycles):
+        cycle(payload)
+    cpu = (process_time() - start) / cycles
+    tracemalloc.start()
+    cycle(payload)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cpu, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--targets", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--cycles", type=int, default=200)
+    args = parser.parse_args()
+    print(f"{'targets':>8} {'path':>8} {'cpu us/cycle':>13} {'peak KiB':>9}")
+    for count in args.targets:
+        payload = _payload(count)
+        for label, cycle in (("legacy", _legacy_cycle), ("record", _record_cycle)):
+            cpu, peak = _measure(cycle, payload, args.cycles)
+            print(f"{count:>8} {label:>8} {cpu * 1e6:>13.1f} {peak / 1024:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
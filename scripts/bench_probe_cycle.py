@@ -0,0 +1,63 @@
+"""Benchmark probe-cycle wall time against target count and failure rate.
+
+Probes are simulated (a failing target sleeps for its full timeout, a healthy
+one answers in ~20 ms) so the numbers isolate scheduling behaviour: the old
+fixed ``Semaphore(3)`` versus the adaptive limiter with a cycle deadline.
+
+    python scripts/bench_probe_cycle.py [--timeout 0.5]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+from pathlib import Path
+import sys
+from time import perf_counter
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from gping_next import probes  # noqa: E402
+from gping_next.probes import ProbeRunner  # noqa: E402
+from gping_next.schemas import TargetSpec, TargetStatus  # noqa: E402
+
+
+def _simulated_probe(failing: set[str]):
+    async def probe(target: TargetSpec, services=None, on_connected=None) -> TargetStatus:
+        if target.name in failing:
+            await asyncio.sleep(target.timeout)
+            return TargetStatus(name=target.name, up=False, code="tcp_timeout")
+        await asyncio.sleep(0.02)
+        return TargetStatus(name=target.name, up=True, code="success", tcp_ms=20.0)
+
+    return probe
+
+
+async def _cycle(runner: ProbeRunner, targets: list[TargetSpec]) -> tuple[float, int]:
+    start = perf_counter()
+    results = await runner.probe_all(targets)
+    cut = sum(1 for r in results if r.code == "cycle_deadline")
+    return perf_counter() - start, cut
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--timeout", type=float, default=0.5, help="Simulated probe timeout (s)")
+    parser.add_argument("--deadline", type=float, default=5.0, help="Adaptive cycle deadline (s)")
+    args = parser.parse_args()
+    rng = random.Random(7)
+    print(f"{'targets':>7} {'fail%':>5} {'fixed(3) s':>10} {'adaptive s':>10} {'cut':>4}")
+    for count in (10, 30, 60):
+        targets = [TargetSpec(name=f"t{i}", host="sim", timeout=args.timeout) for i in range(count)]
+        for rate in (0.0, 0.5, 1.0):
+            failing = {t.name for t in targets if rng.random() < rate}
+            probes.probe_target = _simulated_probe(failing)  # type: ignore[assignment]
+            fixed, _ = await _cycle(ProbeRunner(max_concurrency=3, cycle_deadline=None), targets)
+            adaptive, cut = await _cycle(ProbeRunner(cycle_deadline=args.deadline), targets)
+            print(f"{count:>7} {int(rate * 100):>5} {fixed:>10.2f} {adaptive:>10.2f} {cut:>4}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+"""Benchmark the offline queue: file-per-payload layout versus the segmented log.
+
+For each backlog size the script times enqueueing every record, one failed
+replay cycle (read the backlog, nothing acknowledged) and a full drain (read
+and acknowledge everything). The log's limits are raised above the backlog so
+compaction never runs and the whole backlog is appended and replayed. The
+legacy layout is replicated inline because it no longer ships.
+
+    python scripts/bench_queue.py [--sizes 10000 100000] [--fsync interval]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+import shutil
+import sys
+import tempfile
+from time import perf_counter
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from rdsiq_core.telemetry import QueueStorage  # noqa: E402
+
+
+class LegacyQueueStorage:
+    """The previous ``queued-<id>.json`` implementation, kept for comparison."""
+
+    def __init__(self, base_dir: Path) -> None:
+        self.base_dir = base_dir
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+
+    def _load_sync(self) -> list:
+        items = []
+        for path in sorted(self.base_dir.glob("queued-*.json")):
+            items.append(json.loads(path.read_text()))
+            path.unlink(missing_ok=True)
+        return items
+
+    def _save_sync(self, payload_type: str, payload: dict, idempotency: str) -> None:
+        path = self.base_dir / f"queued-{idempotency.replace(':', '_')}.json"
+        if path.exists():
+            return
+        path.write_text(json.dumps({"payload_type": payload_type, "payload": payload, "id": idempotency}))
+
+
+def _payload(i: int) -> dict:
+    return {
+        "ts": f"2024-01-01T00:{i % 60:02d}:00",
+        "store": "KS-218",
+        "targets": [{"name": "gateway", "up": True, "code": "success", "tcp_ms": 1.7}],
+    }
+
+
+def _bench_legacy(base: Path, count: int) -> tuple:
+    queue = LegacyQueueStorage(base)
+    start = perf_counter()
+    for i in range(count):
+        queue._save_sync("health", _payload(i), f"health-{i:08d}")
+    enqueue = perf_counter() - start
+    start = perf_counter()
+    for item in queue._load_sync():  # a failed cycle rewrites every record
+        queue._save_sync(item["payload_type"], item["payload"], item["id"])
+    failed = perf_counter() - start
+    start = perf_counter()
+    queue._load_sync()
+    drain = perf_counter() - start
+    return enqueue, failed, drain
+
+
+def _bench_log(base: Path, count: int, fsync: str) -> tuple:
+    queue = QueueStorage(base, fsync=fsync, max_records=count, max_bytes=2**40)
+    start = perf_counter()
+    for i in range(count):
+        queue._save_sync("health", _payload(i), f"health-{i:08d}")
+    enqueue = perf_counter() - start
+    assert queue.compactions == 0 and len(queue) == count
+    start = perf_counter()
+    queue._load_sync()
+    failed = perf_counter() - start
+    start = perf_counter()
+    queue._ack_sync([item["id"] for item in queue._load_sync()])
+    drain = perf_counter() - start
+    queue.log.close()
+    return enqueue, failed, drain
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--fsync", default="interval", choices=["always", "interval", "never"])
+    args = parser.parse_args()
+    print(f"{'records':>8} {'queue':>8} {'enqueue s':>10} {'failed cycle s':>15} {'drain s':>8}")
+    for count in args.sizes:
+        for label in ("legacy", "log"):
+            base = Path(tempfile.mkdtemp(prefix="bench-queue-"))
+            try:
+                if label == "legacy":
+                    enqueue, failed, drain = _bench_legacy(base, count)
+                else:
+                    enqueue, failed, drain = _bench_log(base, count, args.fsync)
+            finally:
+                shutil.rmtree(base, ignore_errors=True)
+            print(f"{count:>8} {label:>8} {enqueue:>10.2f} {failed:>15.2f} {drain:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
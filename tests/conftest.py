@@ -1,6 +1,24 @@
+import shutil
+import subprocess
 import sys
 from pathlib import Path
 
+import pytest
+
 root = Path(__file__).resolve().parent.parent
 if str(root) not in sys.path:
     sys.path.insert(0, str(root))
+
+
+@pytest.fixture
+def self_signed(tmp_path):
+    """``(cert, key)`` paths of a throwaway self-signed certificate."""
+    if not shutil.which("openssl"):
+        pytest.skip("openssl CLI not available")
+    cert, key = tmp_path / "cert.pem", tmp_path / "key.pem"
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=gping-test", "-keyout", str(key), "-out", str(cert)],
+        check=True, capture_output=True,
+    )
+    return cert, key
@@ -0,0 +1,108 @@
+import asyncio
+import random
+from datetime import datetime
+
+from rdsiq_core import telemetry as core_telemetry
+from rdsiq_core.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from rdsiq_core.config import TelemetryConfig
+
+
+def test_breaker_opens_backs_off_and_admits_one_probe():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, base_delay=10, jitter=0.0, clock=lambda: now[0])
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.ready()
+    now[0] = 10.0
+    assert breaker.ready() and breaker.state == HALF_OPEN
+    assert not breaker.ready()
+    breaker.record_failure()
+    assert breaker.state == OPEN and breaker.retry_at == 30.0
+    now[0] = 30.0
+    assert breaker.ready()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.snapshot()["retry_in_s"] is None
+
+
+def test_jitter_stays_within_band():
+    breaker = CircuitBreaker(failure_threshold=1, base_delay=100, jitter=0.2, clock=lambda: 0.0, rng=random.Random(3))
+    breaker.record_failure()
+    assert 80.0 <= breaker.retry_at <= 120.0
+
+
+def test_open_sink_is_skipped_then_probed_with_a_single_record(tmp_path, monkeypatch):
+    class DeadSink(core_telemetry.TelemetrySink):
+        name = "dead"
+        alive = False
+        calls = []
+
+        async def send(self, payload_type, payload, idempotency):
+            DeadSink.calls.append(idempotency)
+            return DeadSink.alive
+
+    monkeypatch.setitem(core_telemetry.SINK_REGISTRY, "dead", DeadSink)
+    now = [0.0]
+
+    async def scenario():
+        manager = core_telemetry.TelemetryManager(TelemetryConfig(sinks=["local", "dead"]), queue_dir=tmp_path)
+        manager.breakers["dead"] = CircuitBreaker(failure_threshold=1, base_delay=60, jitter=0.0, clock=lambda: now[0])
+        for minute in range(3):
+            await manager.send_payload("health", {"n": minute}, datetime(2024, 1, 1, 12, minute), "S")
+        skipped_calls = list(DeadSink.calls)
+        now[0] = 60.0
+        DeadSink.alive = True
+        await manager.send_payload("health", {"n": 3}, datetime(2024, 1, 1, 12, 3), "S")
+        return skipped_calls, manager.breaker_states()["dead"], len(manager._queue)
+
+    skipped_calls, state, remaining = asyncio.run(scenario())
+    assert skipped_calls == ["health-S-2024-01-01T12:00:00"]
+    assert DeadSink.calls[1] == "health-S-2024-01-01T12:00:00"
+    assert len(DeadSink.calls) == 5
+    assert state["state"] == CLOSED and remaining == 0
+
+
+def test_breaker_counts_chunks_and_bounds_the_send_after_a_probe(tmp_path, monkeypatch):
+    class ChunkSink(core_telemetry.TelemetrySink):
+        name = "chunky"
+        fail_last = True
+        batches = []
+
+        async def send(self, payload_type, payload, idempotency):
+            return True
+
+        async def send_batch(self, records, on_chunk=None):
+            ChunkSink.batches.append(len(records))
+            acked = set()
+            for start in range(0, len(records), 2):
+                chunk = {str(r["id"]) for r in records[start : start + 2]}
+                if ChunkSink.fail_last and start + 2 >= len(records):
+                    chunk = set()
+                acked |= chunk
+                on_chunk(chunk)
+            return acked
+
+    monkeypatch.setitem(core_telemetry.SINK_REGISTRY, "chunky", ChunkSink)
+    now = [0.0]
+
+    async def scenario():
+        config = TelemetryConfig(sinks=["chunky"], batch_max_records=2)
+        manager = core_telemetry.TelemetryManager(config, queue_dir=tmp_path)
+        breaker = CircuitBreaker(failure_threshold=2, base_delay=60, jitter=0.0, clock=lambda: now[0])
+        manager.breakers["chunky"] = breaker
+        for i in range(5):
+            manager._queue._save_sync("health", {"n": i}, f"health-{i}")
+        await manager.send_payload("health", {"n": 5}, datetime(2024, 1, 1), "S")
+        partial = (breaker.state, breaker.failures, len(manager._queue))
+        breaker.state, breaker.retry_at = OPEN, 60.0
+        now[0] = 60.0
+        ChunkSink.fail_last = False
+        manager._queue._save_sync("health", {"n": 7}, "health-7")
+        await manager.send_payload("health", {"n": 6}, datetime(2024, 1, 2), "S")
+        return partial, breaker.state, len(manager._queue)
+
+    partial, state, remaining = asyncio.run(scenario())
+    # Two chunks landed and the last one failed: one failure, not an open breaker.
+    assert partial == (CLOSED, 1, 2)
+    # Half-open: one probe record, then one bounded slice; the rest waits.
+    assert ChunkSink.batches == [6, 2] and state == CLOSED and remaining == 1
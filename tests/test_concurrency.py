@@ -0,0 +1,94 @@
+import asyncio
+
+from gping_next.concurrency import AdaptiveLimiter
+from gping_next.probes import ProbeRunner
+from gping_next.schemas import TargetSpec, TargetStatus
+
+
+def test_limiter_opens_on_timeouts_and_settles_when_healthy():
+    limiter = AdaptiveLimiter(floor=3, ceiling=8)
+    for _ in range(10):
+        limiter.record(None, timed_out=True)
+    assert limiter.limit == 8
+    limiter.record(10.0, timed_out=False)
+    limiter.record(50.0, timed_out=False)
+    assert limiter.limit == 3  # inflated latency halves, healthy steps down
+
+
+def test_probe_all_respects_cycle_deadline(monkeypatch):
+    async def fake_probe(target, services=None, on_connected=None):
+        if target.name.startswith("dead"):
+            await asyncio.sleep(10)
+        return TargetStatus(name=target.name, up=True, code="success", tcp_ms=1.0)
+
+    monkeypatch.setattr("gping_next.probes.probe_target", fake_probe)
+    targets = [TargetSpec(name="ok", host="y")] + [TargetSpec(name=f"dead{i}", host="x") for i in range(5)]
+    runner = ProbeRunner(cycle_deadline=0.2)
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        results = await runner.probe_all(targets)
+        return results, loop.time() - started
+
+    results, elapsed = asyncio.run(scenario())
+    assert elapsed < 1.0
+    assert [r.code for r in results] == ["success"] + ["cycle_deadline"] * 5
+
+
+def test_probe_all_reports_crashed_probes_as_probe_error(monkeypatch):
+    async def fake_probe(target, services=None, on_connected=None):
+        if target.name == "broken":
+            raise KeyError("tcp_ms")
+        return TargetStatus(name=target.name, up=True, code="success", tcp_ms=1.0)
+
+    monkeypatch.setattr("gping_next.probes.probe_target", fake_probe)
+    targets = [TargetSpec(name="ok", host="y"), TargetSpec(name="broken", host="x")]
+    results = asyncio.run(ProbeRunner(cycle_deadline=1.0).probe_all(targets))
+    assert [(r.code, r.note) for r in results] == [("success", None), ("probe_error", "KeyError")]
+
+
+def test_rtt_sampling_runs_outside_the_limiter_slot():
+    from gping_next.probes import ProbeServices
+
+    async def handle(reader, writer):
+        writer.close()
+
+    async def scenario():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        targets = [
+            TargetSpec(name=n, host="127.0.0.1", port=port, use_tls=False, samples=3, sample_budget=0.6)
+            for n in ("a", "b")
+        ]
+        runner = ProbeRunner(concurrency=1, max_concurrency=1, services=ProbeServices())
+        loop = asyncio.get_running_loop()
+        async with server:
+            started = loop.time()
+            results = await runner.probe_all(targets)
+            elapsed = loop.time() - started
+        return results, elapsed, runner.limiter.in_flight
+
+    results, elapsed, in_flight = asyncio.run(scenario())
+    assert [r.samples for r in results] == [3, 3] and in_flight == 0
+    # One slot, two targets sampling for ~0.4 s each: they overlap instead of queueing.
+    assert elapsed < 0.7
+
+
+def test_timeouts_reclassified_by_the_arp_hint_still_open_the_limiter(monkeypatch):
+    from gping_next.probes import ProbeServices
+
+    async def never_connects(host, port):
+        await asyncio.sleep(10)
+
+    async def on_link(ip):
+        return True
+
+    monkeypatch.setattr("gping_next.probes.asyncio.open_connection", never_connects)
+    services = ProbeServices()
+    services.neighbors.has_entry = on_link  # type: ignore[assignment]
+    runner = ProbeRunner(concurrency=1, max_concurrency=4, services=services)
+    target = TargetSpec(name="cam", host="127.0.0.1", use_tls=False, timeout=0.05)
+    results = asyncio.run(runner.probe_all([target]))
+    assert results[0].code == "l2_present_l3_blocked"
+    assert runner.limiter.limit == 2 and runner.limiter.in_flight == 0
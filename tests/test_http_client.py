@@ -0,0 +1,123 @@
+import asyncio
+import gzip
+import ssl
+
+import pytest
+
+from rdsiq_core.http_client import AsyncHTTPClient, split_url
+from rdsiq_core.telemetry import AppsScriptSink
+
+
+def test_client_reuses_tls_connections_decodes_chunked_gzip_and_reconnects(self_signed):
+    cert, key = self_signed
+    server_ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    server_ctx.load_cert_chain(cert, key)
+    client_ctx = ssl.create_default_context(cafile=str(cert))
+    client_ctx.check_hostname = False
+    connections = []
+    uploads = []
+
+    async def handle(reader, writer):
+        connections.append(writer)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.decode().split("\r\n"):
+                    if line.lower().startswith("content-length:"):
+                        length = int(line.split(":", 1)[1])
+                if head.startswith(b"POST"):
+                    uploads.append(gzip.decompress(await reader.readexactly(length)))
+                    writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+                else:
+                    body = gzip.compress(b'{"stores": {"S1": {"mode": "watch"}}}')
+                    writer.write(
+                        b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\nContent-Encoding: gzip\r\n\r\n"
+                        + b"%x\r\n%s\r\n0\r\n\r\n" % (len(body), body)
+                    )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+    async def scenario():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0, ssl=server_ctx)
+        port = server.sockets[0].getsockname()[1]
+        sink = AppsScriptSink(f"https://127.0.0.1:{port}", "key", http=AsyncHTTPClient(context=client_ctx))
+        async with server:
+            stores = await sink.fetch_watchlist()
+            sent = await sink.send("health", {"store": "S1"}, "health-S1-1")
+            connections[0].close()
+            await asyncio.sleep(0.05)
+            again = await sink.fetch_watchlist()
+            stats = sink.pool_stats()
+            await sink.close()
+        return stores, sent, again, stats
+
+    stores, sent, again, stats = asyncio.run(scenario())
+    assert stores == {"S1": {"mode": "watch"}} and again == stores
+    assert sent is True and uploads == [b'{"store":"S1"}']
+    assert len(connections) == 2
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+
+def test_client_times_out_without_blocking_the_loop():
+    async def handle(reader, writer):
+        await reader.readuntil(b"\r\n\r\n")
+        await asyncio.sleep(5)
+
+    async def scenario():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        client = AsyncHTTPClient(timeout=0.2)
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        task = asyncio.ensure_future(ticker())
+        async with server:
+            with pytest.raises(asyncio.TimeoutError):
+                await client.request("GET", f"http://127.0.0.1:{port}/watchlist")
+        task.cancel()
+        return ticks, client.stats()
+
+    ticks, stats = asyncio.run(scenario())
+    assert ticks >= 10
+    assert stats["idle"] == 0
+
+
+def test_plain_http_is_only_allowed_for_loopback():
+    assert split_url("http://127.0.0.1:8080/ingest?x=1") == (("http", "127.0.0.1", 8080), "/ingest?x=1")
+    with pytest.raises(ValueError):
+        split_url("http://script.google.com/macros/s/abc/exec")
+
+
+def test_stale_stream_check_is_shared_and_survives_a_reader_without_a_buffer():
+    from gping_next import http_pool
+    from rdsiq_core.http_client import stream_is_stale
+
+    class Writer:
+        closing = False
+
+        def is_closing(self):
+            return self.closing
+
+    async def scenario():
+        writer = Writer()
+        idle, stray, closed = asyncio.StreamReader(), asyncio.StreamReader(), asyncio.StreamReader()
+        stray.feed_data(b"HTTP/1.1 200 OK\r\n")
+        closed.feed_eof()
+
+        class NoBuffer:
+            def at_eof(self):
+                return False
+
+        verdicts = [stream_is_stale(r, writer) for r in (idle, stray, closed, NoBuffer())]
+        writer.closing = True
+        return verdicts, stream_is_stale(idle, writer)
+
+    assert asyncio.run(scenario()) == ([False, True, True, False], True)
+    assert http_pool.stream_is_stale is stream_is_stale
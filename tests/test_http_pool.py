@@ -0,0 +1,39 @@
+import asyncio
+
+from gping_next.probes import ProbeServices, probe_target
+from gping_next.schemas import TargetSpec
+
+
+def test_keepalive_probes_reuse_warm_connection_and_recover_when_closed():
+    connections = []
+
+    async def handle(reader, writer):
+        connections.append(writer)
+        try:
+            while True:
+                await reader.readuntil(b"\r\n\r\n")
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+    async def scenario():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        services = ProbeServices()
+        target = TargetSpec(name="api", host="127.0.0.1", port=port, use_tls=False, http_path="/", keepalive=True)
+        async with server:
+            cold = await probe_target(target, services)
+            warm = [await probe_target(target, services) for _ in range(2)]
+            connections[0].close()
+            await asyncio.sleep(0.05)
+            recovered = await probe_target(target, services)
+            services.http.close()
+        return cold, warm, recovered, services.http
+
+    cold, warm, recovered, pool = asyncio.run(scenario())
+    assert cold.conn_reused is False and cold.tcp_ms is not None
+    assert all(s.up and s.conn_reused and s.tcp_ms is None and s.http_ms is not None for s in warm)
+    assert recovered.up and recovered.conn_reused is False
+    assert len(connections) == 2
+    assert pool.hits == 2
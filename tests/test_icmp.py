@@ -0,0 +1,32 @@
+import asyncio
+import socket
+
+import pytest
+
+from gping_next.probes import ProbeRunner
+from gping_next.schemas import TargetSpec
+
+
+def _ping_sockets_allowed() -> bool:
+    try:
+        socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP).close()
+        return True
+    except OSError:
+        return False
+
+
+@pytest.mark.skipif(not _ping_sockets_allowed(), reason="ping_group_range excludes this user")
+def test_icmp_targets_share_one_socket_per_cycle():
+    targets = [TargetSpec(name=f"lo{i}", host=f"127.0.0.{i}", kind="icmp", timeout=1.0) for i in range(1, 6)]
+    runner = ProbeRunner()
+    results = asyncio.run(runner.probe_all(targets))
+    assert all(r.up and r.code == "success" for r in results)
+    assert all(r.icmp_ms is not None for r in results)
+    pinger = runner.services.icmp
+    assert pinger.batches == 1
+    assert pinger.sent == 5 and pinger.received == 5
+
+
+def test_kind_keeps_target_spec_positional_order():
+    spec = TargetSpec("gw", "10.0.0.1", 443)
+    assert (spec.port, spec.kind) == (443, "tcp")
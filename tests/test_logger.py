@@ -27,3 +27,53 @@ def test_delta_logger_emits_on_change(tmp_path, monkeypatch):
     csv_path = next(tmp_path.glob("GPing*.csv"))
     lines = csv_path.read_text().strip().splitlines()
     assert len(lines) == 3  # header + 2 entries (initial + heartbeat)
+
+
+def test_latency_jitter_inside_the_bands_is_not_a_delta(tmp_path, monkeypatch):
+    import json
+
+    from gping_next.config import DeltaBands
+
+    monkeypatch.setattr("gping_next.logger.LOG_DIR", tmp_path)
+    logger = DeltaLogger("TEST", timedelta(minutes=15), DeltaBands(abs_ms=5.0, rel=0.25, buckets_ms=(50.0, 100.0)))
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    reasons = []
+    for minute, tcp in enumerate([20.0, 21.3, 19.2, 23.9, 31.0, 30.2, 47.0, 52.5, 52.9, None]):
+        status = TargetStatus(name="gw", up=True, code="success", tcp_ms=tcp)
+        payload = HealthPayload(ts=start + timedelta(minutes=minute), store="TEST", targets=[status])
+        reasons.append(logger.should_emit(payload.targets, payload.ts))
+        logger.record(payload)
+
+    assert reasons == [
+        "first",
+        None,
+        None,
+        None,
+        "gw: tcp_ms 20.0 -> 31.0 ms",
+        None,
+        "gw: tcp_ms 31.0 -> 47.0 ms",
+        "gw: tcp_ms 47.0 -> 52.5 ms (bucket)",
+        None,
+        "gw: tcp_ms missing",
+    ]
+    json_path = next(tmp_path.glob("GPing*.jsonl"))
+    assert [json.loads(line)["reason"] for line in json_path.read_text().splitlines()] == [r for r in reasons if r]
+
+
+def test_ewma_baseline_absorbs_slow_drift_but_flags_spikes(tmp_path, monkeypatch):
+    from gping_next.config import DeltaBands
+
+    monkeypatch.setattr("gping_next.logger.LOG_DIR", tmp_path)
+    logger = DeltaLogger("TEST", timedelta(hours=1), DeltaBands(abs_ms=5.0, rel=0.25, buckets_ms=(), ewma_alpha=0.5))
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    fired = []
+    # Drifts from 20 to 40 ms in 2 ms steps, then spikes to 80 ms.
+    for minute, tcp in enumerate([20.0 + 2 * i for i in range(11)] + [80.0]):
+        payload = HealthPayload(
+            ts=start + timedelta(minutes=minute),
+            store="TEST",
+            targets=[TargetStatus(name="gw", up=True, code="success", tcp_ms=tcp)],
+        )
+        fired.append(logger.should_emit(payload.targets, payload.ts) is not None)
+        logger.record(payload)
+    assert fired == [True] + [False] * 10 + [True]
@@ -0,0 +1,34 @@
+import asyncio
+
+from gping_next.neighbors import NeighborTable, parse_arp_output
+
+PROC_ARP = """IP address       HW type     Flags       HW address            Mask     Device
+192.168.1.10     0x1         0x2         00:11:22:33:44:55     *        eth0
+192.168.1.20     0x1         0x0         00:00:00:00:00:00     *        eth0
+"""
+
+
+def test_neighbor_table_matches_exact_ip_and_reads_once(tmp_path):
+    arp_file = tmp_path / "arp"
+    arp_file.write_text(PROC_ARP)
+    table = NeighborTable(proc_path=arp_file)
+
+    async def scenario() -> None:
+        assert await table.has_entry("192.168.1.10") is True
+        assert await table.has_entry("192.168.1.1") is False
+        assert await table.has_entry("192.168.1.20") is False
+        assert table.reads == 1
+        assert table.last_read_ms is not None
+        table.invalidate()
+        await table.lookup("192.168.1.10")
+        assert table.reads == 2
+
+    asyncio.run(scenario())
+
+
+def test_arp_command_output_parsing():
+    windows = "  192.168.1.1           00-11-22-33-44-55     dynamic\n"
+    posix = "? (10.0.0.1) at aa:bb:cc:dd:ee:ff [ether] on eth0\n? (10.0.0.2) at <incomplete> on eth0\n"
+    assert parse_arp_output(windows)["192.168.1.1"].mac == "00:11:22:33:44:55"
+    index = parse_arp_output(posix)
+    assert set(index) == {"10.0.0.1"}
@@ -0,0 +1,28 @@
+import asyncio
+
+import pytest
+
+from gping_next.pathprobe import Hop, PathProber
+
+
+@pytest.mark.skipif(not PathProber.supported(), reason="IP_RECVERR is Linux-only")
+def test_loopback_path_is_reached_at_first_hop():
+    prober = PathProber(max_hops=3, timeout=0.5)
+    asyncio.run(prober.refresh("lo", "127.0.0.1"))
+    assert prober.baseline("lo") == ["127.0.0.1"]
+
+
+def test_localize_stops_at_first_diverging_hop(monkeypatch):
+    prober = PathProber(window=2)
+    prober._baselines["isp"] = ["192.168.1.1", "10.0.0.1", "10.0.0.2", None, "8.8.8.8"]
+    live = {1: "192.168.1.1", 2: "10.0.0.1", 3: None}
+    asked = []
+
+    async def fake_probe_hops(dest, ttls, timeout):
+        asked.extend(ttls)
+        return {ttl: Hop(ttl=ttl, addr=live.get(ttl)) for ttl in ttls}
+
+    monkeypatch.setattr("gping_next.pathprobe.probe_hops", fake_probe_hops)
+    note = asyncio.run(prober.localize("isp", "8.8.8.8"))
+    assert note == "hop3:10.0.0.2>* after=10.0.0.1"
+    assert asked == [1, 2, 3, 4]
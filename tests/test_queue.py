@@ -1,4 +1,5 @@
 from gping_next.telemetry import QueueStorage
+from rdsiq_core.queue_log import QueueLog
 
 
 def test_queue_dedupes(tmp_path):
@@ -7,3 +8,134 @@ def test_queue_dedupes(tmp_path):
     storage._save_sync("health", {"x": 1}, "id-123")
     items = storage._load_sync()
     assert len(items) == 1
+
+
+def test_queue_survives_reopen_and_only_replays_unacked(tmp_path):
+    storage = QueueStorage(tmp_path)
+    for i in range(4):
+        storage._save_sync("health", {"n": i}, f"id-{i}")
+    storage._ack_sync(["id-0", "id-2"])
+    storage.log.close()
+
+    reopened = QueueStorage(tmp_path)
+    assert [item["id"] for item in reopened._load_sync()] == ["id-1", "id-3"]
+    reopened._save_sync("health", {"n": 4}, "id-4")
+    assert reopened.log.next_seq == 6
+
+
+def test_torn_tail_is_truncated_on_open(tmp_path):
+    log = QueueLog(tmp_path)
+    log.append({"id": "a"})
+    log.append({"id": "b"})
+    log.close()
+    segment = next(tmp_path.glob("segment-*.log"))
+    segment.write_bytes(segment.read_bytes()[:-3])
+
+    recovered = QueueLog(tmp_path)
+    assert [record["id"] for _, record in recovered.replay()] == ["a"]
+    assert recovered.append({"id": "c"}) == 2
+    assert [record["id"] for _, record in recovered.replay()] == ["a", "c"]
+
+
+def test_acked_segments_are_compacted(tmp_path):
+    log = QueueLog(tmp_path, segment_bytes=64, fsync="never")
+    seqs = [log.append({"id": f"r{i}", "pad": "x" * 40}) for i in range(6)]
+    assert len(list(tmp_path.glob("segment-*.log"))) == 6
+    log.ack(seqs[:4])
+    assert len(list(tmp_path.glob("segment-*.log"))) == 2
+    log.ack(seqs[4:])
+    assert not list(tmp_path.glob("segment-*.log"))
+    assert log.append({"id": "next"}) == 7
+    assert [record["id"] for _, record in log.replay()] == ["next"]
+
+
+def test_legacy_queue_files_are_imported(tmp_path):
+    (tmp_path / "queued-health-1.json").write_text(
+        '{"payload_type": "health", "payload": {"x": 1}, "id": "health-1"}'
+    )
+    storage = QueueStorage(tmp_path)
+    assert [item["id"] for item in storage._load_sync()] == ["health-1"]
+    assert not list(tmp_path.glob("queued-*.json"))
+
+
+def _health(minute, up=True):
+    return {
+        "ts": f"2024-01-01T12:{minute:02d}:00",
+        "store": "S",
+        "targets": [{"name": "gateway", "up": up, "code": "success" if up else "tcp_timeout", "tcp_ms": minute}],
+    }
+
+
+def test_compaction_keeps_transitions_and_newest_inventory_and_squashes_heartbeats(tmp_path):
+    storage = QueueStorage(tmp_path, fsync="never", consumers=["local", "apps_script"], max_records=11)
+    ups = [True] * 4 + [False] * 3 + [True] * 3
+    for minute, up in enumerate(ups):
+        storage._save_sync("health", _health(minute, up), f"health-{minute}")
+        if minute == 2:
+            storage._save_sync("inventory", {"ts": "2024-01-01T12:02:00", "bios": "old"}, "inventory-old")
+    storage._ack_sync(["health-0"], consumer="local")
+    storage._save_sync("inventory", {"ts": "2024-01-01T12:10:00", "bios": "new"}, "inventory-new")
+
+    assert storage.compactions == 1
+    backlog = storage._pending_sync()
+    order = [(r["payload_type"], r["id"]) for r in backlog["apps_script"]]
+    assert order == [
+        ("health", "health-0"),
+        ("health", "health-4"),
+        ("health", "health-7"),
+        ("inventory", "inventory-new"),
+        ("health_summary", "summary-health-1"),
+        ("health_summary", "summary-health-5"),
+        ("health_summary", "summary-health-8"),
+    ]
+    summary = backlog["apps_script"][4]["payload"]
+    assert (summary["first_ts"], summary["last_ts"], summary["count"]) == (
+        "2024-01-01T12:01:00",
+        "2024-01-01T12:03:00",
+        3,
+    )
+    # Acknowledgements made before compaction still hold per sink.
+    assert "health-0" not in [r["id"] for r in backlog["local"]]
+    reopened = QueueStorage(tmp_path, fsync="never", consumers=["local", "apps_script"], max_records=11)
+    assert len(reopened) == 7
+
+
+def test_queue_stays_within_byte_limit_during_long_outage(tmp_path):
+    storage = QueueStorage(tmp_path, fsync="never", max_records=100, max_bytes=4096)
+    for minute in range(500):
+        storage._save_sync("health", _health(minute % 60, up=minute % 7 != 0), f"health-{minute}")
+        assert storage.log.size_bytes <= 4096 + 512
+    records = storage._load_sync()
+    assert storage.compactions > 0 and len(records) <= 100
+    # Each compaction frees 10% of the budget instead of re-running on every append.
+    assert storage.compactions < 500 // 3
+
+
+def test_compaction_reads_delta_frames_through_the_decoded_state():
+    from rdsiq_core.queue_policy import QueueEntry, compact_entries
+
+    up = {"name": "gateway", "up": True, "code": "success"}
+    down = {"name": "gateway", "up": False, "code": "tcp_timeout"}
+    printer = {"name": "printer", "up": True, "code": "success"}
+
+    def frame(seq, kind, targets, removed=()):
+        payload = {"ts": f"2024-01-01T12:{seq:02d}:00", "store": "S", "seq": seq, "kind": kind, "targets": targets}
+        if kind == "delta":
+            payload["removed"] = list(removed)
+        return QueueEntry({"payload_type": "health", "payload": payload, "id": f"health-{seq}"}, {"apps_script"})
+
+    entries = [
+        frame(1, "key", [up, printer]),
+        frame(2, "delta", []),
+        frame(3, "delta", []),
+        frame(4, "key", [up, printer]),  # same state as the deltas before it: a heartbeat
+        frame(5, "delta", [down]),
+        frame(6, "delta", []),
+        frame(7, "delta", [], removed=["printer"]),
+    ]
+    kept = compact_entries(entries, max_records=100, max_bytes=1 << 20)
+    assert [e.record["id"] for e in kept] == ["health-1", "health-5", "health-7", "summary-health-2", "summary-health-6"]
+    summary = kept[3].record["payload"]
+    assert summary["targets"] == [up, printer] and summary["count"] == 3
+    assert (summary["first_seq"], summary["last_seq"]) == (2, 4)
+    assert kept[4].record["payload"]["targets"] == [down, printer]
@@ -0,0 +1,185 @@
+import asyncio
+import gzip
+import json
+
+from rdsiq_core.relay import Relay
+from rdsiq_core.telemetry import AppsScriptSink
+
+
+def _upstream_server(received, connections, watch_gets):
+    async def handle(reader, writer):
+        connections.append(writer)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                path = head.split(b" ")[1].decode()
+                length = 0
+                for line in head.decode().split("\r\n"):
+                    if line.lower().startswith("content-length:"):
+                        length = int(line.split(":", 1)[1])
+                body = await reader.readexactly(length) if length else b""
+                if path == "/ingest/batch":
+                    lines = [json.loads(line) for line in gzip.decompress(body).splitlines()]
+                    received.append(lines)
+                    reply = json.dumps({"acked": [line["id"] for line in lines]}).encode()
+                elif path.startswith("/watchlist"):
+                    watch_gets.append(path)
+                    reply = b'{"stores": {"S1": {"until": "2099-01-01"}, "S2": {"until": "2099-01-02"}}}'
+                else:
+                    reply = b'{"refresh": false}'
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s" % (len(reply), reply))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+    return handle
+
+
+def test_relay_dedupes_buffers_and_forwards_in_batches(tmp_path):
+    received, connections, watch_gets = [], [], []
+
+    async def scenario():
+        server = await asyncio.start_server(_upstream_server(received, connections, watch_gets), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        upstream = AppsScriptSink(f"http://127.0.0.1:{port}", "up-key")
+        relay = Relay(upstream, tmp_path / "relay", "site-key", host="127.0.0.1", port=0, flush_interval=30)
+        async with server:
+            await relay.start()
+            agents = [AppsScriptSink(f"http://127.0.0.1:{relay.port}", "site-key") for _ in range(20)]
+            sends = [
+                agent.send("health", {"store": f"S{i}", "n": n}, f"health-S{i}-{n}")
+                for i, agent in enumerate(agents)
+                for n in range(3)
+            ]
+            # Every agent retries its first upload: the relay must store it once.
+            sends += [
+                agent.send("health", {"store": f"S{i}", "n": 0}, f"health-S{i}-0") for i, agent in enumerate(agents)
+            ]
+            results = await asyncio.gather(*sends)
+            bad_key = await AppsScriptSink(f"http://127.0.0.1:{relay.port}", "wrong").send("health", {}, "x")
+            watch = [await agent.fetch_watchlist("S2") for agent in agents[:5]]
+            pending_before = relay.pending
+            forwarded = await relay.flush()
+            stats = dict(relay.stats)
+            for agent in agents:
+                await agent.close()
+            await relay.close()
+        return results, bad_key, watch, pending_before, forwarded, stats
+
+    results, bad_key, watch, pending_before, forwarded, stats = asyncio.run(scenario())
+    assert all(results) and bad_key is False
+    assert pending_before == forwarded == 60
+    assert stats["duplicates"] == 20
+    # 60 uploads reach Apps Script as one batch over one upstream connection.
+    assert len(received) == 1 and len(received[0]) == 60 and len(connections) == 1
+    assert {line["type"] for line in received[0]} == {"health"}
+    assert watch == [{"S2": {"until": "2099-01-02"}}] * 5 and watch_gets == ["/watchlist"]
+
+
+def test_relay_buffer_survives_restart_until_upstream_acks(tmp_path):
+    async def offline():
+        upstream = AppsScriptSink("http://127.0.0.1:9", "up-key")
+        relay = Relay(upstream, tmp_path / "relay", "k", host="127.0.0.1", port=0, flush_interval=30)
+        await relay.start()
+        agent = AppsScriptSink(f"http://127.0.0.1:{relay.port}", "k")
+        ok = await agent.send_batch(
+            [{"id": f"health-S-{n}", "payload_type": "health", "payload": {"n": n}} for n in range(5)]
+        )
+        forwarded = await relay.flush()
+        await agent.close()
+        await relay.close()
+        return ok, forwarded
+
+    ok, forwarded = asyncio.run(offline())
+    assert len(ok) == 5 and forwarded == 0
+
+    received, connections, watch_gets = [], [], []
+
+    async def online():
+        server = await asyncio.start_server(_upstream_server(received, connections, watch_gets), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        relay = Relay(AppsScriptSink(f"http://127.0.0.1:{port}", "up-key"), tmp_path / "relay", "k", port=0)
+        async with server:
+            pending = relay.pending
+            forwarded = await relay.flush()
+            await relay.close()
+        return pending, forwarded
+
+    assert asyncio.run(online()) == (5, 5)
+    assert [line["id"] for line in received[0]] == [f"health-S-{n}" for n in range(5)]
+
+
+def test_relay_coalesces_trigger_polls_and_answers_502_on_upstream_errors(tmp_path):
+    polls = []
+
+    async def upstream(reader, writer):
+        head = await reader.readuntil(b"\r\n\r\n")
+        path = head.split(b" ")[1].decode()
+        polls.append(path)
+        if path.startswith("/trigger/S1"):
+            await asyncio.sleep(0.2)  # hold the long poll until every agent is waiting
+            reply = b'{"refresh": true}'
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s" % (len(reply), reply))
+        else:
+            writer.write(b"garbage\r\n\r\n")
+        await writer.drain()
+        writer.close()
+
+    async def scenario():
+        server = await asyncio.start_server(upstream, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        relay = Relay(AppsScriptSink(f"http://127.0.0.1:{port}", "up-key"), tmp_path / "relay", "k", port=0)
+        async with server:
+            await relay.start()
+            agents = [AppsScriptSink(f"http://127.0.0.1:{relay.port}", "k") for _ in range(5)]
+            urls = [f"/trigger/S1?wait=1&since=v{n}" for n in range(5)]
+            responses = await asyncio.gather(
+                *(
+                    agent.http.request("GET", agent.base_url + url, headers={"X-RDS-Key": "k"})
+                    for agent, url in zip(agents, urls)
+                )
+            )
+            bad = await agents[0].http.request("GET", agents[0].base_url + "/trigger/S2", headers={"X-RDS-Key": "k"})
+            stats = dict(relay.stats)
+            for agent in agents:
+                await agent.close()
+            await relay.close()
+        return responses, bad, stats
+
+    responses, bad, stats = asyncio.run(scenario())
+    assert [(r.status, json.loads(r.body)) for r in responses] == [(200, {"refresh": True})] * 5
+    assert stats["coalesced"] == 4
+    assert polls[0] == "/trigger/S1?wait=1" and polls.count("/trigger/S1?wait=1") == 1
+    assert bad.status == 502
+
+
+def test_relay_answers_400_on_malformed_batches_and_bounds_its_buffer(tmp_path):
+    def heartbeat(n):
+        payload = {"ts": f"2024-01-01T12:{n % 60:02d}:00", "store": "S", "targets": [{"name": "gw", "up": True}]}
+        return {"id": f"health-S-{n}", "type": "health", "payload": payload}
+
+    async def scenario():
+        relay = Relay(
+            AppsScriptSink("http://127.0.0.1:9", "up-key"), tmp_path / "relay", "k", port=0, max_records=20
+        )
+        await relay.start()
+        agent = AppsScriptSink(f"http://127.0.0.1:{relay.port}", "k")
+        url = f"{agent.base_url}/ingest/batch"
+        headers = {"X-RDS-Key": "k", "Content-Encoding": "gzip"}
+        bad = []
+        for body in (b"[1, 2]\n", b'"just a string"\n', b"{not json\n"):
+            bad.append((await agent.http.request("POST", url, body=gzip.compress(body), headers=headers)).status)
+        bad.append((await agent.http.request("POST", url, body=b"not gzip", headers=headers)).status)
+        for start in range(0, 100, 10):
+            body = b"\n".join(json.dumps(heartbeat(n)).encode() for n in range(start, start + 10))
+            ok = await agent.http.request("POST", url, body=gzip.compress(body), headers=headers)
+            assert ok.status == 200
+        pending, stats = relay.pending, dict(relay.stats)
+        await agent.close()
+        await relay.close()
+        return bad, pending, stats
+
+    bad, pending, stats = asyncio.run(scenario())
+    assert bad == [400] * 4
+    # 100 identical heartbeats against a 20-record cap: squashed, not buffered without limit.
+    assert stats["compactions"] > 0 and pending <= 20
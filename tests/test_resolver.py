@@ -0,0 +1,93 @@
+import asyncio
+import socket
+import struct
+
+from gping_next.probes import ProbeServices, probe_target
+from gping_next.resolver import DnsCache, DnsError
+from gping_next.schemas import TargetSpec
+
+
+class StubDns(asyncio.DatagramProtocol):
+    """Answers ``*.store.test`` with 127.0.0.1 (TTL 300) and NXDOMAIN otherwise."""
+
+    def __init__(self):
+        self.queries = []
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        query_id = struct.unpack_from("!H", data)[0]
+        question = data[12:]
+        labels, offset = [], 0
+        while question[offset]:
+            length = question[offset]
+            labels.append(question[offset + 1 : offset + 1 + length].decode())
+            offset += length + 1
+        name = ".".join(labels)
+        self.queries.append(name)
+        question = question[: offset + 5]
+        if name.endswith("store.test"):
+            answer = b"\xc0\x0c" + struct.pack("!HHIH", 1, 1, 300, 4) + socket.inet_aton("127.0.0.1")
+            header = struct.pack("!HHHHHH", query_id, 0x8180, 1, 1, 0, 0)
+        else:
+            answer = b""
+            header = struct.pack("!HHHHHH", query_id, 0x8183, 1, 0, 0, 0)
+        self.transport.sendto(header + question + answer, addr)
+
+
+def test_probes_resolve_once_per_ttl_and_report_dns_fail():
+    async def handle(reader, writer):
+        writer.close()
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        transport, stub = await loop.create_datagram_endpoint(StubDns, local_addr=("127.0.0.1", 0))
+        dns_port = transport.get_extra_info("sockname")[1]
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        services = ProbeServices(dns=DnsCache(nameservers=[("127.0.0.1", dns_port)]))
+        target = TargetSpec(name="pos", host="pos1.store.test", port=port, use_tls=False)
+        missing = TargetSpec(name="gone", host="gone.example.test", port=port, use_tls=False)
+        async with server:
+            first = await asyncio.gather(probe_target(target, services), probe_target(target, services))
+            again = await probe_target(target, services)
+            failed = await probe_target(missing, services)
+        transport.close()
+        return stub.queries, first, again, failed, services.dns.stats
+
+    queries, first, again, failed, stats = asyncio.run(scenario())
+    assert queries == ["pos1.store.test", "gone.example.test"]
+    assert all(s.up for s in first) and again.up
+    assert first[0].dns_ms is not None and again.dns_ms is None
+    assert failed.code == "dns_fail" and failed.note == "NXDOMAIN"
+    assert stats.hits == 1
+
+
+def test_direct_query_failures_fall_back_to_getaddrinfo_for_any_family():
+    families = []
+
+    async def fake_getaddrinfo(host, port, family=0, type=0):
+        families.append((host, family))
+        if host == "printer.example.test":
+            return [(socket.AF_INET6, socket.SOCK_STREAM, 6, "", ("fd00::7", 0, 0, 0))]
+        raise socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        loop.getaddrinfo = fake_getaddrinfo
+        transport, _ = await loop.create_datagram_endpoint(StubDns, local_addr=("127.0.0.1", 0))
+        dns = DnsCache(nameservers=[("127.0.0.1", transport.get_extra_info("sockname")[1])])
+        found = await dns.resolve("printer.example.test")
+        try:
+            await dns.resolve("gone.example.test")
+        except DnsError as exc:
+            missing = str(exc)
+        transport.close()
+        return found, missing
+
+    found, missing = asyncio.run(scenario())
+    assert found.addresses == ["fd00::7"]
+    # The direct answer's reason is kept when the system cannot resolve the name either.
+    assert missing == "NXDOMAIN"
+    assert families == [("printer.example.test", socket.AF_UNSPEC), ("gone.example.test", socket.AF_UNSPEC)]
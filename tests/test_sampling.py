@@ -0,0 +1,40 @@
+import asyncio
+
+from gping_next.probes import probe_target
+from gping_next.sampling import SampleBuffer
+from gping_next.schemas import TargetSpec
+
+
+def test_sample_buffer_summary():
+    buffer = SampleBuffer(5)
+    for value in (10.0, None, 12.0, 11.0, 30.0, 99.0):
+        buffer.add(value)
+    stats = buffer.summarize()
+    assert len(buffer) == 5
+    assert stats.sent == 5 and stats.lost == 1
+    assert stats.loss_pct == 20.0
+    assert stats.min_ms == 10.0
+    assert stats.p50_ms == 11.0
+    assert stats.p95_ms == 30.0
+    assert stats.jitter_ms == round((2 + 1 + 19) / 3, 2)
+
+
+def test_probe_collects_samples_within_budget():
+    async def handle(reader, writer):
+        writer.close()
+
+    async def scenario():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        target = TargetSpec(name="lan", host="127.0.0.1", port=port, use_tls=False, samples=4, sample_budget=0.2)
+        async with server:
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            status = await probe_target(target)
+            return status, loop.time() - started
+
+    status, elapsed = asyncio.run(scenario())
+    assert status.up and status.samples == 4
+    assert status.loss_pct == 0.0
+    assert status.rtt_min_ms <= status.rtt_p50_ms <= status.rtt_p95_ms
+    assert elapsed < 0.5
@@ -0,0 +1,183 @@
+import asyncio
+import random
+from datetime import datetime
+
+from gping_next.config import AgentConfig, TelemetryConfig
+from gping_next.core_runtime import GPingNextAgent
+from gping_next.scheduler import TargetScheduler
+from gping_next.schemas import TargetSpec, TargetStatus
+
+
+def test_scheduler_fires_only_due_targets():
+    gateway = TargetSpec(name="gateway", host="a", interval=30)
+    public = TargetSpec(name="public", host="b", interval=3600, jitter=10)
+    lan = TargetSpec(name="lan", host="c")
+    scheduler = TargetScheduler([gateway, public, lan], rng=random.Random(1))
+    assert [t.name for t in scheduler.due(0.0)] == ["gateway", "public", "lan"]
+    scheduler.reschedule([gateway, public, lan], 0.0, default_interval=900)
+    assert scheduler.next_delay(0.0) == 30
+    assert [t.name for t in scheduler.due(31.0)] == ["gateway"]
+    scheduler.reschedule([gateway], 31.0, default_interval=900)
+    scheduler.clamp(300, 31.0)  # watch mode pulls in cadence-driven targets only
+    assert [t.name for t in scheduler.due(331.0)] == ["gateway", "lan"]
+    assert scheduler.due(3600.0) == []
+    assert [t.name for t in scheduler.due(3611.0)] == ["public"]
+
+
+def test_agent_merges_partial_rounds_into_rolling_snapshot(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("gping_next.logger.LOG_DIR", tmp_path)
+    targets = [TargetSpec(name="gateway", host="a", interval=30), TargetSpec(name="public", host="b")]
+    agent = GPingNextAgent(AgentConfig(store_id="S", targets=targets, telemetry=TelemetryConfig(sinks=[])))
+    rounds = []
+
+    async def fake_probe_all(batch, known=None):
+        rounds.append([t.name for t in batch])
+        return [TargetStatus(name=t.name, up=True, code="success") for t in batch]
+
+    sent = []
+
+    async def fake_send(payload):
+        sent.append([t["name"] for t in payload["targets"]])
+
+    agent.prober.probe_all = fake_probe_all  # type: ignore[assignment]
+    agent.telemetry.send_health = fake_send  # type: ignore[assignment]
+
+    async def scenario():
+        await agent._gather_and_send(datetime(2024, 1, 1), force_upload=True)
+        await agent._gather_and_send(datetime(2024, 1, 1, 0, 1), force_upload=True, targets=[targets[0]])
+
+    asyncio.run(scenario())
+    assert rounds == [["gateway", "public"], ["gateway"]]
+    assert sent[-1] == ["gateway", "public"]
+
+
+def test_trigger_long_poll_survives_errors_and_keeps_refreshing(tmp_path, monkeypatch):
+    from datetime import timedelta
+
+    from gping_next.config import AppScriptConfig, Cadence
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("gping_next.logger.LOG_DIR", tmp_path)
+    config = AgentConfig(
+        store_id="S",
+        targets=[TargetSpec(name="gateway", host="a")],
+        cadence=Cadence(refresh_poll=timedelta(seconds=0.01)),
+        telemetry=TelemetryConfig(sinks=["apps_script"], app_script=AppScriptConfig(long_poll=1.0)),
+    )
+    agent = GPingNextAgent(config)
+    sink = agent._apps_sink()
+    answers = iter([RuntimeError("poll broke"), True, True, False])
+    refreshes = []
+
+    async def fake_check(store):
+        answer = next(answers, False)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    async def fake_gather(now, force_upload=False, targets=None):
+        refreshes.append(force_upload)
+        if len(refreshes) == 1:
+            raise OSError("probe cycle failed")
+
+    sink.check_trigger = fake_check  # type: ignore[assignment]
+    agent._gather_and_send = fake_gather  # type: ignore[assignment]
+    agent._send_inventory_once = lambda: asyncio.sleep(0)  # type: ignore[assignment]
+
+    async def scenario():
+        await agent.on_startup()
+        await asyncio.sleep(0.2)
+        alive = agent._long_polling()
+        agent._long_poll_task.cancel()
+        await asyncio.gather(agent._long_poll_task, return_exceptions=True)
+        return alive, agent._long_polling()
+
+    alive, after_cancel = asyncio.run(scenario())
+    # The failed poll and the failed refresh were logged; the second refresh still ran.
+    assert refreshes == [True, True] and alive
+    assert not after_cancel
+
+
+def test_quiet_cycles_build_no_health_record(tmp_path, monkeypatch):
+    from gping_next import core_runtime
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("gping_next.logger.LOG_DIR", tmp_path)
+    built = []
+
+    class CountingRecord(core_runtime.HealthRecord):
+        __slots__ = ()
+
+        def __init__(self, payload):
+            built.append(payload.ts)
+            super().__init__(payload)
+
+    monkeypatch.setattr(core_runtime, "HealthRecord", CountingRecord)
+    targets = [TargetSpec(name="gateway", host="a")]
+    agent = GPingNextAgent(AgentConfig(store_id="S", targets=targets, telemetry=TelemetryConfig(sinks=[])))
+    sent = []
+
+    async def fake_probe_all(batch, known=None):
+        return [TargetStatus(name=t.name, up=True, code="success") for t in batch]
+
+    async def fake_send(record):
+        sent.append(record)
+
+    agent.prober.probe_all = fake_probe_all  # type: ignore[assignment]
+    agent.telemetry.send_health = fake_send  # type: ignore[assignment]
+
+    async def scenario():
+        for minute in range(3):
+            await agent._gather_and_send(datetime(2024, 1, 1, 0, minute))
+
+    asyncio.run(scenario())
+    # Only the first cycle is a delta; the unchanged ones are neither logged nor serialized.
+    assert built == [datetime(2024, 1, 1)] and len(sent) == 1 and isinstance(sent[0], CountingRecord)
+    assert len(next(tmp_path.glob("GPing*.jsonl")).read_text().splitlines()) == 1
+
+
+def test_trigger_long_poll_is_capped_at_the_server_hold_and_never_backs_off(tmp_path, monkeypatch):
+    from urllib.parse import parse_qs, urlsplit
+
+    from gping_next.config import AppScriptConfig
+
+    # The real hold is 25 s; scale it down so the test runs a few full holds.
+    monkeypatch.setattr("rdsiq_core.telemetry.LONG_POLL_MAX_WAIT", 0.1)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("gping_next.logger.LOG_DIR", tmp_path)
+    waits = []
+
+    async def handle(reader, writer):
+        head = await reader.readuntil(b"\r\n\r\n")
+        wait = float(parse_qs(urlsplit(head.split(b" ")[1].decode()).query)["wait"][0])
+        waits.append(wait)
+        await asyncio.sleep(wait)  # held to the end, then a clean "no refresh"
+        reply = b'{"refresh": false}'
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s" % (len(reply), reply))
+        await writer.drain()
+        writer.close()
+
+    async def scenario():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        app = AppScriptConfig(base_url=f"http://127.0.0.1:{port}", api_key="k", long_poll=60.0)
+        config = AgentConfig(
+            store_id="S",
+            targets=[TargetSpec(name="gateway", host="a")],
+            telemetry=TelemetryConfig(sinks=["apps_script"], app_script=app),
+        )
+        agent = GPingNextAgent(config)
+        agent._send_inventory_once = lambda: asyncio.sleep(0)  # type: ignore[assignment]
+        async with server:
+            await agent.on_startup()
+            await asyncio.sleep(0.55)
+            alive = agent._long_polling()
+            agent._long_poll_task.cancel()
+            await asyncio.gather(agent._long_poll_task, return_exceptions=True)
+            await agent._apps_sink().close()
+        return alive
+
+    assert asyncio.run(scenario())
+    # Polls follow each other back to back: no 45 s backoff after a full hold.
+    assert len(waits) >= 4 and set(waits) == {0.1}
@@ -0,0 +1,35 @@
+import asyncio
+import struct
+
+import pytest
+
+from gping_next.probes import probe_target
+from gping_next.schemas import TargetSpec
+from gping_next.tcp_info import TCP_INFO, parse_tcp_info
+
+
+def test_parse_tcp_info_layout():
+    raw = bytearray(104)
+    raw[2] = 1
+    struct.pack_into("=II", raw, 68, 1500, 750)
+    struct.pack_into("=I", raw, 100, 3)
+    info = parse_tcp_info(bytes(raw))
+    assert (info.rtt_ms, info.rttvar_ms, info.retransmits, info.total_retrans) == (1.5, 0.75, 1, 3)
+    assert parse_tcp_info(b"short") is None
+
+
+@pytest.mark.skipif(TCP_INFO is None, reason="TCP_INFO is Linux-only")
+def test_probe_records_kernel_rtt():
+    async def handle(reader, writer):
+        writer.close()
+
+    async def scenario():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            return await probe_target(TargetSpec(name="lo", host="127.0.0.1", port=port, use_tls=False))
+
+    status = asyncio.run(scenario())
+    assert status.up
+    assert status.handshake_rtt_ms is not None and status.kernel_rtt_ms is not None
+    assert status.kernel_retrans == 0
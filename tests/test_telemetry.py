@@ -1,5 +1,7 @@
 import asyncio
-from datetime import datetime
+import gzip
+import json
+from datetime import datetime, timedelta
 
 from gping_next.config import TelemetryConfig
 from gping_next.schemas import HealthPayload, TargetStatus
@@ -25,8 +27,7 @@ def test_offline_queue_flushes_when_connection_returns(tmp_path, monkeypatch):
             targets=[TargetStatus(name="gateway", up=False, code="tcp_timeout")],
         )
         await manager.send_health(payload1)
-        queued = list(tmp_path.glob("queued-*.json"))
-        assert len(queued) == 1
+        assert len(manager._queue) == 1
 
         payload2 = HealthPayload(
             ts=datetime(2024, 1, 1, 12, 5, 0),
@@ -35,7 +36,9 @@ def test_offline_queue_flushes_when_connection_returns(tmp_path, monkeypatch):
         )
         await manager.send_health(payload2)
 
-        assert not list(tmp_path.glob("queued-*.json"))
+        assert len(manager._queue) == 0
+        assert not manager._queue._load_sync()
+        await manager.close()
         sent_file = tmp_path / "sent" / "health.jsonl"
         assert sent_file.exists()
         contents = sent_file.read_text().strip().splitlines()
@@ -43,3 +46,439 @@ def test_offline_queue_flushes_when_connection_returns(tmp_path, monkeypatch):
         assert len(contents) == 2
 
     asyncio.run(scenario())
+
+
+def test_backlog_replays_in_batches_and_requeues_only_unacked(tmp_path):
+    from rdsiq_core.config import AppScriptConfig
+    from rdsiq_core.telemetry import TelemetryManager as CoreTelemetryManager
+
+    requests = []
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                path = head.split(b" ")[1].decode()
+                length = int(head.lower().split(b"content-length:")[1].split(b"\r\n")[0])
+                body = gzip.decompress(await reader.readexactly(length))
+                requests.append(path)
+                if path == "/ingest/batch":
+                    ids = [json.loads(line)["id"] for line in body.splitlines()]
+                    reply = json.dumps({"acked": [i for i in ids if i != "health-3"]}).encode()
+                else:
+                    reply = b"ok"
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s" % (len(reply), reply))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+    async def scenario():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        config = TelemetryConfig(
+            sinks=["apps_script"],
+            app_script=AppScriptConfig(base_url=f"http://127.0.0.1:{port}"),
+            batch_max_records=2,
+        )
+        manager = CoreTelemetryManager(config, queue_dir=tmp_path)
+        for i in range(5):
+            manager._queue._save_sync("health", {"store": "STORE", "n": i}, f"health-{i}")
+        async with server:
+            await manager.send_payload("health", {"store": "STORE"}, datetime(2024, 1, 1), "STORE")
+        return [entry["id"] for entry in manager._queue._load_sync()]
+
+    remaining = asyncio.run(scenario())
+    # Five queued records plus the new payload go out as three batches of two.
+    assert requests == ["/ingest/batch"] * 3
+    assert remaining == ["health-3"]
+
+
+def test_batch_timeout_mid_backlog_keeps_the_chunks_that_landed(tmp_path):
+    from rdsiq_core.config import AppScriptConfig
+    from rdsiq_core.telemetry import TelemetryManager as CoreTelemetryManager
+
+    posted = []
+    stall = {"after": 2}
+    release = asyncio.Event()
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = int(head.lower().split(b"content-length:")[1].split(b"\r\n")[0])
+                body = gzip.decompress(await reader.readexactly(length))
+                ids = [json.loads(line)["id"] for line in body.splitlines()]
+                posted.append(ids)
+                if len(posted) > stall["after"]:
+                    await release.wait()
+                reply = json.dumps({"acked": ids}).encode()
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s" % (len(reply), reply))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+    async def scenario():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        config = TelemetryConfig(
+            sinks=["apps_script"],
+            app_script=AppScriptConfig(base_url=f"http://127.0.0.1:{port}"),
+            batch_max_records=2,
+            batch_max_chunks=3,
+            sink_timeout=0.2,
+        )
+        manager = CoreTelemetryManager(config, queue_dir=tmp_path)
+        for i in range(8):
+            manager._queue._save_sync("health", {"store": "S", "n": i}, f"health-{i}")
+        async with server:
+            await manager.send_payload("health", {"store": "S"}, datetime(2024, 1, 1), "S")
+            first = [entry["id"] for entry in manager._queue._load_sync()]
+            stall["after"] = 99
+            for i in range(8, 10):
+                manager._queue._save_sync("health", {"store": "S", "n": i}, f"health-{i}")
+            await manager.send_payload("health", {"store": "S"}, datetime(2024, 1, 2), "S")
+            second = [entry["id"] for entry in manager._queue._load_sync()]
+            release.set()
+            await asyncio.sleep(0.05)
+        state = manager.breakers["apps_script"].state
+        await manager.close()
+        return first, second, state
+
+    first, second, state = asyncio.run(scenario())
+    # The third chunk timed out: the two chunks before it stay acknowledged.
+    assert first == ["health-4", "health-5", "health-6", "health-7", "health-S-2024-01-01T00:00:00"]
+    assert [len(ids) for ids in posted] == [2, 2, 2, 2, 2, 2]
+    # The next cycle sends at most batch_max_chunks chunks; the rest waits.
+    assert second == ["health-9", "health-S-2024-01-02T00:00:00"]
+    assert state == "closed"
+
+
+def test_each_sink_tracks_its_own_backlog_and_hung_sinks_time_out(tmp_path, monkeypatch):
+    from rdsiq_core import telemetry as core_telemetry
+
+    class FlakySink(core_telemetry.TelemetrySink):
+        name = "flaky"
+        hang = True
+        received = []
+
+        async def send(self, payload_type, payload, idempotency):
+            if FlakySink.hang:
+                await asyncio.sleep(5)
+            FlakySink.received.append(idempotency)
+            return True
+
+    monkeypatch.setitem(core_telemetry.SINK_REGISTRY, "flaky", FlakySink)
+
+    async def scenario():
+        config = TelemetryConfig(sinks=["local", "flaky"], sink_timeout=0.1)
+        manager = core_telemetry.TelemetryManager(config, queue_dir=tmp_path)
+        for minute in range(2):
+            await manager.send_payload("health", {"n": minute}, datetime(2024, 1, 1, 12, minute), "S")
+        backlog = manager._queue._pending_sync()
+        FlakySink.hang = False
+        await manager.send_payload("health", {"n": 2}, datetime(2024, 1, 1, 12, 2), "S")
+        remaining = len(manager._queue)
+        await manager.close()
+        return backlog, remaining
+
+    backlog, remaining = asyncio.run(scenario())
+    assert set(backlog) == {"flaky"} and len(backlog["flaky"]) == 2
+    assert len(FlakySink.received) == 3 and remaining == 0
+    local_lines = (tmp_path / "sent" / "health.jsonl").read_text().splitlines()
+    assert len(local_lines) == 3
+
+
+def test_health_deltas_rebuild_full_state_and_shrink_stable_uploads(tmp_path):
+    from gping_next.telemetry import HealthDeltaDecoder, HealthDeltaEncoder, _serialize_health
+
+    encoder = HealthDeltaEncoder(keyframe_every=4, state_path=tmp_path / "seq.json")
+    decoder = HealthDeltaDecoder()
+    names = [f"t{i}" for i in range(20)]
+    frames, full_bytes, wire_bytes = [], 0, 0
+    for minute in range(8):
+        statuses = [
+            TargetStatus(name=n, up=not (n == "t3" and minute in (2, 3)), code="success", tcp_ms=12.5)
+            for n in names
+        ]
+        if minute == 6:
+            statuses = statuses[:-1]
+        payload = HealthPayload(ts=datetime(2024, 1, 1, 12, minute), store="S", targets=statuses)
+        frame = encoder.encode(payload)
+        frames.append(frame)
+        state = decoder.apply(json.loads(json.dumps(frame)))
+        expected = {t["name"]: (t["up"], t["code"]) for t in _serialize_health(payload)["targets"]}
+        assert {t["name"]: (t["up"], t["code"]) for t in state["targets"]} == expected
+        full_bytes += len(json.dumps(_serialize_health(payload)))
+        wire_bytes += len(json.dumps(frame))
+
+    assert [f["kind"] for f in frames] == ["key", "delta", "delta", "delta", "key", "delta", "delta", "delta"]
+    assert [f["seq"] for f in frames] == list(range(1, 9))
+    assert [t["name"] for t in frames[2]["targets"]] == ["t3"] and frames[6]["removed"] == ["t19"]
+    assert wire_bytes * 2 < full_bytes
+    assert HealthDeltaEncoder(state_path=tmp_path / "seq.json").seq == 8
+
+
+def test_latency_only_changes_ride_in_the_delta_frame():
+    from gping_next.telemetry import HealthDeltaDecoder, HealthDeltaEncoder
+
+    encoder, decoder = HealthDeltaEncoder(keyframe_every=12), HealthDeltaDecoder()
+    frames = []
+    for minute, tcp_ms in enumerate((10.0, 400.0, 400.0)):
+        statuses = [
+            TargetStatus(name="gw", up=True, code="success", tcp_ms=tcp_ms),
+            TargetStatus(name="pos", up=True, code="success", tcp_ms=3.0),
+        ]
+        frame = encoder.encode(HealthPayload(ts=datetime(2024, 1, 1, 12, minute), store="S", targets=statuses))
+        frames.append(frame)
+        state = decoder.apply(json.loads(json.dumps(frame)))
+
+    assert [f["kind"] for f in frames] == ["key", "delta", "delta"]
+    assert [(t["name"], t["tcp_ms"]) for t in frames[1]["targets"]] == [("gw", 400.0)]
+    assert frames[2]["targets"] == []
+    assert {t["name"]: t["tcp_ms"] for t in state["targets"]} == {"gw": 400.0, "pos": 3.0}
+
+
+def test_decoder_flags_gaps_until_the_next_keyframe():
+    from gping_next.telemetry import HealthDeltaDecoder
+
+    decoder = HealthDeltaDecoder()
+    target = {"name": "gateway", "up": True, "code": "success"}
+    decoder.apply({"store": "S", "seq": 1, "kind": "key", "targets": [target]})
+    assert decoder.apply({"store": "S", "seq": 3, "kind": "delta", "targets": [], "removed": []})["stale"]
+    assert decoder.apply({"store": "S", "seq": 2, "kind": "delta", "targets": [], "removed": []})["seq"] == 3
+    assert not decoder.apply({"store": "S", "seq": 4, "kind": "key", "targets": [target]})["stale"]
+
+
+def test_health_record_is_encoded_once_and_shared_by_every_consumer(tmp_path, monkeypatch):
+    from dataclasses import asdict
+
+    from gping_next.logger import DeltaLogger
+    from gping_next.telemetry import HealthDeltaEncoder, HealthRecord, encode_target
+    from rdsiq_core.records import envelope
+
+    status = TargetStatus(name="gateway", up=True, code="success", tcp_ms=1.5, note="ok", kernel_retrans=2)
+    assert encode_target(status) == asdict(status)
+    payload = HealthPayload(ts=datetime(2024, 1, 1, 12), store="S", targets=[status], loss_pct=0.0, jitter_ms=0.5)
+    record = HealthRecord(payload)
+    assert json.loads(record.json) == record and record.source is payload
+
+    frame = HealthDeltaEncoder(keyframe_every=1).encode(record)
+    assert frame.json.startswith(record.json[:-1]) and json.loads(frame.json) == dict(frame)
+    assert gzip.decompress(frame.gzip) == frame.json and frame.gzip is frame.gzip
+    line = envelope(frame, payload_type="health", id="health-1")
+    assert json.loads(line) == {"payload_type": "health", "id": "health-1", "payload": dict(frame)}
+
+    encoded = []
+    real_dumps = json.dumps
+
+    def counting_dumps(value, *args, **kwargs):
+        if isinstance(value, dict) and ("targets" in value or "payload" in value):
+            encoded.append(value)
+        return real_dumps(value, *args, **kwargs)
+
+    async def scenario() -> None:
+        monkeypatch.setattr("gping_next.telemetry.QUEUE_DIR", tmp_path)
+        monkeypatch.setattr("gping_next.logger.LOG_DIR", tmp_path)
+        manager = TelemetryManager(TelemetryConfig(sinks=["local"]))
+        live = HealthRecord(payload)
+        monkeypatch.setattr(json, "dumps", counting_dumps)
+        DeltaLogger("S", timedelta(minutes=15)).record(live)
+        await manager.send_health(live)
+        await manager.close()
+        monkeypatch.setattr(json, "dumps", real_dumps)
+
+    asyncio.run(scenario())
+    assert encoded == []
+    logged = json.loads(next(tmp_path.glob("GPing*.jsonl")).read_text())
+    assert logged == {**record, "reason": "first"}
+    sent = json.loads((tmp_path / "sent" / "health.jsonl").read_text())
+    assert sent["payload"] == {**record, "seq": 1, "kind": "key"}
+
+
+def test_history_packing_round_trips_and_acks_every_member(tmp_path, monkeypatch):
+    import base64
+    import random
+
+    from rdsiq_core import telemetry as core_telemetry
+    from gping_next.telemetry import HealthDeltaEncoder, decode_health_history, pack_health_history
+
+    rng = random.Random(7)
+    encoder = HealthDeltaEncoder(keyframe_every=1)
+    records = []
+    for minute in range(60):
+        statuses = [
+            TargetStatus(name=f"t{i}", up=True, code="success", tcp_ms=round(rng.gauss(20, 2), 3))
+            for i in range(10)
+        ]
+        payload = HealthPayload(ts=datetime(2024, 1, 1, 12, 0) + timedelta(minutes=minute), store="S", targets=statuses)
+        records.append({"payload_type": "health", "payload": encoder.encode(payload), "id": f"health-{minute}"})
+
+    packed = pack_health_history(records + [{"payload_type": "inventory", "payload": {}, "id": "inv"}])
+    assert [r["id"] for r in packed] == ["inv", "history-health-0-60"]
+    frames = decode_health_history(base64.b64decode(packed[1]["payload"]["data"]))
+    for frame, record in zip(frames, records):
+        original = record["payload"]
+        assert frame["ts"] == original["ts"] and frame.get("kind") == original["kind"]
+        for got, want in zip(frame["targets"], original["targets"]):
+            assert got["name"] == want["name"] and got["up"] == want["up"]
+            assert abs(got["tcp_ms"] - want["tcp_ms"]) <= 0.5 / 100 + 1e-9
+    as_json = gzip.compress("\n".join(json.dumps(r["payload"]) for r in records).encode())
+    assert len(gzip.compress(base64.b64decode(packed[1]["payload"]["data"]))) * 3 < len(as_json)
+
+    class PackingSink(core_telemetry.TelemetrySink):
+        name = "packing"
+        packable = True
+        batches = []
+
+        async def send_batch(self, batch, on_chunk=None):
+            PackingSink.batches.append([r["id"] for r in batch])
+            return {r["id"] for r in batch}
+
+    class PackingManager(core_telemetry.TelemetryManager):
+        def pack_backlog(self, batch):
+            return pack_health_history(batch)
+
+    monkeypatch.setitem(core_telemetry.SINK_REGISTRY, "packing", PackingSink)
+
+    async def scenario():
+        manager = PackingManager(TelemetryConfig(sinks=["packing"], batch_max_records=100), queue_dir=tmp_path)
+        for record in records[:-1]:
+            manager._queue._save_sync("health", record["payload"], record["id"])
+        await manager.send_payload("health", records[-1]["payload"], datetime(2024, 1, 1, 13), "S")
+        return len(manager._queue)
+
+    assert asyncio.run(scenario()) == 0
+    assert PackingSink.batches == [["history-health-0-60"]]
+
+
+def test_local_sink_acks_only_written_lines_and_keeps_them_on_failure(tmp_path, monkeypatch):
+    from rdsiq_core.telemetry import LocalFileSink
+
+    sink = LocalFileSink(tmp_path, flush_interval=0.01)
+    records = [{"id": f"health-{n}", "payload_type": "health", "payload": {"n": n}} for n in range(3)]
+    real_write = sink._write
+
+    def failing_write(pending):
+        raise OSError("disk full")
+
+    async def scenario():
+        monkeypatch.setattr(sink, "_write", failing_write)
+        failed = await sink.send_batch(records[:2])
+        # The resend of a still-buffered id is not buffered twice.
+        monkeypatch.setattr(sink, "_write", real_write)
+        acked = await sink.send_batch(records)
+        await sink.close()
+        return failed, acked
+
+    failed, acked = asyncio.run(scenario())
+    assert failed == set() and acked == {"health-0", "health-1", "health-2"}
+    lines = [json.loads(line)["id"] for line in (tmp_path / "health.jsonl").read_text().splitlines()]
+    assert lines == ["health-0", "health-1", "health-2"] and sink.write_errors == 1
+
+
+def test_watchlist_and_trigger_polls_are_conditional_and_long_poll(tmp_path):
+    from rdsiq_core.telemetry import AppsScriptSink
+
+    seen = []
+    refresh = asyncio.Event()
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                head = (await reader.readuntil(b"\r\n\r\n")).decode()
+                lines = head.split("\r\n")
+                method, target = lines[0].split(" ")[:2]
+                headers = dict(line.split(": ", 1) for line in lines[1:] if ": " in line)
+                seen.append((method, target))
+                extra = ""
+                if method == "POST":
+                    await reader.readexactly(int(headers["Content-Length"]))
+                    status, body = 200, b"ok"
+                elif target == "/watchlist/KS-218":
+                    if headers.get("If-None-Match") == '"w1"':
+                        status, body = 304, b""
+                    else:
+                        status, body = 200, b'{"stores": {"KS-218": {"until": "2024-04-01"}}}'
+                    extra = 'ETag: "w1"\r\n'
+                elif target.startswith("/trigger/KS-218"):
+                    if "since=7" in target and not refresh.is_set():
+                        if "wait=" in target:
+                            await asyncio.wait_for(refresh.wait(), 2)
+                            status, body = 200, b'{"refresh": true, "version": 8}'
+                        else:
+                            status, body = 200, b'{"unchanged": true, "version": 7}'
+                    else:
+                        status, body = 200, b'{"refresh": false, "version": 7}'
+                writer.write(
+                    b"HTTP/1.1 %d OK\r\n%sContent-Length: %d\r\n\r\n%s" % (status, extra.encode(), len(body), body)
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+    async def scenario():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        sink = AppsScriptSink(f"http://127.0.0.1:{port}", "key")
+        async with server:
+            first = await sink.fetch_watchlist("KS-218")
+            second = await sink.fetch_watchlist("KS-218")
+            polls = [await sink.check_trigger("KS-218") for _ in range(2)]
+            sink.long_poll = 1.0
+            loop = asyncio.get_running_loop()
+            loop.call_later(0.2, refresh.set)
+            started = loop.time()
+            held = await sink.check_trigger("KS-218")
+            waited = loop.time() - started
+            stats = sink.pool_stats()
+            await sink.close()
+        return first, second, polls, held, waited, stats
+
+    first, second, polls, held, waited, stats = asyncio.run(scenario())
+    assert first == second == {"KS-218": {"until": "2024-04-01"}}
+    assert polls == [False, False] and held is True and waited >= 0.2
+    assert stats["not_modified"] == 2
+    assert [t for _, t in seen] == [
+        "/watchlist/KS-218",
+        "/watchlist/KS-218",
+        "/trigger/KS-218",
+        "/trigger/KS-218?since=7",
+        "/trigger/KS-218?since=7&wait=1",
+        "/trigger/KS-218",
+    ]
+    assert seen[-1][0] == "POST"
+
+
+def test_local_sink_buffers_writes_and_rotates_into_gzip_segments(tmp_path):
+    from rdsiq_core.telemetry import LocalFileSink
+
+    clock = [datetime(2024, 1, 1, 23, 59)]
+    sink = LocalFileSink(tmp_path, flush_interval=60, max_bytes=400, keep=3, clock=lambda: clock[0])
+    records = [{"id": f"health-{n}", "payload_type": "health", "payload": {"n": n}} for n in range(40)]
+
+    async def scenario():
+        sends = asyncio.gather(*(sink.send("health", r["payload"], r["id"]) for r in records[:5]))
+        await asyncio.sleep(0.01)
+        # Buffered, not written: the sends are still waiting for their flush.
+        buffered = (tmp_path / "health.jsonl").exists() or sends.done()
+        await sink.flush()
+        delivered = await sends
+        clock[0] += timedelta(minutes=2)  # the next batch lands on a new UTC day
+        batch = asyncio.ensure_future(sink.send_batch(records[5:]))
+        await asyncio.sleep(0.01)
+        await sink.close()
+        return buffered, delivered, len(await batch)
+
+    assert asyncio.run(scenario()) == (False, [True] * 5, 35)
+    segments = sorted(tmp_path.glob("health.*.jsonl.gz"), key=lambda p: p.stat().st_mtime)
+    assert [p.name for p in segments] == [
+        "health.2024-01-02.jsonl.gz",
+        "health.2024-01-02.1.jsonl.gz",
+        "health.2024-01-02.2.jsonl.gz",
+    ]
+    kept = [json.loads(line)["id"] for p in segments for line in gzip.decompress(p.read_bytes()).splitlines()]
+    active = [json.loads(line)["id"] for line in (tmp_path / "health.jsonl").read_text().splitlines()]
+    assert (tmp_path / "health.jsonl").stat().st_size <= 400
+    # The oldest segments (including the 2024-01-01 one) were pruned; the rest is contiguous.
+    assert kept + active == [r["id"] for r in records[-len(kept + active) :]]
+    assert sink._files == {}
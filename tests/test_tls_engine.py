@@ -0,0 +1,35 @@
+import asyncio
+import ssl
+
+from gping_next.probes import ProbeServices, probe_target
+from gping_next.schemas import TargetSpec
+from gping_next.tls_engine import TLSProbeEngine
+
+
+def test_tls_probe_splits_phases_and_reuses_context(self_signed):
+    cert, key = self_signed
+    server_ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    server_ctx.load_cert_chain(cert, key)
+
+    async def handle(reader, writer):
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n")
+        await writer.drain()
+        writer.close()
+
+    async def scenario():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0, ssl=server_ctx)
+        port = server.sockets[0].getsockname()[1]
+        services = ProbeServices(tls=TLSProbeEngine())
+        target = TargetSpec(name="local", host="127.0.0.1", port=port, http_path="/", tls_verify=False)
+        async with server:
+            first = await probe_target(target, services)
+            second = await probe_target(target, services)
+        return services, first, second
+
+    services, first, second = asyncio.run(scenario())
+    assert first.up and second.up
+    assert first.tcp_ms is not None and first.tls_ms is not None
+    assert first.tls_ms != first.tcp_ms
+    assert services.tls.contexts_built == 1
+    assert services.tls.resumed >= 1
@@ -0,0 +1,91 @@
+import asyncio
+import json
+
+import pytest
+
+from gping_next.probes import ProbeRunner
+from gping_next.schemas import TargetSpec, TargetStatus
+from gping_next.topology import ProbeTopology
+
+
+def test_dead_gateway_short_circuits_downstream(monkeypatch):
+    probed = []
+
+    async def fake_probe(target, services=None, on_connected=None):
+        probed.append(target.name)
+        if target.name == "gateway":
+            await asyncio.sleep(0.1)
+            return TargetStatus(name=target.name, up=False, code="tcp_timeout")
+        if target.name == "printer":
+            return TargetStatus(name=target.name, up=False, code="tcp_refused")
+        if target.name == "switch":
+            return TargetStatus(name=target.name, up=False, code="l2_present_l3_blocked")
+        return TargetStatus(name=target.name, up=True, code="success")
+
+    monkeypatch.setattr("gping_next.probes.probe_target", fake_probe)
+    targets = [
+        TargetSpec(name="public", host="c", depends_on=["isp"]),
+        TargetSpec(name="isp", host="b", depends_on=["gateway"]),
+        TargetSpec(name="gateway", host="a"),
+        TargetSpec(name="printer", host="d"),
+        TargetSpec(name="spooler", host="e", depends_on=["printer"]),
+        TargetSpec(name="switch", host="f"),
+        TargetSpec(name="camera", host="g", depends_on=["switch"]),
+    ]
+    results = asyncio.run(ProbeRunner().probe_all(targets))
+    codes = {r.name: r.code for r in results}
+    assert codes == {
+        "public": "upstream_down",
+        "isp": "upstream_down",
+        "gateway": "tcp_timeout",
+        "printer": "tcp_refused",
+        "spooler": "success",
+        "switch": "l2_present_l3_blocked",
+        "camera": "success",
+    }
+    assert sorted(probed) == ["camera", "gateway", "printer", "spooler", "switch"]
+    assert [r.name for r in results] == [t.name for t in targets]
+
+
+def test_crashed_parent_is_unknown_and_children_are_still_probed(monkeypatch):
+    probed = []
+
+    async def fake_probe(target, services=None, on_connected=None):
+        probed.append(target.name)
+        if target.name == "gw":
+            raise RuntimeError("probe bug")
+        return TargetStatus(name=target.name, up=True, code="success")
+
+    monkeypatch.setattr("gping_next.probes.probe_target", fake_probe)
+    targets = [TargetSpec(name="gw", host="a"), TargetSpec(name="isp", host="b", depends_on=["gw"])]
+    results = asyncio.run(ProbeRunner().probe_all(targets))
+    assert [(r.name, r.code, r.note) for r in results] == [
+        ("gw", "probe_error", "RuntimeError"),
+        ("isp", "success", None),
+    ]
+    assert probed == ["gw", "isp"]
+
+
+def test_cycles_and_unknown_parents_are_ignored():
+    topology = ProbeTopology(
+        [
+            TargetSpec(name="a", host="a", depends_on=["b"]),
+            TargetSpec(name="b", host="b", depends_on=["a"]),
+            TargetSpec(name="c", host="c", depends_on=["missing"]),
+        ]
+    )
+    assert sorted(topology.cyclic) == ["a", "b"]
+    assert topology.parents("a") == [] and topology.parents("c") == []
+
+
+def test_duplicate_target_names_are_rejected(tmp_path, monkeypatch):
+    from gping_next import config
+
+    with pytest.raises(ValueError, match="gateway"):
+        ProbeTopology([TargetSpec(name="gateway", host="a"), TargetSpec(name="gateway", host="b")])
+    path = tmp_path / "gping_next_config.json"
+    path.write_text(json.dumps({"targets": [{"name": "gw", "host": "a"}, {"name": "gw", "host": "b"}]}))
+    monkeypatch.setattr(config, "CONFIG_FILE", path)
+    monkeypatch.setattr(config, "ensure_runtime_dirs", lambda: None)
+    assert [(t.name, t.host) for t in config.load_config().targets] == [("gw", "a")]
+    assert all(not t.depends_on for t in config.DEFAULT_TARGETS)
@@ -14,3 +14,40 @@ def test_ui_locked_state(tmp_path, monkeypatch):
     data = json.loads(status_file.read_text())
     assert data["locked"] is False
     assert data["summary"]["gateway"] == "up"
+    bridge.publish("green", None, None, {}, {"apps_script": {"state": "open", "failures": 3, "retry_in_s": 40.0}})
+    assert json.loads(status_file.read_text())["sinks"]["apps_script"]["state"] == "open"
+
+
+def test_agent_publishes_neighbor_read_cost_and_pool_stats(tmp_path, monkeypatch):
+    import asyncio
+    from datetime import datetime
+
+    from gping_next.config import AgentConfig, TelemetryConfig
+    from gping_next.core_runtime import GPingNextAgent
+    from gping_next.schemas import TargetSpec, TargetStatus
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("gping_next.web_local.UI_DIR", tmp_path)
+    monkeypatch.setattr("gping_next.logger.LOG_DIR", tmp_path)
+    targets = [TargetSpec(name="gw", host="a")]
+    config = AgentConfig(store_id="S", targets=targets, telemetry=TelemetryConfig(sinks=["apps_script"]))
+    agent = GPingNextAgent(config)
+    agent.ui.unlock("token")
+    agent.prober.services.neighbors.proc_path = tmp_path / "arp"
+    (tmp_path / "arp").write_text("IP address       HW type     Flags       HW address            Mask     Device\n")
+    agent.prober.services.neighbors.read_sync()
+
+    async def fake_probe_all(batch, known=None):
+        return [TargetStatus(name=t.name, up=True, code="success") for t in batch]
+
+    async def no_send(record):
+        return None
+
+    agent.prober.probe_all = fake_probe_all  # type: ignore[assignment]
+    agent.telemetry.send_health = no_send  # type: ignore[assignment]
+    asyncio.run(agent._gather_and_send(datetime(2024, 1, 1)))
+    diagnostics = json.loads((tmp_path / "status.json").read_text())["diagnostics"]
+    assert diagnostics["neighbor_table"]["reads"] == 1
+    assert diagnostics["neighbor_table"]["last_read_ms"] >= 0
+    pool = diagnostics["pools"]["apps_script"]
+    assert pool == {"hits": 0, "misses": 0, "reconnects": 0, "idle": 0, "not_modified": 0}